@@ -131,8 +131,48 @@ resource "aws_dynamodb_table" "websocket_connections" {
     enabled        = true
   }
 
+  # Stream consumido pelo handler de eventos para invalidar o cache de
+  # conexões (inclui as remoções por TTL)
+  stream_enabled   = true
+  stream_view_type = "NEW_AND_OLD_IMAGES"
+
   tags = {
     Name = "${var.project_name}-websocket-connections"
     Type = "websocket-storage"
   }
-}
\ No newline at end of file
+}
+
+# ===================================
+# DYNAMODB TABLE - WEBSOCKET SUBSCRIPTIONS
+# ===================================
+
+# Índice invertido tópico -> conexão: um item por subscrição, mantido pelo
+# handler WebSocket, para que a entrega a um tópico seja uma Query pelos
+# seus assinantes em vez de um Scan de todas as conexões
+resource "aws_dynamodb_table" "websocket_subscriptions" {
+  name         = "${var.project_name}-websocket-subscriptions"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "topic"
+  range_key    = "connectionId"
+
+  attribute {
+    name = "topic"
+    type = "S"
+  }
+
+  attribute {
+    name = "connectionId"
+    type = "S"
+  }
+
+  # Mesmo TTL da conexão, para subscrições órfãs expirarem
+  ttl {
+    attribute_name = "ttl"
+    enabled        = true
+  }
+
+  tags = {
+    Name = "${var.project_name}-websocket-subscriptions"
+    Type = "websocket-storage"
+  }
+}
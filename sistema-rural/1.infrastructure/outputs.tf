@@ -32,6 +32,21 @@ output "websocket_connections_table_arn" {
   value       = aws_dynamodb_table.websocket_connections.arn
 }
 
+output "websocket_connections_stream_arn" {
+  description = "ARN do stream da tabela de conexões WebSocket"
+  value       = aws_dynamodb_table.websocket_connections.stream_arn
+}
+
+output "websocket_subscriptions_table_name" {
+  description = "Nome da tabela de subscrições WebSocket (tópico -> conexão)"
+  value       = aws_dynamodb_table.websocket_subscriptions.name
+}
+
+output "websocket_subscriptions_table_arn" {
+  description = "ARN da tabela de subscrições WebSocket"
+  value       = aws_dynamodb_table.websocket_subscriptions.arn
+}
+
 # ===================================
 # COGNITO OUTPUTS
 # ===================================
@@ -75,6 +90,7 @@ output "infrastructure_summary" {
       properties = aws_dynamodb_table.properties.name
       analysis   = aws_dynamodb_table.property_analysis.name
       websocket  = aws_dynamodb_table.websocket_connections.name
+      topics     = aws_dynamodb_table.websocket_subscriptions.name
     }
     cognito = {
       user_pool_id = aws_cognito_user_pool.main.id
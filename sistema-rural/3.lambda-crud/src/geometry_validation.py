@@ -0,0 +1,630 @@
+import numpy as np
+from typing import Any, Dict, List, Optional
+
+# ===================================
+# CÓDIGOS DE ERRO
+# ===================================
+#
+# Cada erro é um dict {"code": ..., "vertex": índice ou None, ...}, com o
+# índice do vértice na lista recebida (base 0). Erros do anel inteiro usam
+# vertex = None.
+
+INVALID_COORDINATE = "INVALID_COORDINATE"
+LONGITUDE_OUT_OF_RANGE = "LONGITUDE_OUT_OF_RANGE"
+LATITUDE_OUT_OF_RANGE = "LATITUDE_OUT_OF_RANGE"
+RING_NOT_CLOSED = "RING_NOT_CLOSED"
+TOO_FEW_VERTICES = "TOO_FEW_VERTICES"
+TOO_MANY_VERTICES = "TOO_MANY_VERTICES"
+DUPLICATE_VERTEX = "DUPLICATE_VERTEX"
+REPEATED_VERTEX = "REPEATED_VERTEX"
+ZERO_AREA = "ZERO_AREA"
+SELF_INTERSECTION = "SELF_INTERSECTION"
+SELF_OVERLAP = "SELF_OVERLAP"
+
+ERROR_MESSAGES = {
+    INVALID_COORDINATE: "coordenada não numérica ou infinita",
+    LONGITUDE_OUT_OF_RANGE: "longitude fora de [-180, 180]",
+    LATITUDE_OUT_OF_RANGE: "latitude fora de [-90, 90]",
+    RING_NOT_CLOSED: "o primeiro e o último ponto devem ser iguais",
+    TOO_FEW_VERTICES: "o polígono precisa de pelo menos 3 vértices distintos",
+    TOO_MANY_VERTICES: "número de vértices acima do limite",
+    DUPLICATE_VERTEX: "vértice repetido em sequência",
+    REPEATED_VERTEX: "o contorno passa duas vezes pelo mesmo ponto",
+    ZERO_AREA: "polígono sem área (pontos colineares)",
+    SELF_INTERSECTION: "o contorno cruza a si mesmo",
+    SELF_OVERLAP: "o contorno volta sobre si mesmo",
+}
+
+# Limite de erros reportados por anel (o total é sempre informado)
+MAX_REPORTED_ERRORS = 50
+
+# Pares candidatos testados por vez na detecção de auto-interseção
+PAIR_CHUNK = 2_000_000
+
+# Varredura de auto-interseção: cruzamentos de fronteira por vértice, pedaços
+# por grupo testados todos contra todos, pares por pedaço acima dos quais o
+# grupo é varrido de novo no outro eixo, e níveis máximos dessa recursão
+SWEEP_SHARE = 2
+GROUP_SIZE = 16
+PRUNE_RATIO = 8
+MAX_LEVELS = 12
+
+
+class Report:
+    """Erros de um anel: os primeiros MAX_REPORTED_ERRORS detalhados, todos contados"""
+
+    def __init__(self):
+        self.errors: List[Dict[str, Any]] = []
+        self.count = 0
+
+    def add(self, code: str, vertex: Optional[int] = None, **extra):
+        self.count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"code": code, "vertex": vertex, **extra})
+
+    def add_vertices(self, code: str, vertices: np.ndarray):
+        room = max(MAX_REPORTED_ERRORS - len(self.errors), 0)
+        for vertex in vertices[:room]:
+            self.errors.append({"code": code, "vertex": int(vertex)})
+        self.count += len(vertices)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "valid": self.count == 0,
+            "errors": self.errors,
+            "errorCount": self.count,
+        }
+
+
+def validate_ring(coordinates: List[List[Any]], max_vertices: int) -> Dict[str, Any]:
+    """Valida um anel [[lon, lat], ...] fechado.
+
+    Verifica, vetorizado em NumPy: coordenadas finitas, limites de lon/lat,
+    fechamento, quantidade de vértices, vértices duplicados, área nula e
+    auto-interseção. Retorna {"valid", "errors", "errorCount"}.
+    """
+    report = Report()
+
+    try:
+        ring = np.asarray(coordinates, dtype=np.float64)
+    except (TypeError, ValueError):
+        ring = None
+    if ring is None or ring.ndim != 2 or ring.shape[1] != 2:
+        report.add(INVALID_COORDINATE, first_malformed(coordinates))
+        return report.as_dict()
+
+    finite = np.isfinite(ring).all(axis=1)
+    report.add_vertices(INVALID_COORDINATE, np.flatnonzero(~finite))
+    report.add_vertices(
+        LONGITUDE_OUT_OF_RANGE, np.flatnonzero(finite & (np.abs(ring[:, 0]) > 180))
+    )
+    report.add_vertices(
+        LATITUDE_OUT_OF_RANGE, np.flatnonzero(finite & (np.abs(ring[:, 1]) > 90))
+    )
+    if report.count:
+        return report.as_dict()
+
+    if len(ring) < 2 or not np.array_equal(ring[0], ring[-1]):
+        report.add(RING_NOT_CLOSED, len(ring) - 1)
+        return report.as_dict()
+
+    # Vértices sem o ponto de fechamento
+    points = ring[:-1]
+    if len(points) > max_vertices:
+        report.add(TOO_MANY_VERTICES, limit=max_vertices)
+        return report.as_dict()
+
+    # Vértice igual ao anterior (aresta de comprimento zero)
+    same_as_previous = (points == np.roll(points, 1, axis=0)).all(axis=1)
+    if len(points) == 1:
+        same_as_previous[:] = False
+    report.add_vertices(DUPLICATE_VERTEX, np.flatnonzero(same_as_previous))
+
+    indices = np.flatnonzero(~same_as_previous)
+    distinct = points[indices]
+
+    # Mesmo ponto visitado duas vezes (não consecutivas): o anel se toca
+    order = np.lexsort((distinct[:, 1], distinct[:, 0]))
+    repeated = (distinct[order][1:] == distinct[order][:-1]).all(axis=1)
+    if len(distinct) - repeated.sum() < 3:
+        report.add(TOO_FEW_VERTICES)
+        return report.as_dict()
+    report.add_vertices(REPEATED_VERTEX, np.sort(indices[order[1:][repeated]]))
+
+    if repeated.any():
+        return report.as_dict()
+
+    for code, first, second in self_intersections(distinct):
+        report.add(code, int(indices[first]), otherVertex=int(indices[second]))
+        report.add(code, int(indices[second]), otherVertex=int(indices[first]))
+
+    # Área nula (relativa ao tamanho do anel) num anel simples: colinear
+    x, y = distinct[:, 0], distinct[:, 1]
+    twice_area = np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y)
+    extent = max(np.ptp(x), np.ptp(y))
+    if not report.count and abs(twice_area) <= 1e-12 * extent * extent:
+        report.add(ZERO_AREA)
+
+    return report.as_dict()
+
+
+def first_malformed(coordinates: List[Any]) -> Optional[int]:
+    """Índice do primeiro ponto que não é [número, número]"""
+    for index, coord in enumerate(coordinates):
+        if not isinstance(coord, (list, tuple)) or len(coord) != 2:
+            return index
+        try:
+            float(coord[0])
+            float(coord[1])
+        except (TypeError, ValueError):
+            return index
+    return None
+
+
+def orientation(px, py, qx, qy, rx, ry) -> np.ndarray:
+    """Sinal do produto vetorial (q - p) x (r - p)"""
+    return np.sign((qx - px) * (ry - py) - (qy - py) * (rx - px))
+
+
+def self_intersections(points: np.ndarray, limit: int = MAX_REPORTED_ERRORS // 2):
+    """Pares (code, aresta, aresta) de arestas que se cruzam ou se sobrepõem.
+
+    A aresta i liga o vértice i ao i + 1. Os candidatos vêm de uma varredura
+    em x vetorizada (sweep_level): as arestas são cortadas em faixas entre
+    fronteiras verticais, e só pares de pedaços que podem se tocar numa faixa
+    são testados, em lote, com predicados de orientação. O custo é
+    O(n log n) para contornos simples, e a busca para em `limit` pares.
+    """
+    n = len(points)
+    start = points
+    end = np.roll(points, -1, axis=0)
+
+    found = []
+
+    # Arestas vizinhas só se tocam no vértice comum; se forem colineares e
+    # voltarem uma sobre a outra o contorno se sobrepõe
+    after = np.roll(end, -1, axis=0)
+    collinear = (
+        orientation(
+            start[:, 0], start[:, 1], end[:, 0], end[:, 1], after[:, 0], after[:, 1]
+        )
+        == 0
+    )
+    backwards = ((end - start) * (after - end)).sum(axis=1) < 0
+    for edge in np.flatnonzero(collinear & backwards)[:limit]:
+        found.append((SELF_OVERLAP, int(edge), int((edge + 1) % n)))
+    if len(found) >= limit or n < 4:
+        return found
+
+    # Folga das comparações em ponto flutuante da varredura; a decisão final
+    # é sempre do teste exato de segments_intersect
+    tol = 1e-12 * (1.0 + float(np.abs(points).max()))
+    seen = set()
+
+    def confirm(a: np.ndarray, b: np.ndarray) -> bool:
+        """Testa os pares candidatos (a, b); True ao atingir o limite"""
+        i = np.minimum(a, b)
+        j = np.maximum(a, b)
+        keep = (j - i > 1) & (j - i != n - 1)
+        i, j = i[keep], j[keep]
+        hits = segments_intersect(start[i], end[i], start[j], end[j])
+        if not hits.any():
+            return False
+        key = np.sort(i[hits] * n + j[hits])
+        key = key[np.r_[True, key[1:] != key[:-1]]]
+        for pair in zip((key // n).tolist(), (key % n).tolist()):
+            if pair not in seen:
+                seen.add(pair)
+                found.append((SELF_INTERSECTION, *pair))
+        return len(found) >= limit
+
+    problem = (
+        start[:, 0],
+        start[:, 1],
+        end[:, 0],
+        end[:, 1],
+        np.arange(n),
+        np.zeros(n, np.int64),
+    )
+    for level in range(MAX_LEVELS + 1):
+        problem = sweep_level(*problem, tol, confirm, level == MAX_LEVELS, n)
+        if problem is None:
+            break
+    return found[:limit]
+
+
+def sweep_level(ax, ay, bx, by, ids, group, tol, confirm, final, ring):
+    """Um nível da varredura: arestas (ax, ay)-(bx, by), de vários problemas.
+
+    `group` separa problemas independentes (os grupos densos do nível
+    anterior), `ids` são os índices das arestas no anel de `ring` arestas.
+    Em cada problema as fronteiras verticais ficam mais densas onde poucas
+    arestas atravessam, de modo que cada aresta cruze em média SWEEP_SHARE
+    fronteiras por vértice. Nas fronteiras as arestas são ordenadas por
+    altura: toques na fronteira são vizinhos nessa ordem, e um cruzamento
+    dentro de uma faixa inverte a ordem entre as duas fronteiras. Os pedaços
+    de arestas que começam ou terminam numa faixa são localizados entre as
+    que a atravessam; pedaços na mesma posição formam grupos testados entre
+    si, e os grupos densos demais voltam como problemas do próximo nível,
+    com os eixos trocados. Retorna o próximo nível, ou None quando não há
+    mais o que varrer ou o limite de pares foi atingido.
+    """
+    m = len(ax)
+    swap = (ax > bx) | ((ax == bx) & (ay > by))
+    lx = np.where(swap, bx, ax)
+    ly = np.where(swap, by, ay)
+    rx = np.where(swap, ax, bx)
+    ry = np.where(swap, ay, by)
+
+    # Colunas: abscissas distintas de cada problema, em ordem
+    x = np.concatenate([lx, rx])
+    by_column = grouped_order(np.concatenate([group, group]), x)
+    sx = x[by_column]
+    sg = np.concatenate([group, group])[by_column]
+    new = np.r_[True, (sx[1:] != sx[:-1]) | (sg[1:] != sg[:-1])]
+    column = np.empty(2 * m, np.int64)
+    column[by_column] = np.cumsum(new) - 1
+    li, ri = column[:m], column[m:]
+    head = np.flatnonzero(new)
+    column_x = sx[head]
+    column_group = sg[head]
+
+    vertical = li == ri
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(vertical, 0.0, (ry - ly) / (rx - lx))
+
+    def height(edges, at):
+        y = ly[edges] + (at - lx[edges]) * slope[edges]
+        return np.where(at == rx[edges], ry[edges], y)
+
+    # Fronteiras: a primeira e a última coluna de cada problema e as colunas
+    # em que o orçamento acumulado de cruzamentos muda
+    starts = np.bincount(li, minlength=len(head))
+    ends = np.bincount(ri, minlength=len(head))
+    crossing = np.cumsum(starts) - np.cumsum(ends) + ends
+    budget = np.floor(
+        np.cumsum((starts + ends) * SWEEP_SHARE / np.maximum(crossing, GROUP_SIZE))
+    )
+    cut = np.r_[True, budget[1:] != budget[:-1]]
+    cut |= np.r_[True, column_group[1:] != column_group[:-1]]
+    cut |= np.r_[column_group[1:] != column_group[:-1], True]
+    bound = np.flatnonzero(cut)
+    bound_x = column_x[bound]
+    nb = len(bound)
+
+    # Incidências (aresta, fronteira), na ordem de cada aresta; verticais só
+    # na fronteira em que estão, como intervalos [ly, ry]
+    slanted = np.flatnonzero(~vertical)
+    first_bound = np.searchsorted(bound, li[slanted])
+    after_bound = np.searchsorted(bound, ri[slanted], side="right")
+    owner, inc_bound = ranges(first_bound, after_bound)
+    inc_edge = slanted[owner]
+    crossed_at = height(inc_edge, bound_x[inc_bound])
+    follows = np.r_[owner[1:] == owner[:-1], False] if len(owner) else owner > 0
+    offset = np.zeros(m, np.int64)
+    count = after_bound - first_bound
+    offset[slanted] = np.cumsum(count) - count - first_bound
+
+    upright = np.flatnonzero(vertical)
+    at = np.searchsorted(bound, li[upright])
+    on = at < nb
+    on[on] = bound[at[on]] == li[upright[on]]
+    inc_edge = np.concatenate([inc_edge, upright[on]])
+    inc_bound = np.concatenate([inc_bound, at[on]])
+    low = np.concatenate([crossed_at, ly[upright[on]]])
+    high = np.concatenate([crossed_at, ry[upright[on]]])
+    follows = np.concatenate([follows, np.zeros(int(on.sum()), bool)])
+
+    # Ordem em cada fronteira; no mesmo ponto vale a ordem logo à direita,
+    # dada pela inclinação
+    order = grouped_order(inc_bound, low)
+    sb, sl = inc_bound[order], low[order]
+    tie = (sb[1:] == sb[:-1]) & (sl[1:] == sl[:-1])
+    if tie.any():
+        run = np.cumsum(np.r_[True, ~tie])
+        index = np.flatnonzero(np.r_[tie, False] | np.r_[False, tie])
+        tied = order[index]
+        order[index] = tied[grouped_order(run[index], slope[inc_edge[tied]])]
+    near, stop = windows(inc_bound[order], low[order], high[order], tol)
+    for a, b in pair_chunks(near, stop):
+        if confirm(ids[inc_edge[order[a]]], ids[inc_edge[order[b]]]):
+            return None
+
+    # Arestas que atravessam cada faixa, na ordem da fronteira esquerda: a
+    # ordem tem de se manter na fronteira direita
+    position = np.empty(len(order), np.int64)
+    position[order] = np.arange(len(order))
+    spanning = follows[order]
+    span_inc = order[spanning]
+    span = inc_edge[span_inc]
+    span_strip = inc_bound[span_inc]
+    right = position[span_inc + 1]
+    inverted = np.flatnonzero(
+        (span_strip[1:] == span_strip[:-1]) & (right[1:] < right[:-1])
+    )
+    if len(inverted) and confirm(ids[span[inverted]], ids[span[inverted + 1]]):
+        return None
+    strips = np.arange(nb)
+    begin_of = np.searchsorted(span_strip, strips)
+    finish_of = np.searchsorted(span_strip, strips, side="right")
+    below_count = np.cumsum(spanning) - spanning
+
+    # Pedaços locais: a parte de cada aresta numa faixa onde ela começa ou
+    # termina fora das fronteiras. O fim tem posição exata pela incidência
+    # na fronteira esquerda; o começo é localizado por busca binária
+    kl = np.searchsorted(bound, li, side="right") - 1
+    left_in = bound[kl] != li
+    kr = np.searchsorted(bound, ri) - 1
+    right_in = ~vertical & (kr + 1 < nb)
+    right_in[right_in] = bound[kr[right_in] + 1] != ri[right_in]
+    one = np.flatnonzero(left_in)
+    two = np.flatnonzero(right_in & ~(left_in & (kl == kr)))
+    loc = np.concatenate([two, one])
+    strip = np.concatenate([kr[two], kl[one]])
+    known = len(two)
+    xa = np.where(vertical[loc], lx[loc], np.maximum(lx[loc], bound_x[strip]))
+    xb = np.where(
+        vertical[loc],
+        lx[loc],
+        np.minimum(rx[loc], bound_x[np.minimum(strip + 1, nb - 1)]),
+    )
+    ya = np.where(vertical[loc], ly[loc], height(loc, xa))
+    yb = np.where(vertical[loc], ry[loc], height(loc, xb))
+    begin = begin_of[strip]
+    finish = finish_of[strip]
+
+    rank = np.empty(len(loc), np.int64)
+    rank[:known] = below_count[position[offset[two] + kr[two]]]
+    rest = np.arange(known, len(loc))
+    rank[known:] = bisect_rows(
+        begin[rest],
+        finish[rest],
+        lambda mid, t: height(span[mid], xa[rest[t]]) < ya[rest[t]] - tol,
+    )
+
+    def between(sel, px, py):
+        """O ponto (px, py) fica com folga entre as vizinhas da posição"""
+        r = rank[sel]
+        ok = np.ones(len(sel), bool)
+        under = np.flatnonzero(r > begin[sel])
+        over = np.flatnonzero(r < finish[sel])
+        su, so = sel[under], sel[over]
+        ok[under] = height(span[r[under] - 1], px[su]) < py[su] - tol
+        ok[over] &= height(span[r[over]], px[so]) > py[so] + tol
+        return ok
+
+    clean = between(np.arange(len(loc)), xb, yb)
+    clean[known:] &= between(rest, xa, ya)
+    bottom = rank.copy()
+    top = rank.copy()
+    if not clean.all():
+        # Pedaços que encostam em arestas que atravessam: posições de cada
+        # ponta, e os pares com as arestas entre elas
+        d = np.flatnonzero(~clean)
+        px = np.concatenate([xa[d], xb[d]])
+        py = np.concatenate([ya[d], yb[d]])
+        qb = np.concatenate([begin[d], begin[d]])
+        qe = np.concatenate([finish[d], finish[d]])
+        lo = bisect_rows(qb, qe, lambda mid, t: height(span[mid], px[t]) < py[t] - tol)
+        hi = bisect_rows(lo, qe, lambda mid, t: height(span[mid], px[t]) <= py[t] + tol)
+        k = len(d)
+        bottom[d] = np.minimum(lo[:k], lo[k:])
+        top[d] = np.maximum(hi[:k], hi[k:])
+        c = np.flatnonzero(top > bottom)
+        piece, edge = ranges(bottom[c], top[c])
+        if len(edge) and confirm(ids[loc[c[piece]]], ids[span[edge]]):
+            return None
+
+    piece, gap = ranges(bottom, top + 1)
+    pairs_a, pairs_b, children = [], [], []
+    if len(piece) > 1:
+        local_pairs(
+            gap + strip[piece],
+            xa[piece],
+            ya[piece],
+            xb[piece],
+            yb[piece],
+            ids[loc[piece]],
+            tol,
+            final,
+            ring,
+            pairs_a,
+            pairs_b,
+            children,
+        )
+    if pairs_a and confirm(np.concatenate(pairs_a), np.concatenate(pairs_b)):
+        return None
+    if not children:
+        return None
+    # Próximo nível varre no outro eixo
+    x0, y0, x1, y1, child_ids, child_group = children[0]
+    return y0, x0, y1, x1, child_ids, child_group
+
+
+def local_pairs(
+    group, sx0, sy0, sx1, sy1, ident, tol, final, ring, pairs_a, pairs_b, children
+):
+    """Pares candidatos entre os pedaços de cada grupo.
+
+    Grupos de até GROUP_SIZE pedaços (ou todos, no último nível) geram todos
+    os pares; os maiores usam sweep-and-prune no eixo com menos pares. Os
+    grupos com mais de PRUNE_RATIO pares por pedaço nos dois eixos vão para
+    `children`, para o próximo nível.
+    """
+    x0 = np.minimum(sx0, sx1) - tol
+    x1 = np.maximum(sx0, sx1) + tol
+    y0 = np.minimum(sy0, sy1) - tol
+    y1 = np.maximum(sy0, sy1) + tol
+
+    def emit(a, b):
+        ia, ib = ident[a], ident[b]
+        gap = np.abs(ia - ib)
+        keep = (gap > 1) & (gap != ring - 1)
+        keep &= (x0[a] <= x1[b]) & (x0[b] <= x1[a])
+        keep &= (y0[a] <= y1[b]) & (y0[b] <= y1[a])
+        pairs_a.append(ia[keep])
+        pairs_b.append(ib[keep])
+
+    order = np.argsort(group, kind="stable")
+    g = group[order]
+    head = np.flatnonzero(np.r_[True, g[1:] != g[:-1]])
+    size = np.diff(np.r_[head, len(g)])
+    small = size <= GROUP_SIZE
+    if final:
+        small[:] = True
+    pick = small & (size > 1)
+    if pick.any():
+        _, pos = ranges(head[pick], head[pick] + size[pick])
+        tail = np.repeat((head + size)[pick], size[pick])
+        which, j = ranges(pos + 1, tail)
+        emit(order[pos[which]], order[j])
+    if small.all():
+        return
+
+    big = ~small
+    owner, pos = ranges(head[big], head[big] + size[big])
+    sel = order[pos]
+    big_size = size[big]
+    tail = np.cumsum(big_size)
+    axes = []
+    for lo, hi in ((x0, x1), (y0, y1)):
+        # Posição de lo e hi numa só ordenação: o fim da janela de cada
+        # pedaço é um searchsorted por (grupo, posição)
+        value = np.concatenate([lo[sel], hi[sel]])
+        rank = np.empty(len(value), np.int64)
+        rank[np.argsort(value, kind="stable")] = np.arange(len(value))
+        low = owner * len(value) + rank[: len(sel)]
+        high = owner * len(value) + rank[len(sel) :]
+        o = np.argsort(low)
+        stop = np.searchsorted(low[o], high[o], side="right")
+        count = stop - np.arange(len(o)) - 1
+        axes.append((sel[o], count, np.add.reduceat(count, tail - big_size)))
+    (ox, cx, tx), (oy, cy, ty) = axes
+    use_y = ty < tx
+    dense = np.minimum(tx, ty) > PRUNE_RATIO * big_size
+    for o, count, use in ((ox, cx, ~use_y), (oy, cy, use_y)):
+        take = np.repeat(use & ~dense, big_size)
+        index = np.arange(len(o))
+        which, j = ranges(index + 1, index + 1 + np.where(take, count, 0))
+        if len(j):
+            emit(o[which], o[j])
+    if dense.any():
+        sel = ox[np.repeat(dense, big_size)]
+        owner = np.repeat(np.arange(int(dense.sum())), big_size[dense])
+        children.append((sx0[sel], sy0[sel], sx1[sel], sy1[sel], ident[sel], owner))
+
+
+def ranges(begin: np.ndarray, end: np.ndarray):
+    """(dono, valor) para cada valor de cada intervalo [begin, end)"""
+    count = end - begin
+    total = int(count.sum())
+    if not total:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    owner = np.repeat(np.arange(len(begin)), count)
+    offset = np.arange(total) - np.repeat(count.cumsum() - count, count)
+    return owner, begin[owner] + offset
+
+
+def grouped_order(group: np.ndarray, value: np.ndarray) -> np.ndarray:
+    """Ordem por (group, value), com argsort simples em vez de lexsort"""
+    if group[0] == group[-1] and (group == group[0]).all():
+        return np.argsort(value, kind="stable")
+    rank = np.empty(len(value), np.int64)
+    rank[np.argsort(value, kind="stable")] = np.arange(len(value))
+    return np.argsort(group * len(value) + rank)
+
+
+def bisect_rows(begin: np.ndarray, end: np.ndarray, below) -> np.ndarray:
+    """Busca binária em lote: primeira posição de [begin, end) em que
+    below(posições, linhas) é falso, para cada linha"""
+    lo = begin.copy()
+    hi = end.copy()
+    todo = np.flatnonzero(lo < hi)
+    while len(todo):
+        mid = (lo[todo] + hi[todo]) // 2
+        go = below(mid, todo)
+        lo[todo] = np.where(go, mid + 1, lo[todo])
+        hi[todo] = np.where(go, hi[todo], mid)
+        todo = todo[lo[todo] < hi[todo]]
+    return lo
+
+
+def windows(group: np.ndarray, low: np.ndarray, high: np.ndarray, tol: float):
+    """Intervalos [low, high] ordenados por (group, low) que se sobrepõem.
+
+    Retorna (near, stop): os itens com o seguinte do grupo a até tol, e o
+    fim da janela de cada um, de modo que os pares são (near, j) com j em
+    [near + 1, stop).
+    """
+    near = np.flatnonzero((group[1:] == group[:-1]) & (low[1:] <= high[:-1] + tol))
+    if not len(near):
+        return near, near
+    limit = np.searchsorted(group, group[near], side="right")
+    reach = high[near] + tol
+    stop = bisect_rows(near + 2, limit, lambda mid, t: low[mid] <= reach[t])
+    return near, stop
+
+
+def pair_chunks(first: np.ndarray, stop: np.ndarray):
+    """Pares (first[i], j), j em [first[i] + 1, stop[i]), até PAIR_CHUNK por vez"""
+    total = np.cumsum(stop - first - 1)
+    done = 0
+    while done < len(first):
+        base = total[done - 1] if done else 0
+        upto = int(np.searchsorted(total, base + PAIR_CHUNK, side="right"))
+        upto = max(upto, done + 1)
+        owner, j = ranges(first[done:upto] + 1, stop[done:upto])
+        yield first[done:upto][owner], j
+        done = upto
+
+
+def segments_intersect(a, b, c, d) -> np.ndarray:
+    """Interseção (inclusive toques e sobreposições colineares) de ab com cd"""
+    o1 = orientation(a[:, 0], a[:, 1], b[:, 0], b[:, 1], c[:, 0], c[:, 1])
+    o2 = orientation(a[:, 0], a[:, 1], b[:, 0], b[:, 1], d[:, 0], d[:, 1])
+    o3 = orientation(c[:, 0], c[:, 1], d[:, 0], d[:, 1], a[:, 0], a[:, 1])
+    o4 = orientation(c[:, 0], c[:, 1], d[:, 0], d[:, 1], b[:, 0], b[:, 1])
+
+    hits = (o1 * o2 < 0) & (o3 * o4 < 0)
+
+    # Toques só são possíveis com alguma orientação nula
+    zero = np.flatnonzero((o1 == 0) | (o2 == 0) | (o3 == 0) | (o4 == 0))
+    if not len(zero):
+        return hits
+    a, b, c, d = a[zero], b[zero], c[zero], d[zero]
+    o1, o2, o3, o4 = o1[zero], o2[zero], o3[zero], o4[zero]
+
+    def on_segment(p, q, r):
+        # r colinear com pq: está dentro da caixa de pq?
+        return (
+            (np.minimum(p[:, 0], q[:, 0]) <= r[:, 0])
+            & (r[:, 0] <= np.maximum(p[:, 0], q[:, 0]))
+            & (np.minimum(p[:, 1], q[:, 1]) <= r[:, 1])
+            & (r[:, 1] <= np.maximum(p[:, 1], q[:, 1]))
+        )
+
+    hits[zero] = (
+        ((o1 == 0) & on_segment(a, b, c))
+        | ((o2 == 0) & on_segment(a, b, d))
+        | ((o3 == 0) & on_segment(c, d, a))
+        | ((o4 == 0) & on_segment(c, d, b))
+    )
+    return hits
+
+
+def describe_error(error: Dict[str, Any]) -> str:
+    """Mensagem legível de um erro de validação"""
+    message = ERROR_MESSAGES.get(error["code"], error["code"])
+    if error.get("vertex") is not None:
+        message += f" (vértice {error['vertex'] + 1})"
+    if error.get("otherVertex") is not None:
+        message += f" com a aresta do vértice {error['otherVertex'] + 1}"
+    if error.get("limit") is not None:
+        message += f" (máximo {error['limit']})"
+    return message
+
+
+def first_error_message(validation: Dict[str, Any]) -> Optional[str]:
+    if validation["valid"]:
+        return None
+    return "Geometria inválida: " + describe_error(validation["errors"][0])
@@ -3,12 +3,17 @@ import boto3
 import uuid
 import os
 import base64
+import hashlib
+import math
+import struct
 from datetime import datetime, timezone
 from typing import Dict, Any, List
 from decimal import Decimal
 from botocore.exceptions import ClientError
 from boto3.dynamodb.conditions import Key
 
+from geometry_validation import first_error_message, validate_ring
+
 # AWS clients
 dynamodb = boto3.resource("dynamodb")
 eventbridge = boto3.client("events")
@@ -19,6 +24,13 @@ analysis_table_name = os.environ.get("PROPERTY_ANALYSIS_TABLE", "")
 table = dynamodb.Table(table_name)
 analysis_table = dynamodb.Table(analysis_table_name) if analysis_table_name else None
 eventbus_name = os.environ.get("EVENTBRIDGE_BUS_NAME", "")
+analysis_debounce_seconds = int(os.environ.get("ANALYSIS_DEBOUNCE_SECONDS", "120"))
+max_property_vertices = int(os.environ.get("MAX_PROPERTY_VERTICES", "50000"))
+analysis_slow_vertices = int(os.environ.get("ANALYSIS_SLOW_VERTICES", "5000"))
+analysis_slow_cells = int(os.environ.get("ANALYSIS_SLOW_CELLS", "1000000"))
+
+# Resolução (graus) da camada raster mais fina usada na análise (NDVI, ~10 m)
+ANALYSIS_CELL_DEGREES = 1.0 / 10800.0
 
 
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
@@ -403,6 +415,7 @@ def import_properties_bulk(event: Dict[str, Any], user_id: str) -> Dict[str, Any
 
         imported_count = 0
         errors = []
+        geometry_errors = []
 
         for i, property_data in enumerate(properties_data):
             try:
@@ -410,6 +423,13 @@ def import_properties_bulk(event: Dict[str, Any], user_id: str) -> Dict[str, Any
                 validation_result = validate_property_data(property_data)
                 if not validation_result["valid"]:
                     errors.append(f"Propriedade {i+1}: {validation_result['message']}")
+                    if "errors" in validation_result:
+                        geometry_errors.append(
+                            {
+                                "property": i + 1,
+                                **validation_error_body(validation_result),
+                            }
+                        )
                     continue
 
                 # Create property ID
@@ -436,11 +456,20 @@ def import_properties_bulk(event: Dict[str, Any], user_id: str) -> Dict[str, Any
                     "updatedAt": now,
                 }
 
+                fingerprint = geometry_fingerprint(property_data.get("coordinates", []))
+                schedule_analysis(property_id, fingerprint)
+
                 # Save to DynamoDB
                 table.put_item(Item=item)
 
                 # Publish event to EventBridge
-                publish_property_event(property_id, user_id, item, "Property Created")
+                publish_property_event(
+                    property_id,
+                    user_id,
+                    item,
+                    "Property Created",
+                    {"geometryFingerprint": {"old": None, "new": fingerprint}},
+                )
 
                 imported_count += 1
 
@@ -453,6 +482,8 @@ def import_properties_bulk(event: Dict[str, Any], user_id: str) -> Dict[str, Any
             "total": len(properties_data),
             "errors": errors,
         }
+        if geometry_errors:
+            response_data["geometryErrors"] = geometry_errors
 
         return create_response(200, response_data)
 
@@ -468,7 +499,7 @@ def create_property(event: Dict[str, Any], user_id: str) -> Dict[str, Any]:
 
         validation_result = validate_property_data(body)
         if not validation_result["valid"]:
-            return create_response(400, {"error": validation_result["message"]})
+            return create_response(400, validation_error_body(validation_result))
 
         property_id = str(uuid.uuid4())
         now = datetime.now(timezone.utc).isoformat()
@@ -492,10 +523,19 @@ def create_property(event: Dict[str, Any], user_id: str) -> Dict[str, Any]:
             "updatedAt": now,
         }
 
+        fingerprint = geometry_fingerprint(body.get("coordinates", []))
+        schedule_analysis(property_id, fingerprint)
+
         table.put_item(Item=item)
 
         # Publish event to EventBridge
-        publish_property_event(property_id, user_id, item, "Property Created")
+        publish_property_event(
+            property_id,
+            user_id,
+            item,
+            "Property Created",
+            {"geometryFingerprint": {"old": None, "new": fingerprint}},
+        )
 
         response_property = format_property_for_response(item)
         return create_response(201, {"property": response_property})
@@ -542,7 +582,7 @@ def update_property(event: Dict[str, Any], user_id: str) -> Dict[str, Any]:
         # Validate property data
         validation_result = validate_property_data(body)
         if not validation_result["valid"]:
-            return create_response(400, {"error": validation_result["message"]})
+            return create_response(400, validation_error_body(validation_result))
 
         # Check if property exists and belongs to user
         existing_property = table.get_item(
@@ -554,6 +594,13 @@ def update_property(event: Dict[str, Any], user_id: str) -> Dict[str, Any]:
         # Update timestamp
         now = datetime.now(timezone.utc).isoformat()
 
+        # Compare geometry to decide whether analysis must be redone
+        old_fingerprint = geometry_fingerprint(
+            existing_property["Item"].get("coordinates", [])
+        )
+        new_fingerprint = geometry_fingerprint(body.get("coordinates", []))
+        geometry_changed = old_fingerprint != new_fingerprint
+
         # Convert coordinates to Decimal
         coordinates_decimal = convert_coordinates_to_decimal(
             body.get("coordinates", [])
@@ -572,6 +619,16 @@ def update_property(event: Dict[str, Any], user_id: str) -> Dict[str, Any]:
             ":updatedAt": now,
         }
 
+        # Nova geometria invalida a análise anterior
+        if geometry_changed:
+            update_expression += ", analysisStatus = :pending"
+            expression_attribute_values[":pending"] = "pending"
+
+        # Registrada antes da gravação: se falhar, a propriedade continua com
+        # a geometria antiga e uma nova tentativa detecta a mudança de novo
+        if geometry_changed:
+            schedule_analysis(property_id, new_fingerprint)
+
         response = table.update_item(
             Key={"userId": user_id, "propertyId": property_id},
             UpdateExpression=update_expression,
@@ -584,7 +641,17 @@ def update_property(event: Dict[str, Any], user_id: str) -> Dict[str, Any]:
 
         # Publish event to EventBridge
         publish_property_event(
-            property_id, user_id, updated_property, "Property Updated"
+            property_id,
+            user_id,
+            updated_property,
+            "Property Updated",
+            {
+                "geometryChanged": geometry_changed,
+                "geometryFingerprint": {
+                    "old": old_fingerprint,
+                    "new": new_fingerprint,
+                },
+            },
         )
 
         response_property = format_property_for_response(updated_property)
@@ -628,8 +695,40 @@ def delete_property(event: Dict[str, Any], user_id: str) -> Dict[str, Any]:
         return create_response(500, {"error": "Erro interno do servidor"})
 
 
+def schedule_analysis(property_id: str, fingerprint: str) -> None:
+    """Registra a geometria mais recente como a próxima a ser analisada.
+
+    Cada edição adia a análise por analysis_debounce_seconds; a lambda de
+    análise descarta mensagens de geometrias superadas e reagenda as que
+    chegam antes do prazo, de modo que uma sequência de edições gera uma
+    única análise da geometria final.
+
+    Os erros são propagados: com um scheduledFingerprint antigo a mensagem
+    da nova geometria seria descartada como superada. Por isso é chamada
+    antes de gravar a propriedade, e uma nova tentativa da requisição
+    volta a registrar a geometria.
+    """
+    if not analysis_table or not fingerprint:
+        return
+
+    now = datetime.now(timezone.utc).timestamp()
+    analysis_table.update_item(
+        Key={"propertyId": property_id},
+        UpdateExpression="SET scheduledFingerprint = :fingerprint, scheduledAt = :now, dueAt = :due",
+        ExpressionAttributeValues={
+            ":fingerprint": fingerprint,
+            ":now": Decimal(str(round(now, 3))),
+            ":due": Decimal(str(round(now + analysis_debounce_seconds, 3))),
+        },
+    )
+
+
 def publish_property_event(
-    property_id: str, user_id: str, property_data: Dict[str, Any], event_type: str
+    property_id: str,
+    user_id: str,
+    property_data: Dict[str, Any],
+    event_type: str,
+    extra_detail: Dict[str, Any] = None,
 ):
     """Publica evento no EventBridge"""
     try:
@@ -655,6 +754,17 @@ def publish_property_event(
             ),
             "timestamp": datetime.now(timezone.utc).isoformat(),
         }
+        if event_detail["status"] != "deleted":
+            cost = analysis_cost(event_detail["coordinates"])
+            event_detail["analysisCost"] = cost
+            event_detail["analysisLane"] = (
+                "slow"
+                if cost["vertices"] > analysis_slow_vertices
+                or cost["cells"] > analysis_slow_cells
+                else "fast"
+            )
+        if extra_detail:
+            event_detail.update(extra_detail)
 
         # Publish to EventBridge
         response = eventbridge.put_events(
@@ -719,25 +829,85 @@ def validate_property_data(data: Dict[str, Any]) -> Dict[str, Any]:
                 "message": "Coordenadas devem ser uma lista com pelo menos 3 pontos",
             }
 
-        for i, coord in enumerate(coordinates):
-            if not isinstance(coord, list) or len(coord) != 2:
-                return {
-                    "valid": False,
-                    "message": f"Coordenada {i+1} deve ter formato [longitude, latitude]",
-                }
-
-            try:
-                float(coord[0])  # longitude
-                float(coord[1])  # latitude
-            except (ValueError, TypeError):
-                return {
-                    "valid": False,
-                    "message": f"Coordenada {i+1} deve conter números válidos",
-                }
+        geometry = validate_ring(coordinates, max_property_vertices)
+        if not geometry["valid"]:
+            return {
+                "valid": False,
+                "message": first_error_message(geometry),
+                "errors": geometry["errors"],
+                "errorCount": geometry["errorCount"],
+            }
 
     return {"valid": True, "message": "Dados válidos"}
 
 
+def validation_error_body(validation_result: Dict[str, Any]) -> Dict[str, Any]:
+    """Corpo de erro 400: mensagem e, para geometrias, os códigos por vértice"""
+    body = {"error": validation_result["message"]}
+    if "errors" in validation_result:
+        body["details"] = validation_result["errors"]
+        body["errorCount"] = validation_result["errorCount"]
+    return body
+
+
+def geometry_fingerprint(coordinates: List[List[Any]], quantum: float = 1e-6) -> str:
+    """Hash canônico do polígono.
+
+    Quantiza as coordenadas e normaliza orientação (anti-horária) e vértice
+    inicial, de modo que o mesmo polígono gere sempre o mesmo hash. Deve
+    produzir o mesmo valor que geometry_hash() da lambda de análise.
+    """
+    ring = [(float(coord[0]), float(coord[1])) for coord in coordinates or []]
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring = ring[:-1]
+    if not ring:
+        return None
+
+    grid = [(int(round(x / quantum)), int(round(y / quantum))) for x, y in ring]
+
+    # Remover vértices que colapsaram no anterior após a quantização
+    if len(grid) > 1:
+        deduped = [point for i, point in enumerate(grid) if point != grid[i - 1]]
+        grid = deduped or grid[:1]
+
+    if len(grid) >= 3:
+        signed_area = sum(
+            float(x1) * float(y2) - float(x2) * float(y1)
+            for (x1, y1), (x2, y2) in zip(grid, grid[1:] + grid[:1])
+        )
+        if signed_area < 0:
+            grid = grid[::-1]
+
+    start = min(range(len(grid)), key=lambda i: grid[i])
+    grid = grid[start:] + grid[:start]
+
+    digest = hashlib.sha256()
+    digest.update(repr(quantum).encode())
+    digest.update(
+        struct.pack(f"<{2 * len(grid)}q", *(v for point in grid for v in point))
+    )
+    return digest.hexdigest()[:32]
+
+
+def analysis_cost(coordinates: List[List[float]]) -> Dict[str, int]:
+    """Custo estimado da análise: vértices e células raster do bounding box.
+
+    Define a fila (rápida ou lenta) da análise; deve produzir o mesmo valor
+    que analysis_cost() da lambda de análise.
+    """
+    ring = [(float(coord[0]), float(coord[1])) for coord in coordinates or []]
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring = ring[:-1]
+    if not ring:
+        return {"vertices": 0, "cells": 0}
+
+    xs = [x for x, _ in ring]
+    ys = [y for _, y in ring]
+    rows = math.ceil((max(ys) - min(ys)) / ANALYSIS_CELL_DEGREES) + 1
+    cols = math.ceil((max(xs) - min(xs)) / ANALYSIS_CELL_DEGREES) + 1
+    return {"vertices": len(ring), "cells": rows * cols}
+
+
 def convert_coordinates_to_decimal(coordinates):
     """Converte coordenadas para Decimal para DynamoDB"""
     if not isinstance(coordinates, list):
@@ -16,10 +16,12 @@ module "lambda_function" {
   lambda_role = aws_iam_role.lambda.arn
 
   environment_variables = {
-    PROPERTIES_TABLE        = data.terraform_remote_state.infrastructure.outputs.properties_table_name
-    PROPERTY_ANALYSIS_TABLE = data.terraform_remote_state.infrastructure.outputs.property_analysis_table_name
-    EVENTBRIDGE_BUS_NAME    = data.terraform_remote_state.analysis_infra.outputs.property_analysis_bus_name
-    ENVIRONMENT             = var.environment
+    PROPERTIES_TABLE          = data.terraform_remote_state.infrastructure.outputs.properties_table_name
+    PROPERTY_ANALYSIS_TABLE   = data.terraform_remote_state.infrastructure.outputs.property_analysis_table_name
+    EVENTBRIDGE_BUS_NAME      = data.terraform_remote_state.analysis_infra.outputs.property_analysis_bus_name
+    ANALYSIS_DEBOUNCE_SECONDS = var.analysis_debounce_seconds
+    MAX_PROPERTY_VERTICES     = var.max_property_vertices
+    ENVIRONMENT               = var.environment
   }
 
   depends_on = [module.lambda_layer]
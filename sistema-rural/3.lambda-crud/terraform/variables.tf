@@ -14,4 +14,16 @@ variable "project_name" {
   description = "Project name"
   type        = string
   default     = "sistema-rural"
+}
+
+variable "analysis_debounce_seconds" {
+  description = "Seconds without edits before a property's geometry is analyzed"
+  type        = number
+  default     = 120
+}
+
+variable "max_property_vertices" {
+  description = "Maximum vertices accepted in a property boundary"
+  type        = number
+  default     = 50000
 }
\ No newline at end of file
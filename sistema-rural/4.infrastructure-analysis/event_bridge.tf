@@ -24,7 +24,8 @@ resource "aws_cloudwatch_event_rule" "property_created" {
     source      = ["property.service"]
     detail-type = ["Property Created"]
     detail = {
-      status = ["created"]
+      status       = ["created"]
+      analysisLane = [{ "anything-but" = ["slow"] }, { exists = false }]
     }
   })
 
@@ -45,6 +46,75 @@ resource "aws_cloudwatch_event_target" "property_analysis_sqs" {
   arn            = aws_sqs_queue.property_analysis_delay.arn
 }
 
+# ===================================
+# EVENTBRIDGE RULE - PROPERTY GEOMETRY UPDATED
+# ===================================
+
+# Only updates that change the boundary are re-analyzed; name/description
+# edits carry geometryChanged = false and are filtered out here
+resource "aws_cloudwatch_event_rule" "property_geometry_updated" {
+  name           = "${var.project_name}-property-geometry-updated"
+  description    = "Trigger re-analysis when a property boundary changes"
+  event_bus_name = aws_cloudwatch_event_bus.property_analysis.name
+
+  event_pattern = jsonencode({
+    source      = ["property.service"]
+    detail-type = ["Property Updated"]
+    detail = {
+      geometryChanged = [true]
+      analysisLane    = [{ "anything-but" = ["slow"] }, { exists = false }]
+    }
+  })
+
+  tags = {
+    Name = "${var.project_name}-property-geometry-updated-rule"
+    Type = "event-rule"
+  }
+}
+
+resource "aws_cloudwatch_event_target" "property_reanalysis_sqs" {
+  rule           = aws_cloudwatch_event_rule.property_geometry_updated.name
+  event_bus_name = aws_cloudwatch_event_bus.property_analysis.name
+  target_id      = "PropertyReanalysisSQSTarget"
+  arn            = aws_sqs_queue.property_analysis_delay.arn
+}
+
+# ===================================
+# EVENTBRIDGE RULE - SLOW LANE
+# ===================================
+
+# Created properties and boundary changes whose analysis was classified as
+# expensive by the CRUD lambda (detail.analysisLane = "slow")
+resource "aws_cloudwatch_event_rule" "property_analysis_slow" {
+  name           = "${var.project_name}-property-analysis-slow"
+  description    = "Route expensive property analyses to the slow lane"
+  event_bus_name = aws_cloudwatch_event_bus.property_analysis.name
+
+  event_pattern = jsonencode({
+    source      = ["property.service"]
+    detail-type = ["Property Created", "Property Updated"]
+    detail = {
+      analysisLane = ["slow"]
+      "$or" = [
+        { status = ["created"] },
+        { geometryChanged = [true] }
+      ]
+    }
+  })
+
+  tags = {
+    Name = "${var.project_name}-property-analysis-slow-rule"
+    Type = "event-rule"
+  }
+}
+
+resource "aws_cloudwatch_event_target" "property_analysis_slow_sqs" {
+  rule           = aws_cloudwatch_event_rule.property_analysis_slow.name
+  event_bus_name = aws_cloudwatch_event_bus.property_analysis.name
+  target_id      = "PropertyAnalysisSlowSQSTarget"
+  arn            = aws_sqs_queue.property_analysis_slow.arn
+}
+
 # ===================================
 # EVENTBRIDGE ARCHIVE
 # ===================================
@@ -39,6 +39,7 @@ resource "aws_iam_role_policy" "eventbridge_sqs_policy" {
         ]
         Resource = [
           aws_sqs_queue.property_analysis_delay.arn,
+          aws_sqs_queue.property_analysis_slow.arn,
           aws_sqs_queue.property_analysis_dlq.arn
         ]
       }
@@ -120,10 +121,12 @@ resource "aws_iam_role_policy" "lambda_analysis_policy" {
         Action = [
           "sqs:ReceiveMessage",
           "sqs:DeleteMessage",
-          "sqs:GetQueueAttributes"
+          "sqs:GetQueueAttributes",
+          "sqs:SendMessage"
         ]
         Resource = [
-          aws_sqs_queue.property_analysis_delay.arn
+          aws_sqs_queue.property_analysis_delay.arn,
+          aws_sqs_queue.property_analysis_slow.arn
         ]
       },
       {
@@ -36,6 +36,16 @@ output "property_created_rule_arn" {
   value       = aws_cloudwatch_event_rule.property_created.arn
 }
 
+output "property_geometry_updated_rule_name" {
+  description = "Nome da rule EventBridge para alteração de geometria"
+  value       = aws_cloudwatch_event_rule.property_geometry_updated.name
+}
+
+output "property_geometry_updated_rule_arn" {
+  description = "ARN da rule EventBridge para alteração de geometria"
+  value       = aws_cloudwatch_event_rule.property_geometry_updated.arn
+}
+
 # ===================================
 # SQS OUTPUTS
 # ===================================
@@ -55,6 +65,21 @@ output "property_analysis_delay_queue_url" {
   value       = aws_sqs_queue.property_analysis_delay.url
 }
 
+output "property_analysis_slow_queue_name" {
+  description = "Nome da SQS queue da fila lenta (propriedades grandes)"
+  value       = aws_sqs_queue.property_analysis_slow.name
+}
+
+output "property_analysis_slow_queue_arn" {
+  description = "ARN da SQS queue da fila lenta (propriedades grandes)"
+  value       = aws_sqs_queue.property_analysis_slow.arn
+}
+
+output "property_analysis_slow_queue_url" {
+  description = "URL da SQS queue da fila lenta (propriedades grandes)"
+  value       = aws_sqs_queue.property_analysis_slow.url
+}
+
 output "property_analysis_dlq_name" {
   description = "Nome da dead letter queue"
   value       = aws_sqs_queue.property_analysis_dlq.name
@@ -97,6 +122,7 @@ output "infrastructure_summary" {
     s3_bucket       = aws_s3_bucket.geospatial_cache.bucket
     eventbridge_bus = aws_cloudwatch_event_bus.property_analysis.name
     sqs_queue       = aws_sqs_queue.property_analysis_delay.name
+    sqs_slow_queue  = aws_sqs_queue.property_analysis_slow.name
     delay_seconds   = 120
   }
 }
\ No newline at end of file
@@ -48,30 +48,41 @@ resource "aws_s3_bucket_public_access_block" "geospatial_cache" {
 resource "aws_s3_bucket_lifecycle_configuration" "geospatial_cache" {
   bucket = aws_s3_bucket.geospatial_cache.id
 
+  # Analysis results cache - read synchronously by the analysis lambda, so it
+  # stays in STANDARD (GLACIER objects cannot be fetched with GetObject).
+  # Per-metric TTLs are enforced by the lambda; expiration is only a backstop.
   rule {
     id     = "cache_cleanup"
     status = "Enabled"
 
     filter {
-      prefix = ""
+      prefix = "analysis-cache/"
     }
 
     abort_incomplete_multipart_upload {
       days_after_initiation = 1
     }
 
-    transition {
-      days          = 30
-      storage_class = "STANDARD_IA"
+    expiration {
+      days = 365
     }
 
-    transition {
-      days          = 90
-      storage_class = "GLACIER"
+    noncurrent_version_expiration {
+      noncurrent_days = 1
     }
+  }
 
-    expiration {
-      days = 365
+  # Reference datasets (climate grids) are kept; only old versions expire
+  rule {
+    id     = "reference_data"
+    status = "Enabled"
+
+    filter {
+      prefix = "climate/"
+    }
+
+    abort_incomplete_multipart_upload {
+      days_after_initiation = 1
     }
 
     noncurrent_version_expiration {
@@ -23,7 +23,7 @@ resource "aws_sqs_queue" "property_analysis_delay" {
   max_message_size           = 262144
   message_retention_seconds  = 1209600 # 14 days
   receive_wait_time_seconds  = 10      # Long polling
-  visibility_timeout_seconds = 180     # 3 minutes visibility timeout
+  visibility_timeout_seconds = 1800    # 6x the analysis lambda timeout
 
   redrive_policy = jsonencode({
     deadLetterTargetArn = aws_sqs_queue.property_analysis_dlq.arn
@@ -36,6 +36,31 @@ resource "aws_sqs_queue" "property_analysis_delay" {
   }
 }
 
+# ===================================
+# SQS SLOW LANE
+# ===================================
+
+# Properties whose estimated analysis cost (vertices, raster cells) is high
+# are routed here, so they never queue in front of small plots
+resource "aws_sqs_queue" "property_analysis_slow" {
+  name                       = "${var.project_name}-property-analysis-slow"
+  delay_seconds              = 120 # same debounce as the fast lane
+  max_message_size           = 262144
+  message_retention_seconds  = 1209600 # 14 days
+  receive_wait_time_seconds  = 10      # Long polling
+  visibility_timeout_seconds = 1800    # 6x the analysis lambda timeout
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.property_analysis_dlq.arn
+    maxReceiveCount     = 3
+  })
+
+  tags = {
+    Name = "${var.project_name}-property-analysis-slow"
+    Type = "delay-queue"
+  }
+}
+
 # ===================================
 # SQS QUEUE POLICIES
 # ===================================
@@ -64,6 +89,30 @@ resource "aws_sqs_queue_policy" "property_analysis_delay" {
   })
 }
 
+resource "aws_sqs_queue_policy" "property_analysis_slow" {
+  queue_url = aws_sqs_queue.property_analysis_slow.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Sid    = "AllowEventBridgeToSendMessage"
+        Effect = "Allow"
+        Principal = {
+          Service = "events.amazonaws.com"
+        }
+        Action   = "sqs:SendMessage"
+        Resource = aws_sqs_queue.property_analysis_slow.arn
+        Condition = {
+          StringEquals = {
+            "aws:SourceAccount" = data.aws_caller_identity.current.account_id
+          }
+        }
+      }
+    ]
+  })
+}
+
 resource "aws_sqs_queue_policy" "property_analysis_dlq" {
   queue_url = aws_sqs_queue.property_analysis_dlq.id
 
@@ -80,7 +129,10 @@ resource "aws_sqs_queue_policy" "property_analysis_dlq" {
         Resource = aws_sqs_queue.property_analysis_dlq.arn
         Condition = {
           ArnEquals = {
-            "aws:SourceArn" = aws_sqs_queue.property_analysis_delay.arn
+            "aws:SourceArn" = [
+              aws_sqs_queue.property_analysis_delay.arn,
+              aws_sqs_queue.property_analysis_slow.arn
+            ]
           }
         }
       }
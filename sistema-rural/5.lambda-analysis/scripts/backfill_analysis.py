@@ -0,0 +1,68 @@
+"""Re-enqueue properties whose analysis is missing, failed or outdated.
+
+Runs the same parallel-scan backfill as the backfill lambda from a
+workstation, checkpointing to a local file (or S3) so an interrupted run
+resumes where it stopped.
+
+Usage:
+    python backfill_analysis.py --table sistema-rural-properties \\
+        --queue-url https://sqs.us-east-1.amazonaws.com/123/sistema-rural-property-analysis-delay \\
+        --slow-queue-url https://sqs.us-east-1.amazonaws.com/123/sistema-rural-property-analysis-slow \\
+        --version v2 --segments 8 --rate 20 --checkpoint backfill-v2.json
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from backfill import Backfill, Checkpoint, checkpoint_location  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--table", required=True, help="Properties table name")
+    parser.add_argument("--queue-url", required=True, help="Analysis queue URL")
+    parser.add_argument(
+        "--slow-queue-url", help="Slow-lane queue URL (default: --queue-url)"
+    )
+    parser.add_argument("--version", required=True, help="Current analysis version")
+    parser.add_argument("--segments", type=int, default=4, help="Scan segments")
+    parser.add_argument("--rate", type=float, default=20.0, help="Messages/second")
+    parser.add_argument(
+        "--checkpoint",
+        required=True,
+        help="Checkpoint file or s3://bucket/key",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Scan only, checkpointing to <checkpoint>.dry-run",
+    )
+    args = parser.parse_args()
+
+    import boto3
+
+    checkpoint = Checkpoint(
+        checkpoint_location(args.checkpoint, args.dry_run),
+        args.version,
+        args.segments,
+        boto3.client("s3"),
+    )
+    backfill = Backfill(
+        boto3.resource("dynamodb").Table(args.table),
+        boto3.client("sqs"),
+        args.queue_url,
+        checkpoint,
+        args.version,
+        args.rate,
+        dry_run=args.dry_run,
+        slow_queue_url=args.slow_queue_url,
+    )
+    print(json.dumps(backfill.run(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""Build the packed climate-normals grid used by get_weather_data.
+
+Resamples annual rainfall (mm), mean annual temperature (°C) and a Köppen-Geiger
+classification raster onto a regular lon/lat grid and writes it in the
+climate_grid format (see src/climate_grid.py).
+
+Sources are typically WorldClim BIO12 (rainfall), BIO1 (temperature) and the
+Beck et al. Köppen-Geiger map (integer codes 1-30). GeoTIFFs need rasterio;
+ESRI ASCII grids (.asc) are read with numpy only.
+
+Usage:
+    python build_climate_grid.py \\
+        --rainfall wc2.1_30s_bio_12.tif \\
+        --temperature wc2.1_30s_bio_1.tif \\
+        --koppen Beck_KG_V1_present_0p0083.tif \\
+        --output normals-v1.bin \\
+        --upload s3://sistema-rural-geospatial-cache/climate/normals-v1.bin
+"""
+
+import argparse
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from climate_grid import CLIMATE_ZONES, ClimateGrid, write_grid  # noqa: E402
+
+# Beck et al. (2018) Köppen-Geiger codes -> CLIMATE_ZONES names
+KOPPEN_TO_ZONE = {
+    1: "tropical_rainforest",  # Af
+    2: "tropical_monsoon",  # Am
+    3: "tropical_savanna",  # Aw
+    4: "arid",  # BWh
+    5: "arid",  # BWk
+    6: "semi_arid",  # BSh
+    7: "semi_arid",  # BSk
+    8: "mediterranean",  # Csa
+    9: "mediterranean",  # Csb
+    10: "mediterranean",  # Csc
+    11: "tropical_highland",  # Cwa
+    12: "tropical_highland",  # Cwb
+    13: "tropical_highland",  # Cwc
+    14: "humid_subtropical",  # Cfa
+    15: "oceanic",  # Cfb
+    16: "oceanic",  # Cfc
+    **{code: "continental" for code in range(17, 29)},  # D*
+    29: "polar",  # ET
+    30: "polar",  # EF
+}
+
+# Brazil plus a margin
+DEFAULT_BBOX = (-74.0, -34.0, -34.0, 6.0)
+DEFAULT_RESOLUTION = 1.0 / 12.0  # ~9 km
+
+
+class SourceRaster:
+    """North-up source raster cropped to the target bbox"""
+
+    def __init__(self, data, west, north, cell_width, cell_height, nodata):
+        self.data = np.asarray(data, dtype=np.float64)
+        if nodata is not None:
+            self.data[self.data == nodata] = np.nan
+        self.west = west
+        self.north = north
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+
+
+def read_ascii_grid(path: str, bbox) -> SourceRaster:
+    """Read an ESRI ASCII grid"""
+    header = {}
+    with open(path) as f:
+        for _ in range(6):
+            key, value = f.readline().split()
+            header[key.lower()] = float(value)
+        data = np.loadtxt(f, dtype=np.float64)
+
+    cell = header["cellsize"]
+    rows = int(header["nrows"])
+    west = header.get("xllcorner", header.get("xllcenter", 0.0) - cell / 2)
+    south = header.get("yllcorner", header.get("yllcenter", 0.0) - cell / 2)
+    north = south + rows * cell
+
+    return crop(
+        SourceRaster(data, west, north, cell, cell, header.get("nodata_value")),
+        bbox,
+    )
+
+
+def read_geotiff(path: str, bbox) -> SourceRaster:
+    """Read the bbox window of a GeoTIFF (requires rasterio)"""
+    try:
+        import rasterio
+        from rasterio.windows import from_bounds
+    except ImportError:
+        raise SystemExit("rasterio is required to read GeoTIFF sources")
+
+    with rasterio.open(path) as src:
+        window = from_bounds(*bbox, transform=src.transform).round_offsets()
+        window = window.round_lengths()
+        data = src.read(1, window=window)
+        transform = src.window_transform(window)
+        return SourceRaster(
+            data, transform.c, transform.f, transform.a, -transform.e, src.nodata
+        )
+
+
+def read_raster(path: str, bbox) -> SourceRaster:
+    if path.lower().endswith(".asc"):
+        return read_ascii_grid(path, bbox)
+    return read_geotiff(path, bbox)
+
+
+def crop(raster: SourceRaster, bbox) -> SourceRaster:
+    west, south, east, north = bbox
+    r0 = max(int((raster.north - north) // raster.cell_height), 0)
+    r1 = int(np.ceil((raster.north - south) / raster.cell_height))
+    c0 = max(int((west - raster.west) // raster.cell_width), 0)
+    c1 = int(np.ceil((east - raster.west) / raster.cell_width))
+    raster.data = raster.data[r0:r1, c0:c1]
+    raster.west += c0 * raster.cell_width
+    raster.north -= r0 * raster.cell_height
+    return raster
+
+
+def target_indices(raster: SourceRaster, bbox, resolution, shape):
+    """Flat target cell index for every source cell center (-1 when outside)"""
+    west, _, _, north = bbox
+    rows, cols = raster.data.shape
+    lat = raster.north - (np.arange(rows) + 0.5) * raster.cell_height
+    lon = raster.west + (np.arange(cols) + 0.5) * raster.cell_width
+
+    target_row = np.floor((north - lat) / resolution).astype(np.int64)
+    target_col = np.floor((lon - west) / resolution).astype(np.int64)
+    valid_row = (target_row >= 0) & (target_row < shape[0])
+    valid_col = (target_col >= 0) & (target_col < shape[1])
+
+    index = target_row[:, None] * shape[1] + target_col[None, :]
+    index[~(valid_row[:, None] & valid_col[None, :])] = -1
+    return index
+
+
+def sample_centers(raster: SourceRaster, bbox, resolution, shape) -> np.ndarray:
+    """Nearest-neighbour sample of the source at each target cell center"""
+    west, _, _, north = bbox
+    lat = north - (np.arange(shape[0]) + 0.5) * resolution
+    lon = west + (np.arange(shape[1]) + 0.5) * resolution
+
+    rows = np.floor((raster.north - lat) / raster.cell_height).astype(np.int64)
+    cols = np.floor((lon - raster.west) / raster.cell_width).astype(np.int64)
+    rows = np.clip(rows, 0, raster.data.shape[0] - 1)
+    cols = np.clip(cols, 0, raster.data.shape[1] - 1)
+    return raster.data[rows[:, None], cols[None, :]]
+
+
+def resample_mean(raster: SourceRaster, bbox, resolution, shape) -> np.ndarray:
+    """Block mean of source cells per target cell (nearest sample where coarser)"""
+    index = target_indices(raster, bbox, resolution, shape).ravel()
+    values = raster.data.ravel()
+    keep = (index >= 0) & ~np.isnan(values)
+
+    size = shape[0] * shape[1]
+    sums = np.bincount(index[keep], weights=values[keep], minlength=size)
+    counts = np.bincount(index[keep], minlength=size)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = (sums / counts).reshape(shape)
+
+    empty = counts.reshape(shape) == 0
+    result[empty] = sample_centers(raster, bbox, resolution, shape)[empty]
+    return result
+
+
+def resample_zone(raster: SourceRaster, bbox, resolution, shape) -> np.ndarray:
+    """Majority zone per target cell"""
+    lut = np.zeros(256, dtype=np.int64)
+    for code, name in KOPPEN_TO_ZONE.items():
+        lut[code] = CLIMATE_ZONES.index(name)
+
+    codes = np.nan_to_num(raster.data, nan=0).astype(np.int64)
+    zones = lut[np.clip(codes, 0, 255)]
+
+    index = target_indices(raster, bbox, resolution, shape).ravel()
+    zones = zones.ravel()
+    keep = (index >= 0) & (zones > 0)
+
+    n_zones = len(CLIMATE_ZONES)
+    size = shape[0] * shape[1]
+    votes = np.bincount(
+        index[keep] * n_zones + zones[keep], minlength=size * n_zones
+    ).reshape(size, n_zones)
+
+    result = votes.argmax(axis=1).reshape(shape)
+
+    empty = votes.sum(axis=1).reshape(shape) == 0
+    nearest = sample_centers(
+        SourceRaster(
+            zones.reshape(raster.data.shape).astype(np.float64),
+            raster.west,
+            raster.north,
+            raster.cell_width,
+            raster.cell_height,
+            None,
+        ),
+        bbox,
+        resolution,
+        shape,
+    )
+    result[empty] = nearest[empty]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rainfall", required=True, help="Annual rainfall raster (mm)")
+    parser.add_argument(
+        "--temperature", required=True, help="Mean temperature raster (°C)"
+    )
+    parser.add_argument("--koppen", required=True, help="Köppen-Geiger code raster")
+    parser.add_argument("--output", required=True, help="Output grid file")
+    parser.add_argument(
+        "--bbox",
+        nargs=4,
+        type=float,
+        default=DEFAULT_BBOX,
+        metavar=("WEST", "SOUTH", "EAST", "NORTH"),
+    )
+    parser.add_argument(
+        "--resolution",
+        type=float,
+        default=DEFAULT_RESOLUTION,
+        help="Cell size (degrees)",
+    )
+    parser.add_argument(
+        "--temperature-scale",
+        type=float,
+        default=1.0,
+        help="Multiplier to convert source temperature values to °C",
+    )
+    parser.add_argument("--upload", help="s3://bucket/key to upload the result to")
+    args = parser.parse_args()
+
+    bbox = tuple(args.bbox)
+    west, south, east, north = bbox
+    shape = (
+        int(np.ceil((north - south) / args.resolution)),
+        int(np.ceil((east - west) / args.resolution)),
+    )
+    print(f"Target grid: {shape[0]} x {shape[1]} cells at {args.resolution:.5f}°")
+
+    rainfall = resample_mean(
+        read_raster(args.rainfall, bbox), bbox, args.resolution, shape
+    )
+    temperature = resample_mean(
+        read_raster(args.temperature, bbox), bbox, args.resolution, shape
+    )
+    zone = resample_zone(read_raster(args.koppen, bbox), bbox, args.resolution, shape)
+
+    write_grid(
+        args.output,
+        rainfall,
+        temperature * args.temperature_scale,
+        zone,
+        west,
+        north,
+        args.resolution,
+        args.resolution,
+    )
+
+    grid = ClimateGrid(args.output)
+    size_mb = os.path.getsize(args.output) / (1024 * 1024)
+    print(f"Wrote {args.output} ({grid.rows} x {grid.cols}, {size_mb:.1f} MB)")
+
+    if args.upload:
+        import boto3
+
+        bucket, _, key = args.upload.replace("s3://", "", 1).partition("/")
+        boto3.client("s3").upload_file(args.output, bucket, key)
+        print(f"Uploaded to {args.upload}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Cut a source raster into the tiles read by the analysis pipeline.
+
+Reads a lon/lat (EPSG:4326) GeoTIFF, resamples it to the layer resolution
+and writes {output}/{layer}/{tile_row}/{tile_col}.npy following the tiling
+scheme in src/rasters.py. Requires rasterio.
+
+Usage:
+    python build_raster_tiles.py --layer dem --source srtm_mosaic.tif \\
+        --bbox -48 -22 -44 -18 --output ./tiles \\
+        --upload s3://sistema-rural-geospatial-cache/rasters
+"""
+
+import argparse
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from rasters import (  # noqa: E402
+    GRID_NORTH,
+    GRID_WEST,
+    LAYERS,
+    cell_range,
+    tiles_for_range,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--layer", required=True, choices=sorted(LAYERS))
+    parser.add_argument("--source", required=True, help="Source GeoTIFF (EPSG:4326)")
+    parser.add_argument(
+        "--bbox",
+        nargs=4,
+        type=float,
+        required=True,
+        metavar=("WEST", "SOUTH", "EAST", "NORTH"),
+    )
+    parser.add_argument("--output", required=True, help="Output directory")
+    parser.add_argument("--upload", help="s3://bucket/prefix to upload tiles to")
+    args = parser.parse_args()
+
+    try:
+        import rasterio
+        from rasterio.enums import Resampling
+        from rasterio.windows import from_bounds
+    except ImportError:
+        raise SystemExit("rasterio is required to read the source raster")
+
+    layer = LAYERS[args.layer]
+    size = layer.tile_size
+    res = layer.resolution
+    rows, cols = cell_range(layer, tuple(args.bbox))
+    tiles = tiles_for_range(layer, rows, cols)
+    print(f"{len(tiles)} {layer.name} tiles of {size}x{size} cells")
+
+    s3 = None
+    if args.upload:
+        import boto3
+
+        s3 = boto3.client("s3")
+        bucket, _, prefix = args.upload.replace("s3://", "", 1).partition("/")
+
+    with rasterio.open(args.source) as src:
+        for tile_row, tile_col in tiles:
+            west = GRID_WEST + tile_col * size * res
+            north = GRID_NORTH - tile_row * size * res
+            window = from_bounds(
+                west, north - size * res, west + size * res, north, src.transform
+            )
+            data = src.read(
+                1,
+                window=window,
+                out_shape=(size, size),
+                resampling=Resampling.bilinear,
+                boundless=True,
+                masked=True,
+            )
+
+            encoded = np.rint(data.astype(np.float64).filled(np.nan) / layer.scale)
+            encoded = np.where(np.isnan(encoded), layer.nodata, encoded)
+            encoded = np.clip(encoded, -32768, 32767).astype(np.int16)
+
+            # The analysis reads a missing tile as all nodata
+            if np.all(encoded == layer.nodata):
+                continue
+
+            relative = os.path.join(layer.name, str(tile_row), f"{tile_col}.npy")
+            path = os.path.join(args.output, relative)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            np.save(path, encoded)
+
+            if s3:
+                s3.upload_file(path, bucket, f"{prefix.rstrip('/')}/{relative}")
+            print(f"Wrote {relative}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+import json
+import time
+import boto3
+import os
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+
+from lanes import SLOW, analysis_cost, classify_lane
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Environment variables
+PROPERTIES_TABLE = os.environ.get("PROPERTIES_TABLE")
+ANALYSIS_QUEUE_URL = os.environ.get("ANALYSIS_QUEUE_URL")
+ANALYSIS_SLOW_QUEUE_URL = os.environ.get("ANALYSIS_SLOW_QUEUE_URL")
+CHECKPOINT_BUCKET = os.environ.get("GEOSPATIAL_CACHE_BUCKET")
+ANALYSIS_VERSION = os.environ.get("ANALYSIS_VERSION", "v1")
+TOTAL_SEGMENTS = int(os.environ.get("BACKFILL_SEGMENTS", "4"))
+RATE_PER_SECOND = float(os.environ.get("BACKFILL_RATE", "20"))
+
+# Stop scanning this long before the Lambda deadline to save the checkpoint
+DEADLINE_MARGIN_MS = 30000
+
+# SendMessageBatch accepts at most 10 entries per call
+SQS_BATCH_SIZE = 10
+
+
+class TokenBucket:
+    """Thread-safe token bucket: rate tokens/s, bursts up to capacity"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, SQS_BATCH_SIZE)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: int = 1):
+        """Block until the tokens are available"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Checkpoint:
+    """Per-segment scan progress, stored as JSON in S3 or a local file.
+
+    Each segment records its LastEvaluatedKey after every page whose
+    selected items were all enqueued, so a resumed run never skips an item
+    (at worst a page is enqueued twice, which the analysis claim absorbs).
+    """
+
+    def __init__(
+        self,
+        location: str,
+        version: str,
+        total_segments: int,
+        s3_client=None,
+    ):
+        self.location = location
+        self.s3 = s3_client
+        self.lock = threading.Lock()
+        self.state = self.load() or {}
+
+        if (
+            self.state.get("version") != version
+            or self.state.get("totalSegments") != total_segments
+        ):
+            self.state = {
+                "version": version,
+                "totalSegments": total_segments,
+                "startedAt": datetime.now(timezone.utc).isoformat(),
+                "segments": {},
+            }
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        try:
+            if self.location.startswith("s3://"):
+                bucket, _, key = self.location[5:].partition("/")
+                body = self.s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+                return json.loads(body)
+            with open(self.location) as f:
+                return json.load(f)
+        except (ClientError, FileNotFoundError):
+            return None
+
+    def save(self):
+        with self.lock:
+            body = json.dumps(self.state, default=str)
+        if self.location.startswith("s3://"):
+            bucket, _, key = self.location[5:].partition("/")
+            self.s3.put_object(Bucket=bucket, Key=key, Body=body)
+        else:
+            with open(self.location, "w") as f:
+                f.write(body)
+
+    def segment(self, segment: int) -> Dict[str, Any]:
+        with self.lock:
+            return self.state["segments"].setdefault(
+                str(segment),
+                {"lastKey": None, "done": False, "scanned": 0, "enqueued": 0},
+            )
+
+    def advance(
+        self, segment: int, last_key: Optional[Dict], scanned: int, enqueued: int
+    ):
+        with self.lock:
+            progress = self.state["segments"][str(segment)]
+            progress["lastKey"] = last_key
+            progress["done"] = last_key is None
+            progress["scanned"] += scanned
+            progress["enqueued"] += enqueued
+        self.save()
+
+    @property
+    def complete(self) -> bool:
+        segments = self.state["segments"]
+        return len(segments) == self.state["totalSegments"] and all(
+            progress["done"] for progress in segments.values()
+        )
+
+    def totals(self) -> Dict[str, int]:
+        segments = self.state["segments"].values()
+        return {
+            "scanned": sum(progress["scanned"] for progress in segments),
+            "enqueued": sum(progress["enqueued"] for progress in segments),
+            "segmentsDone": sum(1 for progress in segments if progress["done"]),
+        }
+
+
+def checkpoint_location(location: str, dry_run: bool = False) -> str:
+    """Checkpoint of a run; a dry run keeps its own next to the real one.
+
+    A dry run enqueues nothing, so it must not mark segments done for the
+    real backfill (checkpoint.json -> checkpoint.dry-run.json).
+    """
+    if not dry_run:
+        return location
+    root, ext = os.path.splitext(location)
+    return f"{root}.dry-run{ext}"
+
+
+class Backfill:
+    """Re-enqueue properties whose analysis is missing, failed or outdated.
+
+    The properties table is read with a parallel Scan (one thread per
+    segment). Selected items are sent to the queue of their analysis lane
+    as EventBridge-shaped envelopes in SendMessageBatch chunks, paced by a
+    token bucket shared by all segments.
+    """
+
+    def __init__(
+        self,
+        table,
+        sqs_client,
+        queue_url: str,
+        checkpoint: Checkpoint,
+        version: str,
+        rate: float,
+        page_size: int = 500,
+        dry_run: bool = False,
+        slow_queue_url: Optional[str] = None,
+    ):
+        self.table = table
+        self.sqs = sqs_client
+        self.queue_url = queue_url
+        self.slow_queue_url = slow_queue_url or queue_url
+        self.checkpoint = checkpoint
+        self.version = version
+        self.limiter = TokenBucket(rate)
+        self.page_size = page_size
+        self.dry_run = dry_run
+        self.deadline: Optional[float] = None
+
+    def out_of_time(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def run(self, seconds: Optional[float] = None) -> Dict[str, Any]:
+        """Scan until done or until seconds have elapsed; returns progress"""
+        self.deadline = time.monotonic() + seconds if seconds else None
+        total = self.checkpoint.state["totalSegments"]
+
+        with ThreadPoolExecutor(max_workers=total) as executor:
+            for future in [
+                executor.submit(self.scan_segment, segment) for segment in range(total)
+            ]:
+                future.result()
+
+        return {"complete": self.checkpoint.complete, **self.checkpoint.totals()}
+
+    def scan_segment(self, segment: int):
+        progress = self.checkpoint.segment(segment)
+        last_key = progress["lastKey"]
+
+        while not progress["done"] and not self.out_of_time():
+            params = {
+                "Segment": segment,
+                "TotalSegments": self.checkpoint.state["totalSegments"],
+                "Limit": self.page_size,
+                "ProjectionExpression": "userId, propertyId, coordinates",
+                # Missing, failed or produced by another analysis version
+                "FilterExpression": "attribute_not_exists(analysisStatus) OR analysisStatus = :failed OR attribute_not_exists(analysisVersion) OR analysisVersion <> :version",
+                "ExpressionAttributeValues": {
+                    ":failed": "failed",
+                    ":version": self.version,
+                },
+            }
+            if last_key:
+                params["ExclusiveStartKey"] = last_key
+
+            response = self.table.scan(**params)
+            items = [
+                item for item in response.get("Items", []) if item.get("coordinates")
+            ]
+
+            enqueued = self.enqueue(items)
+            last_key = response.get("LastEvaluatedKey")
+            self.checkpoint.advance(
+                segment, last_key, response.get("ScannedCount", 0), enqueued
+            )
+
+    def enqueue(self, items: List[Dict[str, Any]]) -> int:
+        """Send items in 10-message batches; failed entries are retried"""
+        queues = {}
+        for item in items:
+            message = analysis_message(item)
+            slow = message["detail"]["analysisLane"] == SLOW
+            queue_url = self.slow_queue_url if slow else self.queue_url
+            queues.setdefault(queue_url, []).append(message)
+
+        sent = 0
+        for queue_url, messages in queues.items():
+            for start in range(0, len(messages), SQS_BATCH_SIZE):
+                sent += self.send_batch(
+                    queue_url, messages[start : start + SQS_BATCH_SIZE]
+                )
+        return sent
+
+    def send_batch(self, queue_url: str, messages: List[Dict[str, Any]]) -> int:
+        self.limiter.acquire(len(messages))
+        if self.dry_run:
+            return len(messages)
+
+        entries = [
+            {"Id": str(index), "MessageBody": json.dumps(message)}
+            for index, message in enumerate(messages)
+        ]
+        sent = 0
+        for attempt in range(4):
+            response = self.sqs.send_message_batch(QueueUrl=queue_url, Entries=entries)
+            sent += len(response.get("Successful", []))
+            failed_ids = {entry["Id"] for entry in response.get("Failed", [])}
+            entries = [entry for entry in entries if entry["Id"] in failed_ids]
+            if not entries:
+                break
+            time.sleep(0.2 * 2**attempt)
+
+        if entries:
+            # Leave the checkpoint behind this page so a rerun retries it
+            raise RuntimeError(f"Could not enqueue {len(entries)} properties")
+        return sent
+
+
+def analysis_message(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Same envelope the analysis lambda receives from EventBridge"""
+    coordinates = [[float(coord[0]), float(coord[1])] for coord in item["coordinates"]]
+    cost = analysis_cost(coordinates)
+    return {
+        "source": "analysis.backfill",
+        "detail-type": "Property Backfill",
+        "time": datetime.now(timezone.utc).isoformat(),
+        "detail": {
+            "propertyId": item["propertyId"],
+            "userId": item["userId"],
+            "coordinates": coordinates,
+            "analysisLane": classify_lane(cost),
+            "analysisCost": cost,
+        },
+    }
+
+
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Run (or resume) a backfill until done or close to the Lambda timeout.
+
+    Event: {"version": "...", "segments": N, "rate": R, "dryRun": bool,
+    "reset": bool}, all optional. Invoke again while "complete" is false.
+    """
+    version = event.get("version", ANALYSIS_VERSION)
+    segments = int(event.get("segments", TOTAL_SEGMENTS))
+    s3 = boto3.client("s3")
+
+    dry_run = bool(event.get("dryRun"))
+    location = checkpoint_location(
+        f"s3://{CHECKPOINT_BUCKET}/backfill/{version}/checkpoint.json", dry_run
+    )
+    if event.get("reset"):
+        s3.delete_object(Bucket=CHECKPOINT_BUCKET, Key=location.split("/", 3)[3])
+
+    checkpoint = Checkpoint(location, version, segments, s3)
+    backfill = Backfill(
+        boto3.resource("dynamodb").Table(PROPERTIES_TABLE),
+        boto3.client("sqs"),
+        ANALYSIS_QUEUE_URL,
+        checkpoint,
+        version,
+        float(event.get("rate", RATE_PER_SECOND)),
+        dry_run=dry_run,
+        slow_queue_url=ANALYSIS_SLOW_QUEUE_URL,
+    )
+
+    seconds = None
+    if context is not None:
+        seconds = (context.get_remaining_time_in_millis() - DEADLINE_MARGIN_MS) / 1000
+
+    result = backfill.run(seconds)
+    logger.info(f"Backfill {version}: {json.dumps(result)}")
+    return result
@@ -0,0 +1,213 @@
+import struct
+import numpy as np
+from typing import Dict, Any, Optional, Tuple
+
+from geometry import ring_array, ring_bbox, ring_centroid, cell_coverage
+
+# ===================================
+# FILE FORMAT
+# ===================================
+#
+# 48-byte little-endian header followed by a row-major, north-up grid of
+# 5-byte cells:
+#
+#   magic        4s   b"SRCG"
+#   version      u16
+#   reserved     u16
+#   rows         u32
+#   cols         u32
+#   west         f64  longitude of the left edge of column 0
+#   north        f64  latitude of the top edge of row 0
+#   cell_width   f64  degrees
+#   cell_height  f64  degrees
+#
+# Cells: rainfall (u16, mm/year), temperature (i16, tenths of °C),
+# zone (u8, index into CLIMATE_ZONES).
+
+MAGIC = b"SRCG"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHHIIdddd")
+
+CELL_DTYPE = np.dtype([("rainfall", "<u2"), ("temperature", "<i2"), ("zone", "u1")])
+
+RAINFALL_NODATA = 0xFFFF
+TEMPERATURE_NODATA = -32768
+TEMPERATURE_SCALE = 10.0
+
+CLIMATE_ZONES = (
+    "unknown",
+    "tropical_rainforest",
+    "tropical_monsoon",
+    "tropical_savanna",
+    "semi_arid",
+    "arid",
+    "mediterranean",
+    "humid_subtropical",
+    "tropical_highland",
+    "oceanic",
+    "continental",
+    "polar",
+)
+
+
+def write_grid(
+    path: str,
+    rainfall: np.ndarray,
+    temperature: np.ndarray,
+    zone: np.ndarray,
+    west: float,
+    north: float,
+    cell_width: float,
+    cell_height: float,
+) -> None:
+    """Pack decoded bands (mm, °C, zone code) into a grid file.
+
+    NaN rainfall/temperature values are stored as nodata.
+    """
+    rows, cols = rainfall.shape
+    cells = np.empty((rows, cols), dtype=CELL_DTYPE)
+
+    rain = np.nan_to_num(rainfall, nan=RAINFALL_NODATA)
+    cells["rainfall"] = np.clip(np.rint(rain), 0, RAINFALL_NODATA).astype("<u2")
+
+    temp = np.rint(temperature * TEMPERATURE_SCALE)
+    temp = np.nan_to_num(temp, nan=TEMPERATURE_NODATA)
+    cells["temperature"] = np.clip(temp, TEMPERATURE_NODATA, 32767).astype("<i2")
+
+    cells["zone"] = np.clip(zone, 0, len(CLIMATE_ZONES) - 1).astype("u1")
+
+    with open(path, "wb") as f:
+        f.write(
+            HEADER.pack(
+                MAGIC,
+                FORMAT_VERSION,
+                0,
+                rows,
+                cols,
+                west,
+                north,
+                cell_width,
+                cell_height,
+            )
+        )
+        cells.tofile(f)
+
+
+class ClimateGrid:
+    """Memory-mapped climate-normals grid"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+
+        if len(header) < HEADER.size:
+            raise ValueError(f"Climate grid too small: {path}")
+
+        (
+            magic,
+            version,
+            _,
+            self.rows,
+            self.cols,
+            self.west,
+            self.north,
+            self.cell_width,
+            self.cell_height,
+        ) = HEADER.unpack(header)
+
+        if magic != MAGIC:
+            raise ValueError(f"Not a climate grid file: {path}")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported climate grid version {version}: {path}")
+
+        self.cells = np.memmap(
+            path,
+            dtype=CELL_DTYPE,
+            mode="r",
+            offset=HEADER.size,
+            shape=(self.rows, self.cols),
+        )
+
+    def cell_index(self, lon: float, lat: float) -> Optional[Tuple[int, int]]:
+        """Row/column of the cell containing a point, or None outside the grid"""
+        row = int((self.north - lat) // self.cell_height)
+        col = int((lon - self.west) // self.cell_width)
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return row, col
+        return None
+
+    def lookup(self, lon: float, lat: float) -> Optional[Dict[str, Any]]:
+        """O(1) lookup of the cell containing a point"""
+        index = self.cell_index(lon, lat)
+        if index is None:
+            return None
+
+        cell = self.cells[index]
+        if (
+            cell["rainfall"] == RAINFALL_NODATA
+            or cell["temperature"] == TEMPERATURE_NODATA
+        ):
+            return None
+
+        return {
+            "annual_rainfall": float(cell["rainfall"]),
+            "avg_temperature": round(float(cell["temperature"]) / TEMPERATURE_SCALE, 1),
+            "climate_zone": CLIMATE_ZONES[int(cell["zone"])],
+            "cells": 1,
+        }
+
+    def summarize(
+        self, coordinates: list, samples: int = 4
+    ) -> Optional[Dict[str, Any]]:
+        """Area-weighted climate over the cells a polygon covers.
+
+        Each cell is weighted by the fraction of it inside the polygon
+        (estimated on a samples x samples lattice) times cos(latitude).
+        Polygons too small to cover any sample point fall back to the cell
+        containing the centroid.
+        """
+        ring = ring_array(coordinates)
+        west, south, east, north = ring_bbox(ring)
+
+        r0 = max(int((self.north - north) // self.cell_height), 0)
+        r1 = min(int((self.north - south) // self.cell_height) + 1, self.rows)
+        c0 = max(int((west - self.west) // self.cell_width), 0)
+        c1 = min(int((east - self.west) // self.cell_width) + 1, self.cols)
+
+        if r0 < r1 and c0 < c1:
+            window = np.asarray(self.cells[r0:r1, c0:c1])
+            coverage = cell_coverage(
+                ring,
+                self.west,
+                self.north,
+                self.cell_width,
+                self.cell_height,
+                (r0, r1),
+                (c0, c1),
+                samples,
+            )
+
+            row_lat = self.north - (np.arange(r0, r1) + 0.5) * self.cell_height
+            weights = coverage * np.cos(np.radians(row_lat))[:, None]
+            valid = (window["rainfall"] != RAINFALL_NODATA) & (
+                window["temperature"] != TEMPERATURE_NODATA
+            )
+            weights = np.where(valid, weights, 0.0)
+            total = weights.sum()
+
+            if total > 0:
+                rainfall = (window["rainfall"] * weights).sum() / total
+                temperature = (window["temperature"] * weights).sum() / total
+                zone_weights = np.bincount(
+                    window["zone"].ravel(),
+                    weights=weights.ravel(),
+                    minlength=len(CLIMATE_ZONES),
+                )
+                return {
+                    "annual_rainfall": round(float(rainfall), 1),
+                    "avg_temperature": round(float(temperature) / TEMPERATURE_SCALE, 1),
+                    "climate_zone": CLIMATE_ZONES[int(zone_weights.argmax())],
+                    "cells": int(np.count_nonzero(weights)),
+                }
+
+        return self.lookup(*ring_centroid(ring))
@@ -0,0 +1,108 @@
+import json
+import time
+import random
+import logging
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger()
+
+# PutEvents accepts at most 10 entries per call
+MAX_ENTRIES = 10
+
+
+class EventPublisher:
+    """Buffers EventBridge events and publishes them in PutEvents chunks.
+
+    Every event is tagged with a key (the SQS messageId it came from). On
+    flush, entries are sent 10 at a time; only the entries EventBridge
+    reports as failed (or a whole chunk whose call raised) are retried, with
+    full-jitter exponential backoff. flush() returns the keys of the events
+    that could still not be published.
+    """
+
+    def __init__(
+        self,
+        client,
+        bus_name: str,
+        source: str,
+        max_attempts: int = 4,
+        base_delay: float = 0.1,
+        max_delay: float = 2.0,
+    ):
+        self.client = client
+        self.bus_name = bus_name
+        self.source = source
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.pending: List[Tuple[str, Dict[str, Any]]] = []
+        self.stats = {"events": 0, "calls": 0, "retried": 0, "failed": 0}
+
+    def add(self, key: str, detail_type: str, detail: Dict[str, Any]) -> None:
+        self.pending.append(
+            (
+                key,
+                {
+                    "Source": self.source,
+                    "DetailType": detail_type,
+                    "Detail": json.dumps(detail),
+                    "EventBusName": self.bus_name,
+                },
+            )
+        )
+
+    def flush(self) -> List[str]:
+        """Publish everything buffered; returns the keys that failed"""
+        pending, self.pending = self.pending, []
+        self.stats["events"] += len(pending)
+        failed = set()
+
+        for attempt in range(self.max_attempts):
+            if not pending:
+                break
+            if attempt:
+                self.stats["retried"] += len(pending)
+                self.sleep(attempt)
+
+            retry = []
+            for start in range(0, len(pending), MAX_ENTRIES):
+                chunk = pending[start : start + MAX_ENTRIES]
+                retry.extend(self.put_chunk(chunk))
+            pending = retry
+
+        for key, entry in pending:
+            failed.add(key)
+            logger.error(f"Could not publish {entry['DetailType']} for {key}")
+
+        self.stats["failed"] += len(pending)
+        return sorted(failed)
+
+    def put_chunk(
+        self, chunk: List[Tuple[str, Dict[str, Any]]]
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """Send one PutEvents call; returns the entries to retry"""
+        self.stats["calls"] += 1
+        try:
+            response = self.client.put_events(Entries=[entry for _, entry in chunk])
+        except Exception as e:
+            logger.warning(f"PutEvents call failed: {str(e)}")
+            return chunk
+
+        if not response.get("FailedEntryCount"):
+            return []
+
+        # Result entries are in request order; failed ones carry an ErrorCode
+        retry = []
+        for item, result in zip(chunk, response.get("Entries", [])):
+            if result.get("ErrorCode"):
+                logger.warning(
+                    f"Event for {item[0]} rejected: {result['ErrorCode']} "
+                    f"{result.get('ErrorMessage', '')}"
+                )
+                retry.append(item)
+        return retry
+
+    def sleep(self, attempt: int) -> None:
+        """Full-jitter backoff: uniform in [0, min(max, base * 2^attempt)]"""
+        cap = min(self.max_delay, self.base_delay * (2**attempt))
+        time.sleep(random.uniform(0, cap))
@@ -0,0 +1,162 @@
+import hashlib
+import numpy as np
+from typing import Tuple
+
+
+def ring_array(coordinates: list) -> np.ndarray:
+    """Convert a [[lon, lat], ...] ring to an (n, 2) float array without the closing vertex"""
+    ring = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+    if len(ring) > 1 and np.array_equal(ring[0], ring[-1]):
+        ring = ring[:-1]
+    return ring
+
+
+def canonical_ring(ring: np.ndarray, quantum: float) -> np.ndarray:
+    """Quantize a ring and normalize orientation (CCW) and start vertex.
+
+    Two rings describing the same polygon at `quantum` resolution map to the
+    same integer array regardless of winding or which vertex they start at.
+    """
+    grid = np.round(ring / quantum).astype(np.int64)
+
+    # Drop vertices that collapsed onto their predecessor after quantization
+    if len(grid) > 1:
+        keep = np.any(grid != np.roll(grid, 1, axis=0), axis=1)
+        if keep.any():
+            grid = grid[keep]
+        else:
+            grid = grid[:1]
+
+    if len(grid) >= 3:
+        x, y = grid[:, 0].astype(np.float64), grid[:, 1].astype(np.float64)
+        signed_area = (x * np.roll(y, -1) - np.roll(x, -1) * y).sum()
+        if signed_area < 0:
+            grid = grid[::-1]
+
+    # Start at the lexicographically smallest (lon, lat) vertex
+    start = np.lexsort((grid[:, 1], grid[:, 0]))[0]
+    return np.roll(grid, -start, axis=0)
+
+
+def geometry_hash(coordinates: list, quantum: float = 1e-6) -> str:
+    """Stable hash of a polygon ring at the given coordinate quantum (degrees)"""
+    grid = canonical_ring(ring_array(coordinates), quantum)
+    digest = hashlib.sha256()
+    digest.update(repr(quantum).encode())
+    digest.update(np.ascontiguousarray(grid, dtype="<i8").tobytes())
+    return digest.hexdigest()[:32]
+
+
+def ring_bbox(ring: np.ndarray) -> Tuple[float, float, float, float]:
+    """Return (west, south, east, north) of a ring"""
+    west, south = ring.min(axis=0)
+    east, north = ring.max(axis=0)
+    return float(west), float(south), float(east), float(north)
+
+
+def ring_centroid(ring: np.ndarray) -> Tuple[float, float]:
+    """Area centroid of a ring (falls back to the vertex mean for degenerate rings)"""
+    x, y = ring[:, 0], ring[:, 1]
+    x2, y2 = np.roll(x, -1), np.roll(y, -1)
+    cross = x * y2 - x2 * y
+    area = cross.sum() / 2.0
+    if abs(area) < 1e-15:
+        return float(x.mean()), float(y.mean())
+    cx = ((x + x2) * cross).sum() / (6.0 * area)
+    cy = ((y + y2) * cross).sum() / (6.0 * area)
+    return float(cx), float(cy)
+
+
+def rasterize_ring(
+    ring: np.ndarray,
+    west: float,
+    north: float,
+    cell_width: float,
+    cell_height: float,
+    rows: Tuple[int, int],
+    cols: Tuple[int, int],
+) -> np.ndarray:
+    """Cell-center mask of a ring over a window of a north-up grid.
+
+    Scanline even-odd fill: every edge yields its crossings with the row
+    centers it spans, crossings are sorted per row and paired into spans.
+    Cost is O(edges + crossings + cells), so dense rings over large windows
+    stay cheap. A cell is inside when an odd number of edges cross the
+    row center to its left.
+    """
+    r0, r1 = rows
+    c0, c1 = cols
+    n_rows, n_cols = max(r1 - r0, 0), max(c1 - c0, 0)
+    if n_rows == 0 or n_cols == 0 or len(ring) < 3:
+        return np.zeros((n_rows, n_cols), dtype=bool)
+
+    x1, y1 = ring[:, 0], ring[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    keep = y1 != y2
+    x1, y1, x2, y2 = x1[keep], y1[keep], x2[keep], y2[keep]
+    slope = (x2 - x1) / (y2 - y1)
+
+    # Rows whose center y satisfies min(y1, y2) <= y < max(y1, y2)
+    lo = np.floor((north - np.maximum(y1, y2)) / cell_height - 0.5).astype(np.int64) + 1
+    hi = np.floor((north - np.minimum(y1, y2)) / cell_height - 0.5).astype(np.int64)
+    lo = np.maximum(lo, r0)
+    hi = np.minimum(hi, r1 - 1)
+    counts = np.maximum(hi - lo + 1, 0)
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros((n_rows, n_cols), dtype=bool)
+
+    edge = np.repeat(np.arange(len(x1)), counts)
+    row = lo[edge] + (np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts))
+    y = north - (row + 0.5) * cell_height
+    x = x1[edge] + (y - y1[edge]) * slope[edge]
+
+    order = np.lexsort((x, row))
+    row, x = row[order], x[order]
+    rank = np.arange(total) - np.searchsorted(row, row, side="left")
+    sign = np.where(rank % 2 == 0, 1, -1).astype(np.int32)
+
+    # First column whose center lies at or right of the crossing
+    col = np.ceil((x - west) / cell_width - 0.5).astype(np.int64) - c0
+    col = np.clip(col, 0, n_cols)
+
+    diff = np.zeros((n_rows, n_cols + 1), dtype=np.int32)
+    np.add.at(diff, (row - r0, col), sign)
+    return np.cumsum(diff, axis=1)[:, :n_cols] > 0
+
+
+def cell_coverage(
+    ring: np.ndarray,
+    west: float,
+    north: float,
+    cell_width: float,
+    cell_height: float,
+    rows: Tuple[int, int],
+    cols: Tuple[int, int],
+    samples: int = 1,
+) -> np.ndarray:
+    """Fraction of each grid cell in the window covered by the ring.
+
+    The grid is north-up: cell (r, c) spans
+    [west + c*cell_width, west + (c+1)*cell_width] x
+    [north - (r+1)*cell_height, north - r*cell_height].
+    With samples=1 this is the usual cell-center mask (0.0 or 1.0); larger
+    values supersample each cell on a samples x samples lattice.
+    """
+    r0, r1 = rows
+    c0, c1 = cols
+    n_rows, n_cols = r1 - r0, c1 - c0
+    if n_rows <= 0 or n_cols <= 0:
+        return np.zeros((max(n_rows, 0), max(n_cols, 0)), dtype=np.float32)
+
+    inside = rasterize_ring(
+        ring,
+        west,
+        north,
+        cell_width / samples,
+        cell_height / samples,
+        (r0 * samples, r1 * samples),
+        (c0 * samples, c1 * samples),
+    )
+    inside = inside.reshape(n_rows, samples, n_cols, samples)
+    return inside.mean(axis=(1, 3), dtype=np.float32)
@@ -0,0 +1,261 @@
+import io
+import uuid
+import logging
+import numpy as np
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from urllib.parse import quote
+
+logger = logging.getLogger()
+
+# ===================================
+# LAYOUT
+# ===================================
+#
+# One row per completed analysis, stored as Parquet under hive-style
+# partitions:
+#
+#   {prefix}/dt=YYYY-MM-DD/user={userId}/{uuid}.parquet
+#
+# dt and user are partition columns (taken from the path, not stored in the
+# files). Metric results are flattened into one scalar column each, so
+# analytics read only the columns and partitions they need.
+
+HISTORY_PREFIX = "analysis-history"
+
+# (column, metric, result key, arrow type)
+METRIC_COLUMNS = (
+    ("elevation_avg", "elevation", "avg_elevation", "float64"),
+    ("elevation_min", "elevation", "min_elevation", "float64"),
+    ("elevation_max", "elevation", "max_elevation", "float64"),
+    ("ndvi_avg", "ndvi", "avg_ndvi", "float64"),
+    ("ndvi_vegetation_coverage", "ndvi", "vegetation_coverage", "float64"),
+    ("ndvi_classification", "ndvi", "classification", "string"),
+    ("slope_avg", "slope", "avg_slope", "float64"),
+    ("slope_max", "slope", "max_slope", "float64"),
+    ("slope_classification", "slope", "slope_classification", "string"),
+    ("water_distance", "water_distance", None, "float64"),
+    ("weather_annual_rainfall", "weather", "annual_rainfall", "float64"),
+    ("weather_avg_temperature", "weather", "avg_temperature", "float64"),
+    ("weather_climate_zone", "weather", "climate_zone", "string"),
+)
+
+BASE_COLUMNS = (
+    ("property_id", "string"),
+    ("analysis_version", "string"),
+    ("geometry_fingerprint", "string"),
+    ("completed_at", "timestamp"),
+)
+
+
+def history_schema():
+    import pyarrow as pa
+
+    types = {
+        "string": pa.string(),
+        "float64": pa.float64(),
+        "timestamp": pa.timestamp("ms", tz="UTC"),
+    }
+    return pa.schema(
+        [pa.field(name, types[kind]) for name, kind in BASE_COLUMNS]
+        + [pa.field(name, types[kind]) for name, _, _, kind in METRIC_COLUMNS]
+    )
+
+
+def flatten_results(results: Dict[str, Any]) -> Dict[str, Any]:
+    """One scalar per metric column (None when the metric is missing)"""
+    row = {}
+    for column, metric, key, kind in METRIC_COLUMNS:
+        value = results.get(metric)
+        if key is not None:
+            value = value.get(key) if isinstance(value, dict) else None
+        if value is not None and kind == "float64":
+            value = float(value)
+        row[column] = value
+    return row
+
+
+class HistoryWriter:
+    """Buffers completed analyses and writes one Parquet file per partition.
+
+    Requires pyarrow (shipped in the analysis layer); without it history is
+    disabled and a warning is logged once.
+    """
+
+    def __init__(self, s3_client, bucket: str, prefix: str = HISTORY_PREFIX):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.rows: Dict[tuple, List[Dict[str, Any]]] = {}
+        self.enabled = True
+        self.stats = {"rows": 0, "files": 0}
+
+    def add(
+        self,
+        property_id: str,
+        user_id: str,
+        version: str,
+        fingerprint: str,
+        completed_at: datetime,
+        results: Dict[str, Any],
+    ) -> None:
+        partition = (completed_at.date().isoformat(), user_id or "unknown")
+        self.rows.setdefault(partition, []).append(
+            {
+                "property_id": property_id,
+                "analysis_version": version,
+                "geometry_fingerprint": fingerprint,
+                "completed_at": completed_at,
+                **flatten_results(results),
+            }
+        )
+
+    def flush(self) -> None:
+        """Write buffered rows; history is best effort and never raises"""
+        rows, self.rows = self.rows, {}
+        if not rows or not self.enabled:
+            return
+
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            logger.warning("pyarrow not available, analysis history disabled")
+            self.enabled = False
+            return
+
+        schema = history_schema()
+        for (day, user_id), partition_rows in rows.items():
+            key = (
+                f"{self.prefix}/dt={day}/user={quote(user_id, safe='')}/"
+                f"{uuid.uuid4().hex}.parquet"
+            )
+            try:
+                buffer = io.BytesIO()
+                table = pa.Table.from_pylist(partition_rows, schema=schema)
+                pq.write_table(table, buffer, compression="zstd")
+                self.s3.put_object(Bucket=self.bucket, Key=key, Body=buffer.getvalue())
+                self.stats["rows"] += len(partition_rows)
+                self.stats["files"] += 1
+            except Exception as e:
+                logger.error(f"Error writing analysis history {key}: {str(e)}")
+
+
+# ===================================
+# QUERY HELPERS
+# ===================================
+
+
+def history_dataset(location: str, filesystem=None):
+    """Dataset over the history store: s3://bucket/prefix or a local path"""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    if location.startswith("s3://"):
+        from pyarrow import fs
+
+        filesystem = filesystem or fs.S3FileSystem()
+        location = location[5:]
+
+    return ds.dataset(
+        location,
+        format="parquet",
+        partitioning=ds.partitioning(
+            pa.schema([("dt", pa.string()), ("user", pa.string())]), flavor="hive"
+        ),
+        filesystem=filesystem,
+    )
+
+
+def query_history(
+    location: str,
+    columns: Sequence[str],
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    user_ids: Optional[Iterable[str]] = None,
+    filesystem=None,
+):
+    """Read only the given columns of the partitions in [start, end] / users.
+
+    The dt and user filters prune whole partitions before any file is
+    opened; Parquet column projection skips the other columns' pages.
+    Returns a pyarrow Table (with dt and user available as columns).
+    """
+    import pyarrow.dataset as ds
+
+    dataset = history_dataset(location, filesystem)
+    condition = None
+
+    def both(a, b):
+        return b if a is None else a & b
+
+    if start is not None:
+        condition = both(condition, ds.field("dt") >= start.isoformat())
+    if end is not None:
+        condition = both(condition, ds.field("dt") <= end.isoformat())
+    if user_ids is not None:
+        condition = both(condition, ds.field("user").isin(list(user_ids)))
+
+    return dataset.to_table(columns=list(columns), filter=condition)
+
+
+def metric_trend(
+    location: str,
+    column: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    user_ids: Optional[Iterable[str]] = None,
+    filesystem=None,
+):
+    """Daily mean/min/max and property count of a metric column"""
+    table = query_history(
+        location, ["dt", "property_id", column], start, end, user_ids, filesystem
+    )
+    return (
+        table.group_by("dt")
+        .aggregate(
+            [
+                (column, "mean"),
+                (column, "min"),
+                (column, "max"),
+                ("property_id", "count_distinct"),
+            ]
+        )
+        .sort_by("dt")
+    )
+
+
+def portfolio_summary(
+    location: str,
+    columns: Sequence[str],
+    user_ids: Optional[Iterable[str]] = None,
+    end: Optional[date] = None,
+    filesystem=None,
+) -> Dict[str, Dict[str, float]]:
+    """Mean/min/max of each column over the latest analysis of every property"""
+    import pyarrow.compute as pc
+
+    table = query_history(
+        location,
+        ["property_id", "completed_at", *columns],
+        end=end,
+        user_ids=user_ids,
+        filesystem=filesystem,
+    )
+    if table.num_rows == 0:
+        return {}
+
+    # Latest row per property: sort by time and keep the last occurrence
+    table = table.sort_by([("property_id", "ascending"), ("completed_at", "ascending")])
+    ids = np.array(table["property_id"].to_pylist())
+    latest = table.filter(np.append(ids[1:] != ids[:-1], True))
+
+    summary = {"properties": {"count": latest.num_rows}}
+    for column in columns:
+        values = latest[column]
+        summary[column] = {
+            "mean": pc.mean(values).as_py(),
+            "min": pc.min(values).as_py(),
+            "max": pc.max(values).as_py(),
+        }
+    return summary
@@ -1,10 +1,32 @@
 import json
+import time
 import boto3
 import os
 import logging
 from datetime import datetime, timezone
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 from decimal import Decimal
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+import numpy as np
+
+from climate_grid import ClimateGrid
+from event_publisher import EventPublisher
+from geometry import geometry_hash, ring_array
+from history import HistoryWriter
+from lanes import LaneMetrics, event_age, lane_queue_urls, message_lane
+from pipeline import Pipeline
+from rasters import RasterStore
+from result_cache import ResultCache, MISS, DAY
+from scheduling import (
+    DEFER,
+    DUE_TOLERANCE,
+    SUPERSEDED,
+    defer_message,
+    schedule_decision,
+)
+from tiling import PartialStats, TiledAnalyzer
 
 # Configure logging
 logger = logging.getLogger()
@@ -14,132 +36,587 @@ logger.setLevel(logging.INFO)
 dynamodb = boto3.resource("dynamodb")
 s3 = boto3.client("s3")
 eventbridge = boto3.client("events")
+sqs = boto3.client("sqs")
+deserializer = TypeDeserializer()
 
 # Environment variables
 ANALYSIS_TABLE = os.environ["PROPERTY_ANALYSIS_TABLE"]
 CACHE_BUCKET = os.environ["GEOSPATIAL_CACHE_BUCKET"]
 EVENTBRIDGE_BUS = os.environ["EVENTBRIDGE_BUS_NAME"]
 PROPERTIES_TABLE = os.environ["PROPERTIES_TABLE"]
+CLIMATE_GRID_KEY = os.environ.get("CLIMATE_GRID_KEY", "climate/normals-v1.bin")
+CLIMATE_GRID_PATH = os.environ.get("CLIMATE_GRID_PATH", "/tmp/climate-normals.bin")
+CLIMATE_AREA_WEIGHTED = os.environ.get("CLIMATE_AREA_WEIGHTED", "true") == "true"
+ANALYSIS_VERSION = os.environ.get("ANALYSIS_VERSION", "v1")
+
+# Queue of each lane (deferred messages go back to their own lane)
+LANE_QUEUES = lane_queue_urls()
+
+# DynamoDB tables (handles reused across invocations)
+analysis_table = dynamodb.Table(ANALYSIS_TABLE)
+properties_table = dynamodb.Table(PROPERTIES_TABLE)
+
+# Cache TTL per metric: vegetation changes weekly, terrain practically never
+METRIC_TTLS = {
+    "elevation": 365 * DAY,
+    "slope": 365 * DAY,
+    "water_distance": 90 * DAY,
+    "weather": 180 * DAY,
+    "ndvi": 7 * DAY,
+}
+
+# Coordinate quantum (degrees) at which each metric samples its inputs. An
+# edit that leaves the ring unchanged at this resolution keeps the previous
+# result: ~1 m for the 10-30 m rasters, ~100 m for water distance and ~1 km
+# for the ~9 km climate grid.
+METRIC_QUANTA = {
+    "elevation": 1e-5,
+    "slope": 1e-5,
+    "ndvi": 1e-5,
+    "water_distance": 1e-3,
+    "weather": 1e-2,
+}
+
+# Raster stages computed for the whole batch at once, and their layer
+SHARED_STAGES = {"dem_stats": "dem", "ndvi_stats": "ndvi"}
+
+# Worker count for tiled analysis of large properties (default: vCPUs)
+TILE_WORKERS = int(os.environ.get("TILE_WORKERS", "0")) or None
+
+result_cache = ResultCache(s3, CACHE_BUCKET, ANALYSIS_VERSION, METRIC_TTLS)
+raster_store = RasterStore(s3, CACHE_BUCKET)
+tiled_analyzer = TiledAnalyzer(raster_store, TILE_WORKERS)
+pipeline = Pipeline()
+publisher = EventPublisher(eventbridge, EVENTBRIDGE_BUS, "geospatial.analysis")
+history = HistoryWriter(s3, CACHE_BUCKET)
+lane_metrics = LaneMetrics()
+
+# Memory-mapped climate grid, loaded once per container
+climate_grid = None
 
 
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    """Process geospatial analysis for properties"""
+    """Process geospatial analysis for properties.
+
+    Properties of a batch are claimed first, then the raster statistics they
+    still need are computed together, tile by tile, so neighbouring parcels
+    share tile reads. Completion events are buffered across the records of
+    the batch and published together at the end. Records that raised or
+    whose event could not be published are reported as batch item failures
+    so SQS redelivers only those.
+    """
+    failures = set()
+    jobs = []
+    seen = set()
+
+    # Parse SQS messages
+    for record in event.get("Records", []):
+        message_id = record.get("messageId")
+        try:
+            job = claim_record(message_id, json.loads(record["body"]), seen)
+            if job:
+                jobs.append(job)
+        except Exception as e:
+            logger.error(f"Error processing message {message_id}: {str(e)}")
+            failures.add(message_id)
+
+    shared = compute_shared_stats(jobs)
+
+    for job in jobs:
+        try:
+            finish_job(job, shared.get(job["messageId"], {}))
+        except Exception as e:
+            logger.error(f"Error processing message {job['messageId']}: {str(e)}")
+            failures.add(job["messageId"])
+
+    logger.info(f"Analysis cache stats: {json.dumps(result_cache.stats)}")
+    logger.info(f"Tiled analysis stats: {json.dumps(tiled_analyzer.stats)}")
+
+    history.flush()
+    logger.info(f"Analysis history stats: {json.dumps(history.stats)}")
+
+    lane_metrics.flush()
+
+    failures.update(publisher.flush())
+    logger.info(f"Event publishing stats: {json.dumps(publisher.stats)}")
 
-    try:
-        # Parse SQS messages
-        for record in event.get("Records", []):
-            message_body = json.loads(record["body"])
+    return {
+        "batchItemFailures": [
+            {"itemIdentifier": message_id} for message_id in sorted(failures)
+        ]
+    }
 
-            # Extract property info from EventBridge message
-            if "detail" in message_body:
-                property_data = message_body["detail"]
-                property_id = property_data.get("propertyId")
-                coordinates = property_data.get("coordinates")
-                user_id = property_data.get("userId")
 
-                if property_id and coordinates:
-                    logger.info(f"Processing analysis for property: {property_id}")
+def claim_record(
+    message_id: str, message_body: Dict[str, Any], seen: set
+) -> Optional[Dict[str, Any]]:
+    """Claim the property of one SQS message and plan its analysis.
 
-                    # Update status to processing
-                    update_analysis_status(property_id, "processing")
+    seen holds the (property, fingerprint) pairs already handled in this
+    batch; repeats of the same geometry are coalesced into the first one.
+    Returns the job to run, or None when there is nothing to compute.
+    """
 
-                    # Perform geospatial analysis
-                    analysis_results = perform_geospatial_analysis(coordinates)
+    # Extract property info from EventBridge message
+    if "detail" not in message_body:
+        return None
 
-                    # Save results
-                    save_analysis_results(property_id, analysis_results, user_id)
+    property_data = message_body["detail"]
+    property_id = property_data.get("propertyId")
+    coordinates = property_data.get("coordinates")
+    user_id = property_data.get("userId")
 
-                    # Publish completion event
-                    publish_analysis_complete(property_id, user_id)
+    if not (property_id and coordinates):
+        return None
 
-                    logger.info(f"Analysis completed for property: {property_id}")
+    if property_data.get("geometryChanged") is False:
+        logger.info(f"Geometry unchanged for property: {property_id}")
+        return None
 
-        return {"statusCode": 200, "body": "Analysis completed"}
+    fingerprint = geometry_hash(coordinates)
+    lane = message_lane(property_data)
+    if (property_id, fingerprint) in seen:
+        logger.info(f"Duplicate geometry in batch, coalesced: {property_id}")
+        return None
+    seen.add((property_id, fingerprint))
 
-    except Exception as e:
-        logger.error(f"Error processing analysis: {str(e)}")
-        return {"statusCode": 500, "body": str(e)}
+    # Update status to processing (returns the previous analysis)
+    outcome, previous = update_analysis_status(property_id, fingerprint)
 
+    if outcome == "superseded":
+        logger.info(f"Superseded by a newer geometry, dropping: {property_id}")
+        return None
 
-def perform_geospatial_analysis(coordinates: list) -> Dict[str, Any]:
-    """Perform simple geospatial analysis"""
+    if outcome == "deferred":
+        logger.info(f"Analysis not due for {previous:.0f}s, deferring: {property_id}")
+        defer_message(sqs, LANE_QUEUES[lane], message_body, previous)
+        return None
 
-    try:
-        # Calculate basic metrics
-        results = {
-            "elevation": get_elevation_data(coordinates),
-            "ndvi": get_vegetation_index(coordinates),
-            "slope": calculate_slope(coordinates),
-            "water_distance": find_nearest_water(coordinates),
-            "weather": get_weather_data(coordinates),
+    if outcome == "current":
+        # Also reached when a redelivered message already saved its results
+        # but its event was not published; publish it again
+        logger.info(f"Analysis already current for property: {property_id}")
+        restore_property_status(property_id, user_id)
+        publish_analysis_complete(message_id, property_id, user_id, "completed")
+        return None
+
+    logger.info(f"Processing analysis for property: {property_id} ({lane} lane)")
+
+    return {
+        "messageId": message_id,
+        "lane": lane,
+        "eventAge": event_age(message_body),
+        "claimedAt": time.monotonic(),
+        "propertyId": property_id,
+        "userId": user_id,
+        "coordinates": coordinates,
+        "fingerprint": fingerprint,
+        "plan": plan_analysis(coordinates, previous),
+    }
+
+
+def finish_job(job: Dict[str, Any], shared: Dict[str, Any]):
+    """Run the remaining metrics of a job, save them and queue its event"""
+    property_id = job["propertyId"]
+    user_id = job["userId"]
+
+    # Perform geospatial analysis
+    analysis_results, metric_inputs, metric_status = perform_geospatial_analysis(
+        job["coordinates"], job["plan"], shared
+    )
+
+    # Save results (partial results are kept)
+    status = save_analysis_results(
+        property_id,
+        analysis_results,
+        user_id,
+        job["fingerprint"],
+        metric_inputs,
+        metric_status,
+    )
+    if status is None:
+        logger.info(f"Analysis superseded for property: {property_id}")
+        return
+
+    processing_time = time.monotonic() - job["claimedAt"]
+    lane_metrics.record(job["lane"], job["eventAge"] + processing_time, processing_time)
+
+    if status == "completed":
+        history.add(
+            property_id,
+            user_id,
+            ANALYSIS_VERSION,
+            job["fingerprint"],
+            datetime.now(timezone.utc),
+            analysis_results,
+        )
+
+    # Queue completion event
+    publish_analysis_complete(job["messageId"], property_id, user_id, status)
+
+    logger.info(f"Analysis {status} for property: {property_id}")
+
+
+def compute_shared_stats(jobs: list) -> Dict[str, Dict[str, Any]]:
+    """Raster stats of every job that needs them, one pass per tile.
+
+    Returns the stats by messageId and stage name, ready to be passed to the
+    pipeline. A lone property (or one whose tiles failed) is left to its own
+    pipeline stage, which applies the stage timeout and reports the error.
+    """
+    shared: Dict[str, Dict[str, Any]] = {}
+
+    for stage, layer_name in SHARED_STAGES.items():
+        rings = {
+            job["messageId"]: ring_array(job["coordinates"])
+            for job in jobs
+            if stage in pipeline.closure(job["plan"]["to_compute"])
         }
+        if len(rings) < 2:
+            continue
+
+        results, report = tiled_analyzer.run_batch(layer_name, rings)
+        logger.info(f"Tile reuse ({layer_name}): {json.dumps(report)}")
+
+        for message_id, value in results.items():
+            if not isinstance(value, Exception):
+                shared.setdefault(message_id, {})[stage] = value
+
+    return shared
+
+
+def plan_analysis(
+    coordinates: list, previous: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Decide which metrics must be recomputed.
+
+    A metric is taken from the previous analysis when its input fingerprint
+    (geometry hash at the metric's quantum) is unchanged and the result is
+    still within its TTL, then from the result cache; the rest go to
+    to_compute.
+    """
+    previous_inputs, previous_results = reusable_results(previous)
+    plan = {"results": {}, "inputs": {}, "status": {}, "to_compute": []}
 
-        return results
+    for metric in pipeline.metrics:
+        input_key = geometry_hash(coordinates, METRIC_QUANTA[metric])
+        plan["inputs"][metric] = input_key
+
+        if previous_inputs.get(metric) == input_key and metric in previous_results:
+            plan["results"][metric] = previous_results[metric]
+            plan["status"][metric] = {"status": "reused", "durationMs": 0.0}
+            continue
+
+        cached = result_cache.get(metric, input_key)
+        if cached is not MISS:
+            plan["results"][metric] = cached
+            plan["status"][metric] = {"status": "cached", "durationMs": 0.0}
+            continue
+
+        plan["to_compute"].append(metric)
+
+    return plan
+
+
+def perform_geospatial_analysis(
+    coordinates: list,
+    plan: Dict[str, Any],
+    shared: Optional[Dict[str, Any]] = None,
+) -> Tuple[Dict[str, Any], Dict[str, str], Dict[str, Dict[str, Any]]]:
+    """Perform geospatial analysis, recomputing only what changed.
+
+    The metrics left in the plan run through the stage pipeline; shared
+    holds stage outputs already computed for the whole batch. Returns the
+    results of the metrics that succeeded, the input fingerprint and the
+    status of every metric.
+    """
+    results = dict(plan["results"])
+    metric_inputs = plan["inputs"]
+    metric_status = dict(plan["status"])
+    to_compute = plan["to_compute"]
+
+    try:
+        if to_compute:
+            values, report = pipeline.run(
+                {"coordinates": coordinates, **(shared or {})}, to_compute
+            )
+            logger.info(f"Pipeline report: {json.dumps(report)}")
+
+            for metric in to_compute:
+                metric_status[metric] = report[metric]
+                if report[metric]["status"] == "ok":
+                    results[metric] = values[metric]
+                    result_cache.put(metric, metric_inputs[metric], values[metric])
 
     except Exception as e:
         logger.error(f"Error in geospatial analysis: {str(e)}")
-        return {"error": str(e)}
+        for metric in pipeline.metrics:
+            if metric not in results:
+                metric_status[metric] = {
+                    "status": "failed",
+                    "durationMs": 0.0,
+                    "error": str(e),
+                }
+
+    return results, metric_inputs, metric_status
+
+
+def reusable_results(
+    previous: Optional[Dict[str, Any]],
+) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """Input fingerprints and results of a previous analysis still within TTL"""
+    if not previous or previous.get("analysisVersion") != ANALYSIS_VERSION:
+        return {}, {}
+
+    try:
+        completed_at = datetime.fromisoformat(previous["completedAt"])
+    except (KeyError, TypeError, ValueError):
+        return {}, {}
+
+    age = (datetime.now(timezone.utc) - completed_at).total_seconds()
+    results = convert_decimals(previous.get("analysisResults", {}))
+    fresh = {
+        metric: value
+        for metric, value in results.items()
+        if age < METRIC_TTLS.get(metric, 0)
+    }
+    return previous.get("metricInputs", {}), fresh
+
+
+# ===================================
+# PIPELINE STAGES
+# ===================================
+
+
+@pipeline.stage("ring", inputs=("coordinates",), metric=False)
+def polygon_ring(coordinates: list) -> np.ndarray:
+    """Polygon ring as an (n, 2) array"""
+    return ring_array(coordinates)
+
+
+@pipeline.stage("dem_stats", inputs=("ring",), timeout=120.0, metric=False)
+def compute_dem_stats(ring: np.ndarray) -> Dict[str, PartialStats]:
+    """Elevation and slope stats over the polygon, computed tile by tile"""
+    return tiled_analyzer.run("dem", ring)
 
 
-def get_elevation_data(coordinates: list) -> Dict[str, float]:
+@pipeline.stage("ndvi_stats", inputs=("ring",), timeout=120.0, metric=False)
+def compute_ndvi_stats(ring: np.ndarray) -> Dict[str, Any]:
+    """NDVI stats and vegetated cell count, computed tile by tile"""
+    return tiled_analyzer.run("ndvi", ring)
+
+
+@pipeline.stage("elevation", inputs=("dem_stats",))
+def get_elevation_data(dem_stats: Dict[str, PartialStats]) -> Dict[str, float]:
     """Get elevation data from NASA SRTM"""
-    # Simplified - use center point
-    center_lat = sum(coord[1] for coord in coordinates[:-1]) / (len(coordinates) - 1)
-    center_lon = sum(coord[0] for coord in coordinates[:-1]) / (len(coordinates) - 1)
+    partial = dem_stats["elevation"]
+    stats = partial.summary()
+    if stats is None:
+        raise ValueError("No elevation data under the polygon")
 
-    # Mock elevation data (replace with actual API call)
-    return {"avg_elevation": 850.5, "min_elevation": 820.0, "max_elevation": 890.0}
+    return {
+        "avg_elevation": round(stats["mean"], 1),
+        "min_elevation": round(stats["min"], 1),
+        "max_elevation": round(stats["max"], 1),
+        **distribution(partial, stats, 1),
+    }
 
 
-def get_vegetation_index(coordinates: list) -> Dict[str, float]:
+@pipeline.stage("ndvi", inputs=("ndvi_stats",))
+def get_vegetation_index(ndvi_stats: Dict[str, Any]) -> Dict[str, float]:
     """Calculate NDVI from satellite data"""
-    # Mock NDVI data (replace with Sentinel API)
+    partial = ndvi_stats["ndvi"]
+    stats = partial.summary()
+    if stats is None:
+        raise ValueError("No NDVI data under the polygon")
+
     return {
-        "avg_ndvi": 0.65,
-        "vegetation_coverage": 78.5,
-        "classification": "moderate_vegetation",
+        "avg_ndvi": round(stats["mean"], 3),
+        "vegetation_coverage": round(
+            100.0 * ndvi_stats["vegetated"] / stats["count"], 1
+        ),
+        "classification": classify_ndvi(stats["mean"]),
+        **distribution(partial, stats, 3),
     }
 
 
-def calculate_slope(coordinates: list) -> Dict[str, float]:
+@pipeline.stage("slope", inputs=("dem_stats",))
+def calculate_slope(dem_stats: Dict[str, PartialStats]) -> Dict[str, float]:
     """Calculate terrain slope"""
-    # Mock slope data
-    return {"avg_slope": 5.2, "max_slope": 15.8, "slope_classification": "gentle"}
+    partial = dem_stats["slope"]
+    stats = partial.summary()
+    if stats is None:
+        raise ValueError("No slope data under the polygon")
+
+    return {
+        "avg_slope": round(stats["mean"], 1),
+        "max_slope": round(stats["max"], 1),
+        "slope_classification": classify_slope(stats["mean"]),
+        **distribution(partial, stats, 1),
+    }
 
 
+@pipeline.stage("water_distance", inputs=("coordinates",))
 def find_nearest_water(coordinates: list) -> float:
     """Find distance to nearest water body"""
     # Mock water distance (replace with OSM API)
     return 450.0  # meters
 
 
-def get_weather_data(coordinates: list) -> Dict[str, Any]:
-    """Get weather/climate data"""
-    # Mock weather data
+def distribution(
+    partial: PartialStats, stats: Dict[str, Any], digits: int
+) -> Dict[str, Any]:
+    """Percentiles and packed histogram, from the same single pass as the mean"""
     return {
-        "annual_rainfall": 1250.0,
-        "avg_temperature": 22.5,
-        "climate_zone": "tropical_highland",
+        "percentiles": {
+            name: round(value, digits) for name, value in stats["percentiles"].items()
+        },
+        "histogram": partial.packed_histogram(),
     }
 
 
-def update_analysis_status(property_id: str, status: str):
-    """Update analysis status in DynamoDB"""
-    table = dynamodb.Table(ANALYSIS_TABLE)
+def classify_ndvi(avg_ndvi: float) -> str:
+    if avg_ndvi < 0.2:
+        return "bare_soil"
+    if avg_ndvi < 0.4:
+        return "sparse_vegetation"
+    if avg_ndvi < 0.7:
+        return "moderate_vegetation"
+    return "dense_vegetation"
 
-    table.put_item(
-        Item={
-            "propertyId": property_id,
-            "analysisStatus": status,
-            "createdAt": datetime.now(timezone.utc).isoformat(),
-            "updatedAt": datetime.now(timezone.utc).isoformat(),
-        }
+
+def classify_slope(avg_slope: float) -> str:
+    if avg_slope < 2:
+        return "flat"
+    if avg_slope < 6:
+        return "gentle"
+    if avg_slope < 12:
+        return "moderate"
+    if avg_slope < 20:
+        return "steep"
+    return "very_steep"
+
+
+@pipeline.stage("weather", inputs=("coordinates",), timeout=20.0)
+def get_weather_data(coordinates: list) -> Dict[str, Any]:
+    """Get climate normals from the precomputed grid"""
+    grid = get_climate_grid()
+    if grid is None:
+        raise RuntimeError("Climate grid unavailable")
+
+    if CLIMATE_AREA_WEIGHTED:
+        weather = grid.summarize(coordinates)
+    else:
+        center_lon = sum(coord[0] for coord in coordinates[:-1]) / (
+            len(coordinates) - 1
+        )
+        center_lat = sum(coord[1] for coord in coordinates[:-1]) / (
+            len(coordinates) - 1
+        )
+        weather = grid.lookup(center_lon, center_lat)
+
+    if weather is None:
+        raise ValueError("Polygon outside the climate grid")
+    return weather
+
+
+def get_climate_grid() -> Optional[ClimateGrid]:
+    """Load the climate grid, downloading it from the cache bucket on cold start"""
+    global climate_grid
+
+    if climate_grid is None:
+        try:
+            if not os.path.exists(CLIMATE_GRID_PATH):
+                s3.download_file(CACHE_BUCKET, CLIMATE_GRID_KEY, CLIMATE_GRID_PATH)
+            climate_grid = ClimateGrid(CLIMATE_GRID_PATH)
+        except Exception as e:
+            logger.warning(f"Climate grid unavailable: {str(e)}")
+            return None
+
+    return climate_grid
+
+
+def restore_property_status(property_id: str, user_id: str):
+    """Mark the property completed again when its analysis is already current"""
+    if not user_id:
+        return
+
+    properties_table.update_item(
+        Key={"userId": user_id, "propertyId": property_id},
+        UpdateExpression="SET analysisStatus = :status, analysisVersion = :version",
+        ExpressionAttributeValues={
+            ":status": "completed",
+            ":version": ANALYSIS_VERSION,
+        },
     )
 
 
-def save_analysis_results(property_id: str, results: Dict[str, Any], user_id: str):
-    """Save analysis results to DynamoDB"""
-    table = dynamodb.Table(ANALYSIS_TABLE)
+def update_analysis_status(property_id: str, fingerprint: str) -> Tuple[str, Any]:
+    """Move the analysis to "processing" with a single conditional update.
+
+    The update is refused when the message is not the one the pending
+    record is waiting for (superseded by a newer edit, or not due yet), or
+    when a complete analysis of the same geometry and version already
+    exists, which makes SQS redeliveries no-ops. createdAt is only set on
+    the first analysis.
+
+    Returns ("claimed", previous item), ("current", None),
+    ("superseded", None) or ("deferred", seconds to wait).
+    """
+    now = datetime.now(timezone.utc)
+
+    try:
+        response = analysis_table.update_item(
+            Key={"propertyId": property_id},
+            UpdateExpression="SET analysisStatus = :processing, updatedAt = :now, createdAt = if_not_exists(createdAt, :now), pendingFingerprint = :fingerprint",
+            ConditionExpression="(attribute_not_exists(scheduledFingerprint) OR scheduledFingerprint = :fingerprint) AND (attribute_not_exists(dueAt) OR dueAt <= :due) AND (attribute_not_exists(metricsFailed) OR analysisStatus <> :completed OR geometryFingerprint <> :fingerprint OR analysisVersion <> :version OR metricsFailed > :zero)",
+            ExpressionAttributeValues={
+                ":processing": "processing",
+                ":completed": "completed",
+                ":now": now.isoformat(),
+                ":due": Decimal(str(round(now.timestamp() + DUE_TOLERANCE, 3))),
+                ":fingerprint": fingerprint,
+                ":version": ANALYSIS_VERSION,
+                ":zero": 0,
+            },
+            ReturnValues="ALL_OLD",
+            ReturnValuesOnConditionCheckFailure="ALL_OLD",
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+
+        item = e.response.get("Item") or {}
+        record = {key: deserializer.deserialize(value) for key, value in item.items()}
+        decision, wait = schedule_decision(record, fingerprint, now.timestamp())
+        if decision == SUPERSEDED:
+            return "superseded", None
+        if decision == DEFER:
+            return "deferred", wait
+        return "current", None
+
+    return "claimed", response.get("Attributes")
+
+
+def save_analysis_results(
+    property_id: str,
+    results: Dict[str, Any],
+    user_id: str,
+    fingerprint: str,
+    metric_inputs: Dict[str, str],
+    metric_status: Dict[str, Dict[str, Any]],
+) -> Optional[str]:
+    """Save analysis results to DynamoDB.
+
+    The analysis and property items are updated in one TransactWriteItems
+    call. The analysis is "completed" when at least one metric succeeded
+    (failed metrics are flagged in metricStatus) and "failed" otherwise.
+    Returns None when a newer geometry claimed the analysis in the meantime
+    or the property no longer exists; any other cancellation (conflict,
+    throttling) raises so the message is redelivered.
+    """
+    status = "completed" if results else "failed"
+    now = datetime.now(timezone.utc).isoformat()
 
     # Convert float values to Decimal for DynamoDB
     def convert_floats(obj):
@@ -151,43 +628,85 @@ def save_analysis_results(property_id: str, results: Dict[str, Any], user_id: st
             return [convert_floats(v) for v in obj]
         return obj
 
-    converted_results = convert_floats(results)
-
-    # Update analysis table
-    table.update_item(
-        Key={"propertyId": property_id},
-        UpdateExpression="SET analysisStatus = :status, analysisResults = :results, completedAt = :completed",
-        ExpressionAttributeValues={
-            ":status": "completed",
-            ":results": converted_results,
-            ":completed": datetime.now(timezone.utc).isoformat(),
-        },
-    )
-
-    # Update properties table status
-    properties_table = dynamodb.Table(PROPERTIES_TABLE)
-    properties_table.update_item(
-        Key={"userId": user_id, "propertyId": property_id},
-        UpdateExpression="SET analysisStatus = :status",
-        ExpressionAttributeValues={":status": "completed"},
-    )
-
+    transact_items = [
+        {
+            "Update": {
+                "TableName": ANALYSIS_TABLE,
+                "Key": {"propertyId": property_id},
+                "UpdateExpression": "SET analysisStatus = :status, analysisResults = :results, completedAt = :now, updatedAt = :now, analysisVersion = :version, geometryFingerprint = :fingerprint, metricInputs = :inputs, metricStatus = :metric_status, metricsFailed = :failed REMOVE pendingFingerprint",
+                "ConditionExpression": "pendingFingerprint = :fingerprint",
+                "ExpressionAttributeValues": {
+                    ":status": status,
+                    ":results": convert_floats(results),
+                    ":now": now,
+                    ":version": ANALYSIS_VERSION,
+                    ":fingerprint": fingerprint,
+                    ":inputs": metric_inputs,
+                    ":metric_status": convert_floats(metric_status),
+                    ":failed": len(set(pipeline.metrics) - set(results)),
+                },
+            }
+        }
+    ]
 
-def publish_analysis_complete(property_id: str, user_id: str):
-    """Publish analysis completion event"""
-    eventbridge.put_events(
-        Entries=[
+    if user_id:
+        transact_items.append(
             {
-                "Source": "geospatial.analysis",
-                "DetailType": "Analysis Completed",
-                "Detail": json.dumps(
-                    {
-                        "propertyId": property_id,
-                        "userId": user_id,
-                        "status": "completed",
-                    }
-                ),
-                "EventBusName": EVENTBRIDGE_BUS,
+                "Update": {
+                    "TableName": PROPERTIES_TABLE,
+                    "Key": {"userId": user_id, "propertyId": property_id},
+                    "UpdateExpression": "SET analysisStatus = :status, analysisVersion = :version",
+                    "ConditionExpression": "attribute_exists(propertyId)",
+                    "ExpressionAttributeValues": {
+                        ":status": status,
+                        ":version": ANALYSIS_VERSION,
+                    },
+                }
             }
-        ]
+        )
+
+    try:
+        dynamodb.meta.client.transact_write_items(TransactItems=transact_items)
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "TransactionCanceledException":
+            reasons = [
+                reason.get("Code")
+                for reason in e.response.get("CancellationReasons", [])
+            ]
+            # Superseded or deleted: a failed condition is final. Conflicts
+            # and throttling are not, so the message is redelivered
+            failed = [code for code in reasons if code not in (None, "None")]
+            if failed and all(code == "ConditionalCheckFailed" for code in failed):
+                logger.warning(
+                    f"Results for property {property_id} not saved: {reasons}"
+                )
+                return None
+        raise
+
+    return status
+
+
+def convert_decimals(obj):
+    """Convert DynamoDB Decimals back to floats"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    elif isinstance(obj, dict):
+        return {k: convert_decimals(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_decimals(v) for v in obj]
+    return obj
+
+
+def publish_analysis_complete(
+    message_id: str, property_id: str, user_id: str, status: str = "completed"
+):
+    """Queue the analysis completion event (sent by publisher.flush())"""
+    publisher.add(
+        message_id,
+        "Analysis Completed" if status == "completed" else "Analysis Failed",
+        {
+            "propertyId": property_id,
+            "userId": user_id,
+            "status": status,
+        },
     )
@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from geometry import ring_array, ring_bbox
+from rasters import LAYERS
+
+logger = logging.getLogger()
+
+# ===================================
+# LANES
+# ===================================
+#
+# Analysis work is routed by estimated cost so a few very large estates do
+# not queue in front of the small plots whose owners are waiting for a
+# result. The CRUD lambda classifies each property with the same rule and
+# publishes detail.analysisLane; EventBridge routes "slow" to its own queue,
+# which the analysis lambda consumes with a smaller batch and concurrency.
+
+FAST = "fast"
+SLOW = "slow"
+LANES = (FAST, SLOW)
+
+# Cost is estimated on the finest raster layer (NDVI, ~10 m)
+COST_LAYER = LAYERS["ndvi"]
+
+# Above either threshold a property goes to the slow lane. 1M NDVI cells is
+# roughly 10,000 ha at the equator.
+SLOW_VERTICES = int(os.environ.get("ANALYSIS_SLOW_VERTICES", "5000"))
+SLOW_CELLS = int(os.environ.get("ANALYSIS_SLOW_CELLS", "1000000"))
+
+
+def analysis_cost(coordinates: list) -> Dict[str, int]:
+    """Vertex count and bounding-box size in raster cells of a polygon"""
+    ring = ring_array(coordinates)
+    if len(ring) == 0:
+        return {"vertices": 0, "cells": 0}
+
+    west, south, east, north = ring_bbox(ring)
+    rows = int(np.ceil((north - south) / COST_LAYER.resolution)) + 1
+    cols = int(np.ceil((east - west) / COST_LAYER.resolution)) + 1
+    return {"vertices": len(ring), "cells": rows * cols}
+
+
+def classify_lane(cost: Dict[str, int]) -> str:
+    if cost["vertices"] > SLOW_VERTICES or cost["cells"] > SLOW_CELLS:
+        return SLOW
+    return FAST
+
+
+def message_lane(detail: Dict[str, Any]) -> str:
+    """Lane published by the CRUD lambda, or classified here when missing"""
+    lane = detail.get("analysisLane")
+    if lane in LANES:
+        return lane
+    return classify_lane(analysis_cost(detail.get("coordinates") or []))
+
+
+def lane_queue_urls() -> Dict[str, Optional[str]]:
+    """Queue of each lane; the slow lane falls back to the main queue"""
+    fast = os.environ.get("ANALYSIS_QUEUE_URL")
+    return {FAST: fast, SLOW: os.environ.get("ANALYSIS_SLOW_QUEUE_URL") or fast}
+
+
+# ===================================
+# METRICS
+# ===================================
+
+
+def event_age(message_body: Dict[str, Any], now: Optional[float] = None) -> float:
+    """Seconds since the event was published (its envelope time)"""
+    now = time.time() if now is None else now
+    published = message_body.get("time")
+    if isinstance(published, (int, float)):
+        return now - published
+    try:
+        published = datetime.fromisoformat(str(published).replace("Z", "+00:00"))
+    except ValueError:
+        return 0.0
+    if published.tzinfo is None:
+        published = published.replace(tzinfo=timezone.utc)
+    return now - published.timestamp()
+
+
+class LaneMetrics:
+    """Per-lane latency samples, logged as CloudWatch embedded metrics.
+
+    TimeToResult runs from the property event to the saved analysis (queue
+    delay and debounce included); ProcessingTime from claim to save. One
+    EMF line per lane is written on flush, so no PutMetricData calls are
+    made.
+    """
+
+    NAMESPACE = "SistemaRural/Analysis"
+
+    # EMF accepts at most 100 values per metric
+    MAX_VALUES = 100
+
+    def __init__(self, namespace: str = NAMESPACE):
+        self.namespace = namespace
+        self.samples: Dict[str, Dict[str, List[float]]] = {}
+
+    def record(self, lane: str, time_to_result: float, processing_time: float):
+        lane_samples = self.samples.setdefault(
+            lane, {"TimeToResult": [], "ProcessingTime": []}
+        )
+        lane_samples["TimeToResult"].append(round(max(time_to_result, 0.0), 3))
+        lane_samples["ProcessingTime"].append(round(max(processing_time, 0.0), 3))
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """Log and return the EMF documents of the buffered samples"""
+        samples, self.samples = self.samples, {}
+        documents = []
+        for lane, values in samples.items():
+            for start in range(0, len(values["TimeToResult"]), self.MAX_VALUES):
+                document = {
+                    "_aws": {
+                        "Timestamp": int(time.time() * 1000),
+                        "CloudWatchMetrics": [
+                            {
+                                "Namespace": self.namespace,
+                                "Dimensions": [["Lane"]],
+                                "Metrics": [
+                                    {"Name": "TimeToResult", "Unit": "Seconds"},
+                                    {"Name": "ProcessingTime", "Unit": "Seconds"},
+                                ],
+                            }
+                        ],
+                    },
+                    "Lane": lane,
+                    "TimeToResult": values["TimeToResult"][
+                        start : start + self.MAX_VALUES
+                    ],
+                    "ProcessingTime": values["ProcessingTime"][
+                        start : start + self.MAX_VALUES
+                    ],
+                }
+                # EMF documents must be printed as-is, without a log prefix
+                print(json.dumps(document))
+                documents.append(document)
+        return documents
@@ -0,0 +1,172 @@
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterable, NamedTuple, Optional, Set, Tuple
+
+logger = logging.getLogger()
+
+
+class Stage(NamedTuple):
+    name: str
+    func: Callable[..., Any]
+    inputs: Tuple[str, ...]
+    timeout: float
+    metric: bool
+
+
+class Pipeline:
+    """Small DAG executor for the analysis stages.
+
+    Stages declare their inputs by name: either another stage (a shared
+    resource such as a DEM window or polygon mask, or a metric) or a key of
+    the initial context. Stages whose inputs are ready run concurrently on a
+    thread pool. Each stage has its own timeout, measured from submission,
+    and a failed or timed-out stage only takes down the stages that depend on
+    it. Timed-out threads cannot be killed; their results are discarded.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Stage] = {}
+
+    def stage(
+        self,
+        name: str,
+        inputs: Iterable[str] = (),
+        timeout: float = 30.0,
+        metric: bool = True,
+    ):
+        """Decorator registering a function as a stage"""
+
+        def register(func):
+            self.stages[name] = Stage(name, func, tuple(inputs), timeout, metric)
+            return func
+
+        return register
+
+    @property
+    def metrics(self) -> Tuple[str, ...]:
+        return tuple(name for name, stage in self.stages.items() if stage.metric)
+
+    def closure(self, targets: Iterable[str], provided: Iterable[str] = ()) -> Set[str]:
+        """Targets plus every stage they transitively depend on.
+
+        Stages whose output is already provided are not followed.
+        """
+        provided = set(provided)
+        needed = set()
+        stack = list(targets)
+        while stack:
+            name = stack.pop()
+            if name in needed or name in provided or name not in self.stages:
+                continue
+            needed.add(name)
+            stack.extend(self.stages[name].inputs)
+        return needed
+
+    def run(
+        self,
+        context: Dict[str, Any],
+        targets: Optional[Iterable[str]] = None,
+        max_workers: Optional[int] = None,
+    ) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+        """Run the stages needed for targets (default: all metrics).
+
+        A stage whose name is a key of the context is taken as already
+        computed (e.g. stats shared by a batch of properties). Returns
+        (values, report): values holds the output of every stage that
+        succeeded, report holds status ("ok", "failed", "timeout",
+        "skipped"), durationMs and error for every stage that was needed.
+        """
+        pending = self.closure(self.metrics if targets is None else targets, context)
+        values = dict(context)
+        report: Dict[str, Dict[str, Any]] = {}
+        if not pending:
+            return values, report
+
+        executor = ThreadPoolExecutor(max_workers=max_workers or len(pending))
+        running = {}
+        submitted_at = {}
+
+        try:
+            while pending or running:
+                for name in sorted(pending):
+                    stage = self.stages[name]
+                    blocked = [
+                        dep
+                        for dep in stage.inputs
+                        if dep in report and report[dep]["status"] != "ok"
+                    ]
+                    missing = [
+                        dep
+                        for dep in stage.inputs
+                        if dep not in self.stages and dep not in values
+                    ]
+
+                    if blocked or missing:
+                        pending.discard(name)
+                        report[name] = {
+                            "status": "skipped",
+                            "durationMs": 0.0,
+                            "error": f"input unavailable: {(blocked or missing)[0]}",
+                        }
+                    elif all(dep in values for dep in stage.inputs):
+                        pending.discard(name)
+                        kwargs = {dep: values[dep] for dep in stage.inputs}
+                        future = executor.submit(stage.func, **kwargs)
+                        running[future] = name
+                        submitted_at[name] = time.perf_counter()
+
+                if not running:
+                    # Whatever is left depends on itself
+                    for name in pending:
+                        report[name] = {
+                            "status": "skipped",
+                            "durationMs": 0.0,
+                            "error": "dependency cycle",
+                        }
+                    break
+
+                now = time.perf_counter()
+                next_deadline = min(
+                    submitted_at[name] + self.stages[name].timeout
+                    for name in running.values()
+                )
+                done, _ = wait(
+                    running,
+                    timeout=max(next_deadline - now, 0.0),
+                    return_when=FIRST_COMPLETED,
+                )
+
+                now = time.perf_counter()
+                for future in done:
+                    name = running.pop(future)
+                    elapsed = (now - submitted_at[name]) * 1000
+                    try:
+                        values[name] = future.result()
+                        report[name] = {"status": "ok", "durationMs": elapsed}
+                    except Exception as e:
+                        logger.warning(f"Stage {name} failed: {str(e)}")
+                        report[name] = {
+                            "status": "failed",
+                            "durationMs": elapsed,
+                            "error": str(e),
+                        }
+
+                for future, name in list(running.items()):
+                    stage = self.stages[name]
+                    if now - submitted_at[name] >= stage.timeout:
+                        running.pop(future)
+                        future.cancel()
+                        logger.warning(f"Stage {name} timed out after {stage.timeout}s")
+                        report[name] = {
+                            "status": "timeout",
+                            "durationMs": (now - submitted_at[name]) * 1000,
+                            "error": f"timed out after {stage.timeout}s",
+                        }
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        for entry in report.values():
+            entry["durationMs"] = round(entry["durationMs"], 1)
+
+        return values, report
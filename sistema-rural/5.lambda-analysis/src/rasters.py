@@ -0,0 +1,292 @@
+import os
+import logging
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from botocore.exceptions import ClientError
+
+from geometry import rasterize_ring, ring_centroid
+
+logger = logging.getLogger()
+
+# ===================================
+# TILING SCHEME
+# ===================================
+#
+# Every layer is a global north-up lon/lat grid anchored at (-180, 90) and
+# cut into tile_size x tile_size tiles stored as .npy arrays at
+# {prefix}/{layer}/{tile_row}/{tile_col}.npy. Cell (R, C) of the global grid
+# is cell (R % tile_size, C % tile_size) of tile (R // tile_size, C // tile_size).
+
+GRID_WEST = -180.0
+GRID_NORTH = 90.0
+
+METERS_PER_DEGREE = 111320.0
+
+
+class RasterLayer(NamedTuple):
+    name: str
+    resolution: float  # degrees per cell
+    tile_size: int  # cells per tile side
+    scale: float  # stored value * scale = physical value
+    nodata: int
+
+
+LAYERS = {
+    # SRTM 1 arc-second, meters
+    "dem": RasterLayer("dem", 1.0 / 3600.0, 1024, 1.0, -32768),
+    # Sentinel-2 NDVI composite at ~10 m, stored as NDVI * 10000
+    "ndvi": RasterLayer("ndvi", 1.0 / 10800.0, 1024, 1e-4, -32768),
+}
+
+
+# S3 codes for a tile that does not exist: the tile builder skips tiles
+# without data, so these read as all nodata instead of failing
+MISSING_TILE_CODES = {"404", "NoSuchKey"}
+
+
+class RasterUnavailable(Exception):
+    """Raised when a tile needed for a window is not in the store"""
+
+
+class RasterWindow:
+    """Decoded (float32, NaN = nodata) window of a layer"""
+
+    def __init__(
+        self,
+        layer: RasterLayer,
+        data: np.ndarray,
+        rows: Tuple[int, int],
+        cols: Tuple[int, int],
+    ):
+        self.layer = layer
+        self.data = data
+        self.rows = rows
+        self.cols = cols
+
+    @property
+    def cell_size(self) -> float:
+        return self.layer.resolution
+
+    def mask(self, ring: np.ndarray) -> np.ndarray:
+        """Cell-center mask of the ring; tiny polygons get their centroid cell"""
+        res = self.layer.resolution
+        mask = rasterize_ring(
+            ring,
+            GRID_WEST,
+            GRID_NORTH,
+            res,
+            res,
+            self.rows,
+            self.cols,
+        )
+        if not mask.any():
+            lon, lat = ring_centroid(ring)
+            row = int((GRID_NORTH - lat) // res) - self.rows[0]
+            col = int((lon - GRID_WEST) // res) - self.cols[0]
+            if 0 <= row < mask.shape[0] and 0 <= col < mask.shape[1]:
+                mask[row, col] = True
+        return mask
+
+    def row_latitudes(self) -> np.ndarray:
+        res = self.layer.resolution
+        return GRID_NORTH - (np.arange(*self.rows) + 0.5) * res
+
+
+def cell_range(
+    layer: RasterLayer, bbox: Tuple[float, float, float, float], buffer_cells: int = 0
+) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+    """Global (row, col) ranges covering a bbox, padded by buffer_cells"""
+    west, south, east, north = bbox
+    res = layer.resolution
+    r0 = int((GRID_NORTH - north) // res) - buffer_cells
+    r1 = int((GRID_NORTH - south) // res) + 1 + buffer_cells
+    c0 = int((west - GRID_WEST) // res) - buffer_cells
+    c1 = int((east - GRID_WEST) // res) + 1 + buffer_cells
+    return (max(r0, 0), r1), (max(c0, 0), c1)
+
+
+def tiles_for_range(
+    layer: RasterLayer, rows: Tuple[int, int], cols: Tuple[int, int]
+) -> List[Tuple[int, int]]:
+    """(tile_row, tile_col) of every tile intersecting a cell range"""
+    size = layer.tile_size
+    return [
+        (tile_row, tile_col)
+        for tile_row in range(rows[0] // size, (rows[1] - 1) // size + 1)
+        for tile_col in range(cols[0] // size, (cols[1] - 1) // size + 1)
+    ]
+
+
+class RasterStore:
+    """Tile store backed by S3 with a /tmp disk cache and an in-memory LRU.
+
+    Both caches are bounded: max_tiles arrays stay mapped in memory and the
+    tile files on disk are trimmed to max_disk_bytes, least recently used
+    first. Pool workers share cache_dir, so the disk bound is enforced on
+    the directory itself rather than on per-process bookkeeping.
+    """
+
+    def __init__(
+        self,
+        s3_client,
+        bucket: str,
+        prefix: str = "rasters",
+        cache_dir: str = "/tmp/rasters",
+        max_tiles: int = 32,
+        max_disk_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.cache_dir = cache_dir
+        self.max_tiles = max_tiles
+        self.max_disk_bytes = max_disk_bytes
+        self.tiles = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {
+            "tile_hits": 0,
+            "tile_loads": 0,
+            "tile_downloads": 0,
+            "tile_missing": 0,
+            "tile_evictions": 0,
+        }
+
+    def tile_key(self, layer: RasterLayer, tile_row: int, tile_col: int) -> str:
+        return f"{self.prefix}/{layer.name}/{tile_row}/{tile_col}.npy"
+
+    def load_tile(self, layer: RasterLayer, tile_row: int, tile_col: int) -> np.ndarray:
+        """Raw (stored dtype) tile array, memory-mapped from the disk cache"""
+        key = self.tile_key(layer, tile_row, tile_col)
+
+        with self.lock:
+            tile = self.tiles.get(key)
+            if tile is not None:
+                self.tiles.move_to_end(key)
+                self.stats["tile_hits"] += 1
+                return tile
+
+        path = os.path.join(self.cache_dir, key)
+        try:
+            # Disk hit: refresh its position in the disk LRU
+            os.utime(path)
+            tile = np.load(path, mmap_mode="r")
+        except FileNotFoundError:
+            tile = self.download_tile(layer, key, path)
+
+        with self.lock:
+            self.tiles[key] = tile
+            self.stats["tile_loads"] += 1
+            while len(self.tiles) > self.max_tiles:
+                self.tiles.popitem(last=False)
+        return tile
+
+    def download_tile(self, layer: RasterLayer, key: str, path: str) -> np.ndarray:
+        """Fetch a tile into the disk cache; a tile missing from S3 is all nodata"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            self.s3.download_file(self.bucket, key, path)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in MISSING_TILE_CODES:
+                raise RasterUnavailable(f"Tile {key} unavailable: {str(e)}")
+            self.stats["tile_missing"] += 1
+            # Read-only view of a single value: no memory per missing tile
+            return np.broadcast_to(
+                np.int16(layer.nodata), (layer.tile_size, layer.tile_size)
+            )
+
+        self.stats["tile_downloads"] += 1
+        self.trim_disk_cache(keep=path)
+        return np.load(path, mmap_mode="r")
+
+    def trim_disk_cache(self, keep: str) -> None:
+        """Delete the least recently used tile files above max_disk_bytes.
+
+        Mapped arrays of deleted files stay readable until they are dropped.
+        """
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                # Partial downloads of other workers are not .npy yet
+                if not name.endswith(".npy"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    info = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((info.st_mtime, info.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.stats["tile_evictions"] += 1
+
+    def read_cells(
+        self, layer_name: str, rows: Tuple[int, int], cols: Tuple[int, int]
+    ) -> RasterWindow:
+        """Mosaic the tiles covering a global cell range into a decoded window"""
+        layer = LAYERS[layer_name]
+        size = layer.tile_size
+        data = np.full((rows[1] - rows[0], cols[1] - cols[0]), np.nan, np.float32)
+
+        for tile_row, tile_col in tiles_for_range(layer, rows, cols):
+            tile = self.load_tile(layer, tile_row, tile_col)
+
+            # Intersection of the window with this tile, in global cells
+            g_r0 = max(rows[0], tile_row * size)
+            g_r1 = min(rows[1], (tile_row + 1) * size)
+            g_c0 = max(cols[0], tile_col * size)
+            g_c1 = min(cols[1], (tile_col + 1) * size)
+
+            raw = tile[
+                g_r0 - tile_row * size : g_r1 - tile_row * size,
+                g_c0 - tile_col * size : g_c1 - tile_col * size,
+            ]
+            decoded = raw.astype(np.float32) * np.float32(layer.scale)
+            decoded[raw == layer.nodata] = np.nan
+            data[g_r0 - rows[0] : g_r1 - rows[0], g_c0 - cols[0] : g_c1 - cols[0]] = (
+                decoded
+            )
+
+        return RasterWindow(layer, data, rows, cols)
+
+    def read_window(
+        self,
+        layer_name: str,
+        bbox: Tuple[float, float, float, float],
+        buffer_cells: int = 0,
+    ) -> RasterWindow:
+        """Decoded window covering a bbox"""
+        rows, cols = cell_range(LAYERS[layer_name], bbox, buffer_cells)
+        return self.read_cells(layer_name, rows, cols)
+
+
+def slope_degrees(window: RasterWindow) -> np.ndarray:
+    """Terrain slope in degrees for every cell of a DEM window"""
+    cell_height = window.cell_size * METERS_PER_DEGREE
+    cell_width = cell_height * np.cos(np.radians(window.row_latitudes()))[:, None]
+    dz_drow, dz_dcol = np.gradient(window.data)
+    return np.degrees(np.arctan(np.hypot(dz_dcol / cell_width, dz_drow / cell_height)))
+
+
+def zonal_stats(values: np.ndarray) -> Optional[Dict[str, float]]:
+    """count/mean/min/max of the non-NaN values, or None when there are none"""
+    values = values[~np.isnan(values)]
+    if values.size == 0:
+        return None
+    return {
+        "count": int(values.size),
+        "mean": float(values.mean()),
+        "min": float(values.min()),
+        "max": float(values.max()),
+    }
@@ -0,0 +1,109 @@
+import json
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+# Sentinel for cache misses (None is a legitimate metric value)
+MISS = object()
+
+DAY = 24 * 3600
+
+
+class ResultCache:
+    """Two-tier (in-process LRU + S3) cache of per-metric analysis results.
+
+    Entries are keyed by metric, analysis version and a canonical geometry
+    hash, and expire after the metric's TTL in both tiers.
+    """
+
+    def __init__(
+        self,
+        s3_client,
+        bucket: str,
+        version: str,
+        ttls: Dict[str, int],
+        max_entries: int = 512,
+        prefix: str = "analysis-cache",
+    ):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.version = version
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self.prefix = prefix
+        self.memory = OrderedDict()
+        self.stats = {"memory_hits": 0, "s3_hits": 0, "misses": 0, "writes": 0}
+
+    def key(self, metric: str, geometry_hash: str) -> str:
+        return f"{self.prefix}/{self.version}/{metric}/{geometry_hash}.json"
+
+    def get(self, metric: str, geometry_hash: str) -> Any:
+        """Return the cached value or MISS"""
+        key = self.key(metric, geometry_hash)
+        now = time.time()
+
+        entry = self.memory.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > now:
+                self.memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return value
+            del self.memory[key]
+
+        entry = self._read_s3(key)
+        if entry is not None and entry["expiresAt"] > now:
+            self._remember(key, entry["expiresAt"], entry["value"])
+            self.stats["s3_hits"] += 1
+            return entry["value"]
+
+        self.stats["misses"] += 1
+        return MISS
+
+    def put(self, metric: str, geometry_hash: str, value: Any) -> None:
+        ttl = self.ttls.get(metric)
+        if not ttl or value is None:
+            return
+
+        key = self.key(metric, geometry_hash)
+        expires_at = time.time() + ttl
+        self._remember(key, expires_at, value)
+
+        try:
+            self.s3.put_object(
+                Bucket=self.bucket,
+                Key=key,
+                Body=json.dumps(
+                    {
+                        "metric": metric,
+                        "version": self.version,
+                        "expiresAt": expires_at,
+                        "value": value,
+                    }
+                ).encode("utf-8"),
+                ContentType="application/json",
+            )
+            self.stats["writes"] += 1
+        except Exception as e:
+            logger.warning(f"Error writing cache entry {key}: {str(e)}")
+
+    def _remember(self, key: str, expires_at: float, value: Any) -> None:
+        self.memory[key] = (expires_at, value)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def _read_s3(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            response = self.s3.get_object(Bucket=self.bucket, Key=key)
+            return json.loads(response["Body"].read())
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in ("NoSuchKey", "404"):
+                logger.warning(f"Error reading cache entry {key}: {str(e)}")
+        except Exception as e:
+            logger.warning(f"Error reading cache entry {key}: {str(e)}")
+        return None
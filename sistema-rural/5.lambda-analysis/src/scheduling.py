@@ -0,0 +1,139 @@
+import json
+import math
+import time
+import uuid
+import heapq
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+# ===================================
+# PENDING-ANALYSIS RECORD
+# ===================================
+#
+# The CRUD lambda writes, on the analysis item, every time a property's
+# geometry is created or changed:
+#
+#   scheduledFingerprint  fingerprint of the latest geometry
+#   scheduledAt           epoch seconds of the edit
+#   dueAt                 scheduledAt + debounce window
+#
+# Each edit also sends a message through the delay queue. When a message
+# is received, the worker compares it with the record:
+#
+#   - its fingerprint is not the scheduled one: a newer edit superseded it,
+#     drop it (the newer edit has its own message);
+#   - the record is not due yet: re-enqueue it for the remaining time;
+#   - otherwise analyze.
+#
+# A burst of edits therefore collapses into one analysis of the final
+# geometry, run one debounce window after the last edit.
+
+RUN = "run"
+SUPERSEDED = "superseded"
+DEFER = "defer"
+
+# Messages arriving up to this early are treated as due (clock skew)
+DUE_TOLERANCE = 1.0
+
+# SQS DelaySeconds limit
+MAX_DELAY_SECONDS = 900
+
+
+def schedule_decision(
+    record: Optional[Dict[str, Any]], fingerprint: str, now: float
+) -> Tuple[str, float]:
+    """(RUN | SUPERSEDED | DEFER, seconds to wait) for a received message"""
+    if not record:
+        return RUN, 0.0
+
+    scheduled = record.get("scheduledFingerprint")
+    if scheduled and scheduled != fingerprint:
+        return SUPERSEDED, 0.0
+
+    remaining = float(record.get("dueAt", 0)) - now
+    if remaining > DUE_TOLERANCE:
+        return DEFER, remaining
+    return RUN, 0.0
+
+
+def defer_message(
+    sqs_client, queue_url: str, message_body: Dict[str, Any], seconds: float
+) -> None:
+    """Send the message again, to be delivered when the record is due"""
+    sqs_client.send_message(
+        QueueUrl=queue_url,
+        MessageBody=json.dumps(message_body),
+        DelaySeconds=math.ceil(min(max(seconds, 0), MAX_DELAY_SECONDS)),
+    )
+
+
+# ===================================
+# LOCAL STAND-INS
+# ===================================
+
+
+class ManualClock:
+    """Clock advanced by hand, so debounce behaviour can be replayed quickly"""
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class LocalQueue:
+    """In-memory stand-in for the analysis delay queue.
+
+    Implements the SQS call the worker uses (send_message with
+    DelaySeconds) and hands out due messages as Lambda SQS event records,
+    so the handler can be driven locally with a ManualClock.
+    """
+
+    def __init__(self, delay_seconds: int = 0, clock=time.time):
+        self.delay_seconds = delay_seconds
+        self.clock = clock
+        self.heap: List[Tuple[float, int, Dict[str, Any]]] = []
+        self.sequence = 0
+        self.sent = 0
+
+    def send_message(
+        self, QueueUrl: str = "", MessageBody: str = "", DelaySeconds: int = None
+    ) -> Dict[str, str]:
+        delay = self.delay_seconds if DelaySeconds is None else DelaySeconds
+        message_id = str(uuid.uuid4())
+        record = {
+            "messageId": message_id,
+            "receiptHandle": message_id,
+            "body": MessageBody,
+            "eventSource": "aws:sqs",
+        }
+        heapq.heappush(self.heap, (self.clock() + delay, self.sequence, record))
+        self.sequence += 1
+        self.sent += 1
+        return {"MessageId": message_id}
+
+    def send_event(self, detail: Dict[str, Any], detail_type: str) -> str:
+        """Enqueue an EventBridge-shaped envelope, like the queue target does"""
+        body = {
+            "source": "property.service",
+            "detail-type": detail_type,
+            "time": datetime.fromtimestamp(self.clock(), timezone.utc).isoformat(),
+            "detail": detail,
+        }
+        return self.send_message(MessageBody=json.dumps(body))["MessageId"]
+
+    def receive(self, max_messages: int = 10) -> Dict[str, Any]:
+        """Due messages as a Lambda SQS event (removed from the queue)"""
+        records = []
+        while self.heap and self.heap[0][0] <= self.clock():
+            records.append(heapq.heappop(self.heap)[2])
+            if len(records) == max_messages:
+                break
+        return {"Records": records}
+
+    def __len__(self) -> int:
+        return len(self.heap)
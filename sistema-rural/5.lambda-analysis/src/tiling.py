@@ -0,0 +1,433 @@
+import os
+import base64
+import logging
+import multiprocessing
+import numpy as np
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from geometry import rasterize_ring, ring_bbox, ring_centroid
+from rasters import (
+    GRID_NORTH,
+    GRID_WEST,
+    LAYERS,
+    RasterStore,
+    cell_range,
+    slope_degrees,
+    tiles_for_range,
+)
+
+logger = logging.getLogger()
+
+# NDVI above which a cell counts as vegetated
+VEGETATION_NDVI = 0.3
+
+# Fixed histogram bins (low, high, bins) per metric so that per-block
+# histograms add up exactly. Values outside the range land in the edge bins.
+HISTOGRAM_BINS = {
+    "elevation": (-500.0, 9000.0, 950),  # 10 m
+    "slope": (0.0, 90.0, 180),  # 0.5°
+    "ndvi": (-1.0, 1.0, 100),  # 0.02
+}
+
+PERCENTILES = (10, 50, 90)
+
+# Extra cells read around each block: the slope kernel needs its neighbours
+LAYER_HALO = {"dem": 1, "ndvi": 0}
+
+
+class PartialStats:
+    """Mergeable zonal statistics of one block of cells.
+
+    count, sum, sum of squares, min, max and a fixed-bin histogram are all
+    associative, so merging the partials of every block gives the same
+    result as one pass over the whole polygon.
+    """
+
+    def __init__(self, metric: str):
+        self.metric = metric
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.histogram = np.zeros(HISTOGRAM_BINS[metric][2], dtype=np.int64)
+
+    @classmethod
+    def of(cls, metric: str, values: np.ndarray) -> "PartialStats":
+        labels = np.zeros(values.size, dtype=np.int64)
+        return cls.grouped(metric, labels, values.ravel(), 1)[0]
+
+    @classmethod
+    def grouped(
+        cls, metric: str, labels: np.ndarray, values: np.ndarray, groups: int
+    ) -> List["PartialStats"]:
+        """Partial stats of every group in one vectorized pass over the cells.
+
+        labels[i] in [0, groups) is the group of values[i].
+        """
+        valid = ~np.isnan(values)
+        labels = labels[valid]
+        values = values[valid].astype(np.float64)
+
+        low, high, bins = HISTOGRAM_BINS[metric]
+        index = ((values - low) * (bins / (high - low))).astype(np.int64)
+        index = np.clip(index, 0, bins - 1)
+
+        counts = np.bincount(labels, minlength=groups)
+        totals = np.bincount(labels, weights=values, minlength=groups)
+        totals_sq = np.bincount(labels, weights=values * values, minlength=groups)
+        mins = np.full(groups, np.inf)
+        maxs = np.full(groups, -np.inf)
+        np.minimum.at(mins, labels, values)
+        np.maximum.at(maxs, labels, values)
+        histograms = np.bincount(
+            labels * bins + index, minlength=groups * bins
+        ).reshape(groups, bins)
+
+        partials = []
+        for group in range(groups):
+            partial = cls(metric)
+            partial.count = int(counts[group])
+            partial.total = float(totals[group])
+            partial.total_sq = float(totals_sq[group])
+            partial.min = float(mins[group])
+            partial.max = float(maxs[group])
+            partial.histogram = histograms[group].astype(np.int64)
+            partials.append(partial)
+        return partials
+
+    def merge(self, other: "PartialStats") -> "PartialStats":
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.histogram += other.histogram
+        return self
+
+    def summary(self) -> Optional[Dict[str, Any]]:
+        """count/mean/std/min/max/percentiles/histogram, or None when empty"""
+        if self.count == 0:
+            return None
+        mean = self.total / self.count
+        variance = max(self.total_sq / self.count - mean * mean, 0.0)
+        return {
+            "count": self.count,
+            "mean": mean,
+            "std": float(np.sqrt(variance)),
+            "min": self.min,
+            "max": self.max,
+            "percentiles": self.percentiles(),
+            "histogram": self.histogram.tolist(),
+        }
+
+    def percentiles(self) -> Dict[str, float]:
+        """p10/p50/p90 read off the histogram (linear within a bin).
+
+        Accurate to a bin width; clamped to the exact min/max, which also
+        corrects the edge bins that collect out-of-range values.
+        """
+        low, high, bins = HISTOGRAM_BINS[self.metric]
+        width = (high - low) / bins
+        cumulative = np.cumsum(self.histogram)
+        targets = np.array(PERCENTILES, dtype=np.float64) / 100.0 * self.count
+        index = np.searchsorted(cumulative, targets, side="left")
+        before = np.where(index > 0, cumulative[index - 1], 0)
+        fraction = (targets - before) / np.maximum(self.histogram[index], 1)
+        values = np.clip(low + (index + fraction) * width, self.min, self.max)
+        return {f"p{q}": float(v) for q, v in zip(PERCENTILES, values)}
+
+    def packed_histogram(self) -> Dict[str, Any]:
+        """Histogram trimmed to its non-empty bins, counts as base64 <u4.
+
+        {"start": left edge of the first bin, "width": bin width,
+        "counts": base64 of little-endian uint32 counts}
+        """
+        low, high, bins = HISTOGRAM_BINS[self.metric]
+        width = (high - low) / bins
+        nonzero = np.flatnonzero(self.histogram)
+        first, last = (nonzero[0], nonzero[-1]) if nonzero.size else (0, -1)
+        counts = self.histogram[first : last + 1].astype("<u4")
+        return {
+            "start": round(low + first * width, 6),
+            "width": round(width, 6),
+            "counts": base64.b64encode(counts.tobytes()).decode("ascii"),
+        }
+
+
+# ===================================
+# BLOCK WORKERS
+# ===================================
+
+# Per-process store of the pool workers
+worker_store: Optional[RasterStore] = None
+
+
+def init_worker(bucket: str, prefix: str, cache_dir: str):
+    """Process pool initializer: each worker gets its own S3 client and LRU"""
+    global worker_store
+    import boto3
+
+    worker_store = RasterStore(boto3.client("s3"), bucket, prefix, cache_dir)
+
+
+def analyze_block(
+    layer_name: str,
+    rows: Tuple[int, int],
+    cols: Tuple[int, int],
+    rings: List[np.ndarray],
+    whole_block: bool = False,
+    store: Optional[RasterStore] = None,
+) -> List[Dict[str, Any]]:
+    """Partial stats of every polygon's cells inside one block of a layer.
+
+    The block is read and decoded once (slope computed once for the DEM);
+    each polygon's cells get a label and all of them are reduced together.
+    whole_block skips the polygon mask (used for the centroid fallback of
+    polygons smaller than a cell). store defaults to the worker's own.
+    """
+    layer = LAYERS[layer_name]
+    halo = LAYER_HALO[layer_name]
+    window = (store or worker_store).read_cells(
+        layer_name,
+        (max(rows[0] - halo, 0), rows[1] + halo),
+        (max(cols[0] - halo, 0), cols[1] + halo),
+    )
+    inner = (
+        slice(rows[0] - window.rows[0], rows[1] - window.rows[0]),
+        slice(cols[0] - window.cols[0], cols[1] - window.cols[0]),
+    )
+
+    if whole_block:
+        cells = [np.arange((rows[1] - rows[0]) * (cols[1] - cols[0]))]
+    else:
+        cells = [
+            np.flatnonzero(
+                rasterize_ring(
+                    ring,
+                    GRID_WEST,
+                    GRID_NORTH,
+                    layer.resolution,
+                    layer.resolution,
+                    rows,
+                    cols,
+                )
+            )
+            for ring in rings
+        ]
+
+    index = np.concatenate(cells)
+    labels = np.repeat(np.arange(len(cells)), [len(c) for c in cells])
+    groups = len(cells)
+
+    if layer_name == "dem":
+        elevation = window.data[inner].ravel()[index]
+        slope = slope_degrees(window)[inner].ravel()[index]
+        return [
+            {"elevation": e, "slope": s}
+            for e, s in zip(
+                PartialStats.grouped("elevation", labels, elevation, groups),
+                PartialStats.grouped("slope", labels, slope, groups),
+            )
+        ]
+
+    values = window.data[inner].ravel()[index]
+    vegetated = np.bincount(labels, weights=values >= VEGETATION_NDVI, minlength=groups)
+    return [
+        {"ndvi": partial, "vegetated": int(vegetated[group])}
+        for group, partial in enumerate(
+            PartialStats.grouped("ndvi", labels, values, groups)
+        )
+    ]
+
+
+def merge_partials(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    merged = parts[0]
+    for part in parts[1:]:
+        for name, value in part.items():
+            if isinstance(value, PartialStats):
+                merged[name].merge(value)
+            else:
+                merged[name] += value
+    return merged
+
+
+# ===================================
+# TILED ANALYZER
+# ===================================
+
+
+def vcpu_count() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class TiledAnalyzer:
+    """Zonal statistics of a layer computed block by block.
+
+    The polygon's cell range is split along the layer's raster tiles, so
+    each block reads at most one tile (plus a halo) and peak memory is
+    bounded by the tile size. Blocks run on a process pool sized to the
+    vCPUs. Where processes cannot be started (Lambda has no /dev/shm for
+    multiprocessing semaphores) a thread pool is used instead; the numpy
+    kernels release the GIL for most of the work.
+    """
+
+    def __init__(self, store: RasterStore, max_workers: Optional[int] = None):
+        self.store = store
+        self.max_workers = max_workers or vcpu_count()
+        self.executor: Optional[Executor] = None
+        self.uses_processes = False
+        self.stats = {"blocks": 0, "tile_requests": 0, "parallel_runs": 0}
+
+    def get_executor(self) -> Executor:
+        """Pool created once per container and reused across invocations"""
+        if self.executor is None:
+            try:
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=init_worker,
+                    initargs=(
+                        self.store.bucket,
+                        self.store.prefix,
+                        self.store.cache_dir,
+                    ),
+                )
+                self.uses_processes = True
+                logger.info(f"Tiled analysis on {self.max_workers} processes")
+            except (OSError, NotImplementedError) as e:
+                logger.info(f"Process pool unavailable ({str(e)}), using threads")
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self.executor
+
+    def run(self, layer_name: str, ring: np.ndarray) -> Dict[str, Any]:
+        """Merged partial stats of one polygon over a layer"""
+        results, _ = self.run_batch(layer_name, {0: ring})
+        if isinstance(results[0], Exception):
+            raise results[0]
+        return results[0]
+
+    def run_batch(
+        self, layer_name: str, rings: Dict[Any, np.ndarray]
+    ) -> Tuple[Dict[Any, Any], Dict[str, Any]]:
+        """Merged partial stats of several polygons over a layer.
+
+        Polygons are grouped by the raster tiles their bboxes touch and each
+        tile is read once for all of its polygons. Returns (results, report):
+        results maps each key to its merged stats, or to the exception that
+        prevented computing them; report holds the tile reuse figures.
+        """
+        layer = LAYERS[layer_name]
+        size = layer.tile_size
+        ranges = {
+            key: cell_range(layer, ring_bbox(ring)) for key, ring in rings.items()
+        }
+
+        tiles: Dict[Tuple[int, int], List[Any]] = {}
+        for key, (rows, cols) in ranges.items():
+            for tile in tiles_for_range(layer, rows, cols):
+                tiles.setdefault(tile, []).append(key)
+
+        # Block = union of the ranges of the tile's polygons, clipped to the tile
+        blocks = []
+        for (tile_row, tile_col), keys in tiles.items():
+            rows = (
+                max(min(ranges[k][0][0] for k in keys), tile_row * size),
+                min(max(ranges[k][0][1] for k in keys), (tile_row + 1) * size),
+            )
+            cols = (
+                max(min(ranges[k][1][0] for k in keys), tile_col * size),
+                min(max(ranges[k][1][1] for k in keys), (tile_col + 1) * size),
+            )
+            blocks.append((rows, cols, keys))
+
+        requests = sum(len(keys) for keys in tiles.values())
+        report = {
+            "parcels": len(rings),
+            "tile_requests": requests,
+            "tile_passes": len(blocks),
+            "reuse_ratio": round(requests / len(blocks), 2) if blocks else 0.0,
+        }
+        self.stats["blocks"] += len(blocks)
+        self.stats["tile_requests"] += requests
+
+        parts: Dict[Any, List[Dict[str, Any]]] = {key: [] for key in rings}
+        errors: Dict[Any, Exception] = {}
+
+        if len(blocks) == 1:
+            # Single block: no point paying for the pool
+            rows, cols, keys = blocks[0]
+            try:
+                outputs = [
+                    analyze_block(
+                        layer_name,
+                        rows,
+                        cols,
+                        [rings[k] for k in keys],
+                        store=self.store,
+                    )
+                ]
+            except Exception as e:
+                outputs = [e]
+        else:
+            self.stats["parallel_runs"] += 1
+            executor = self.get_executor()
+            store = None if self.uses_processes else self.store
+            futures = [
+                executor.submit(
+                    analyze_block,
+                    layer_name,
+                    rows,
+                    cols,
+                    [rings[k] for k in keys],
+                    store=store,
+                )
+                for rows, cols, keys in blocks
+            ]
+            outputs = []
+            for future in futures:
+                try:
+                    outputs.append(future.result())
+                except Exception as e:
+                    outputs.append(e)
+
+        for (_, _, keys), output in zip(blocks, outputs):
+            if isinstance(output, Exception):
+                logger.warning(f"{layer_name} block failed: {str(output)}")
+                for key in keys:
+                    errors[key] = output
+            else:
+                for key, part in zip(keys, output):
+                    parts[key].append(part)
+
+        results = {}
+        for key, ring in rings.items():
+            if key in errors:
+                results[key] = errors[key]
+                continue
+
+            merged = merge_partials(parts[key])
+            first = next(v for v in merged.values() if isinstance(v, PartialStats))
+            if first.count == 0:
+                # Polygon smaller than a cell: use the cell containing the centroid
+                lon, lat = ring_centroid(ring)
+                row = int((GRID_NORTH - lat) // layer.resolution)
+                col = int((lon - GRID_WEST) // layer.resolution)
+                try:
+                    merged = analyze_block(
+                        layer_name,
+                        (row, row + 1),
+                        (col, col + 1),
+                        [ring],
+                        whole_block=True,
+                        store=self.store,
+                    )[0]
+                except Exception as e:
+                    merged = e
+            results[key] = merged
+
+        return results, report
@@ -8,7 +8,7 @@ module "lambda_geospatial" {
   handler       = "lambda_function.lambda_handler"
   runtime       = "python3.11"
   timeout       = 300 # 5 minutes
-  memory_size   = 512
+  memory_size   = var.memory_size # vCPUs scale with memory (tiled analysis)
 
   create_role = false
   lambda_role = data.terraform_remote_state.analysis_infra.outputs.lambda_analysis_role_arn
@@ -18,6 +18,11 @@ module "lambda_geospatial" {
     PROPERTY_ANALYSIS_TABLE = data.terraform_remote_state.infrastructure.outputs.property_analysis_table_name
     GEOSPATIAL_CACHE_BUCKET = data.terraform_remote_state.analysis_infra.outputs.geospatial_cache_bucket_name
     EVENTBRIDGE_BUS_NAME    = data.terraform_remote_state.analysis_infra.outputs.property_analysis_bus_name
+    CLIMATE_GRID_KEY        = var.climate_grid_key
+    ANALYSIS_VERSION        = var.analysis_version
+    TILE_WORKERS            = var.tile_workers
+    ANALYSIS_QUEUE_URL      = data.terraform_remote_state.analysis_infra.outputs.property_analysis_delay_queue_url
+    ANALYSIS_SLOW_QUEUE_URL = data.terraform_remote_state.analysis_infra.outputs.property_analysis_slow_queue_url
     ENVIRONMENT             = var.environment
   }
 
@@ -29,6 +34,42 @@ module "lambda_geospatial" {
   }
 }
 
+# Backfill: re-enqueues properties whose analysis is missing, failed or from
+# another analysis version. Invoke repeatedly until it returns complete=true.
+module "lambda_backfill" {
+  source  = "terraform-aws-modules/lambda/aws"
+  version = "~> 4.7"
+
+  function_name = "${var.project_name}-analysis-backfill-${var.environment}"
+  source_path   = "../src"
+  layers        = [module.lambda_geospatial_layer.lambda_layer_arn] # lanes uses numpy
+  handler       = "backfill.lambda_handler"
+  runtime       = "python3.11"
+  timeout       = 900 # 15 minutes, resumes from the S3 checkpoint
+  memory_size   = 256
+
+  create_role = false
+  lambda_role = data.terraform_remote_state.analysis_infra.outputs.lambda_analysis_role_arn
+
+  environment_variables = {
+    PROPERTIES_TABLE        = data.terraform_remote_state.infrastructure.outputs.properties_table_name
+    ANALYSIS_QUEUE_URL      = data.terraform_remote_state.analysis_infra.outputs.property_analysis_delay_queue_url
+    ANALYSIS_SLOW_QUEUE_URL = data.terraform_remote_state.analysis_infra.outputs.property_analysis_slow_queue_url
+    GEOSPATIAL_CACHE_BUCKET = data.terraform_remote_state.analysis_infra.outputs.geospatial_cache_bucket_name
+    ANALYSIS_VERSION        = var.analysis_version
+    BACKFILL_SEGMENTS       = var.backfill_segments
+    BACKFILL_RATE           = var.backfill_rate
+    ENVIRONMENT             = var.environment
+  }
+
+  depends_on = [module.lambda_geospatial_layer]
+
+  tags = {
+    Name = "${var.project_name}-analysis-backfill-lambda"
+    Type = "batch-job"
+  }
+}
+
 module "lambda_geospatial_layer" {
   source          = "terraform-aws-modules/lambda/aws"
   version         = "~> 4.7"
@@ -56,11 +97,38 @@ module "lambda_geospatial_layer" {
   }
 }
 
-# SQS Event Source Mapping
+# ===================================
+# SQS EVENT SOURCE MAPPINGS (LANES)
+# ===================================
+
+# Fast lane: small plots, larger batches share tile reads
 resource "aws_lambda_event_source_mapping" "sqs_trigger" {
   event_source_arn = data.terraform_remote_state.analysis_infra.outputs.property_analysis_delay_queue_arn
   function_name    = module.lambda_geospatial.lambda_function_arn
-  batch_size       = 1
+  batch_size       = var.sqs_batch_size
+
+  maximum_batching_window_in_seconds = 5
+  function_response_types            = ["ReportBatchItemFailures"]
+
+  scaling_config {
+    maximum_concurrency = var.fast_lane_concurrency
+  }
 
   depends_on = [module.lambda_geospatial]
-}
\ No newline at end of file
+}
+
+# Slow lane: large estates one at a time, capped so they cannot take the
+# concurrency the fast lane needs
+resource "aws_lambda_event_source_mapping" "sqs_slow_trigger" {
+  event_source_arn = data.terraform_remote_state.analysis_infra.outputs.property_analysis_slow_queue_arn
+  function_name    = module.lambda_geospatial.lambda_function_arn
+  batch_size       = var.slow_lane_batch_size
+
+  function_response_types = ["ReportBatchItemFailures"]
+
+  scaling_config {
+    maximum_concurrency = var.slow_lane_concurrency
+  }
+
+  depends_on = [module.lambda_geospatial]
+}
@@ -14,4 +14,64 @@ variable "project_name" {
   description = "Project name"
   type        = string
   default     = "sistema-rural"
-}
\ No newline at end of file
+}
+
+variable "climate_grid_key" {
+  description = "S3 key of the packed climate-normals grid in the geospatial cache bucket"
+  type        = string
+  default     = "climate/normals-v1.bin"
+}
+
+variable "analysis_version" {
+  description = "Analysis version tag; bumping it invalidates cached results"
+  type        = string
+  default     = "v1"
+}
+
+variable "sqs_batch_size" {
+  description = "SQS messages per invocation; completion events of a batch are published together"
+  type        = number
+  default     = 5
+}
+
+variable "fast_lane_concurrency" {
+  description = "Maximum concurrent invocations consuming the fast (small plot) lane"
+  type        = number
+  default     = 20
+}
+
+variable "slow_lane_batch_size" {
+  description = "SQS messages per invocation on the slow (large estate) lane"
+  type        = number
+  default     = 1
+}
+
+variable "slow_lane_concurrency" {
+  description = "Maximum concurrent invocations consuming the slow lane (minimum 2)"
+  type        = number
+  default     = 2
+}
+
+variable "memory_size" {
+  description = "Analysis lambda memory (MB); 3008 MB gives 2 vCPUs for tiled analysis"
+  type        = number
+  default     = 3008
+}
+
+variable "tile_workers" {
+  description = "Worker count for tiled analysis of large properties (0 = one per vCPU)"
+  type        = number
+  default     = 0
+}
+
+variable "backfill_segments" {
+  description = "Parallel Scan segments used by the analysis backfill"
+  type        = number
+  default     = 4
+}
+
+variable "backfill_rate" {
+  description = "Maximum properties enqueued per second by the analysis backfill"
+  type        = number
+  default     = 20
+}
@@ -3,11 +3,26 @@ import boto3
 import os
 from datetime import datetime, timezone, timedelta
 from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
 
 # AWS clients
 dynamodb = boto3.resource("dynamodb")
 connections_table = dynamodb.Table(os.environ["WEBSOCKET_TABLE"])
 
+# Índice tópico -> conexão (um item por subscrição)
+subscriptions_table = dynamodb.Table(os.environ["SUBSCRIPTIONS_TABLE"])
+
+# Item do índice que lista os padrões com * em uso (um por padrão), com o
+# número de conexões subscritas em "subscribers"
+TOPIC_PATTERNS = "#patterns"
+
+# Clientes da API de gerenciamento por endpoint, reaproveitados entre
+# invocações quentes
+management_clients = {}
+
+# Conexões mortas encontradas durante a invocação, removidas ao final dela
+stale_connections = []
+
 
 def lambda_handler(event, context):
     """Handler único para todas as rotas WebSocket"""
@@ -20,7 +35,7 @@ def lambda_handler(event, context):
     stage = event["requestContext"]["stage"]
     endpoint_url = f"https://{domain_name}/{stage}"
 
-    apigateway = boto3.client("apigatewaymanagementapi", endpoint_url=endpoint_url)
+    apigateway = management_client(endpoint_url)
 
     try:
         if route_key == "$connect":
@@ -38,6 +53,18 @@ def lambda_handler(event, context):
         print(f"Erro geral: {str(e)}")
         return {"statusCode": 500, "body": "Internal server error"}
 
+    finally:
+        remove_stale_connections()
+
+
+def management_client(endpoint_url):
+    """Cliente apigatewaymanagementapi do endpoint (em cache)"""
+    if endpoint_url not in management_clients:
+        management_clients[endpoint_url] = boto3.client(
+            "apigatewaymanagementapi", endpoint_url=endpoint_url
+        )
+    return management_clients[endpoint_url]
+
 
 def handle_connect(event, connection_id):
     """Processar conexão"""
@@ -57,7 +84,6 @@ def handle_connect(event, connection_id):
             "userId": user_id,
             "connectedAt": datetime.now(timezone.utc).isoformat(),
             "ttl": ttl,
-            "subscriptions": [],
         }
     )
 
@@ -67,11 +93,130 @@ def handle_connect(event, connection_id):
 
 def handle_disconnect(connection_id):
     """Processar desconexão"""
-    connections_table.delete_item(Key={"connectionId": connection_id})
+    remove_connection(connection_id)
     print(f"Desconectado: {connection_id}")
     return {"statusCode": 200}
 
 
+def remove_connection(connection_id):
+    """Remover conexão e suas entradas no índice de tópicos"""
+    response = connections_table.delete_item(
+        Key={"connectionId": connection_id}, ReturnValues="ALL_OLD"
+    )
+    topics = response.get("Attributes", {}).get("subscriptions", [])
+    remove_index_entries({connection_id: topics})
+
+
+def remove_stale_connections():
+    """Remover as conexões mortas encontradas na invocação.
+
+    As subscrições são lidas com BatchGetItem, e conexões e entradas no
+    índice apagadas com BatchWriteItem (o batch_writer envia 25 por
+    requisição e reenvia as não processadas).
+    """
+    connection_ids = list(dict.fromkeys(stale_connections))
+    stale_connections.clear()
+    if not connection_ids:
+        return
+
+    try:
+        subscriptions = connection_subscriptions(connection_ids)
+        with connections_table.batch_writer() as batch:
+            for connection_id in connection_ids:
+                batch.delete_item(Key={"connectionId": connection_id})
+        remove_index_entries(subscriptions)
+        print(f"Conexões mortas removidas: {len(connection_ids)}")
+    except Exception as e:
+        print(f"Erro ao remover conexões mortas {connection_ids}: {str(e)}")
+
+
+def connection_subscriptions(connection_ids):
+    """Subscrições de cada conexão, 100 chaves por BatchGetItem"""
+    subscriptions = {}
+    for start in range(0, len(connection_ids), 100):
+        request = {
+            connections_table.name: {
+                "Keys": [
+                    {"connectionId": connection_id}
+                    for connection_id in connection_ids[start : start + 100]
+                ],
+                "ProjectionExpression": "connectionId, subscriptions",
+            }
+        }
+
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response["Responses"].get(connections_table.name, []):
+                subscriptions[item["connectionId"]] = item.get("subscriptions", [])
+            request = response.get("UnprocessedKeys")
+
+    return subscriptions
+
+
+def remove_index_entries(subscriptions):
+    """Apagar as entradas {conexão: tópicos} do índice e descontar as
+    conexões dos padrões com *"""
+    with subscriptions_table.batch_writer() as batch:
+        for connection_id, topics in subscriptions.items():
+            for topic in topics:
+                batch.delete_item(Key={"topic": topic, "connectionId": connection_id})
+
+    for topics in subscriptions.values():
+        for topic in topics:
+            if "*" in topic:
+                remove_pattern_subscriber(topic)
+
+
+def valid_topic(topic):
+    """Tópico ou padrão válido: segmentos não vazios separados por ponto,
+    com * apenas como segmento inteiro (ex.: property.*.analysis)"""
+    return all(
+        segment and ("*" not in segment or segment == "*")
+        for segment in topic.split(".")
+    )
+
+
+def update_subscriptions(connection_id, operation, topic):
+    """ADD/DELETE atômico do tópico no string set de subscrições.
+
+    Retorna o item atualizado, ou None se a conexão não existe.
+    """
+    update = {
+        "Key": {"connectionId": connection_id},
+        "UpdateExpression": f"{operation} subscriptions :topic",
+        "ConditionExpression": "attribute_exists(connectionId)",
+        "ExpressionAttributeValues": {":topic": {topic}},
+        "ReturnValues": "ALL_NEW",
+    }
+    try:
+        return connections_table.update_item(**update)["Attributes"]
+    except ClientError as e:
+        code = e.response["Error"]["Code"]
+        if code == "ConditionalCheckFailedException":
+            return None
+        if code != "ValidationException":
+            raise
+
+    # Conexões anteriores guardam as subscrições em lista: converter para
+    # string set e repetir a operação
+    item = connections_table.get_item(Key={"connectionId": connection_id}).get("Item")
+    if item is None:
+        return None
+    topics = set(item.get("subscriptions", []))
+    if topics:
+        connections_table.update_item(
+            Key={"connectionId": connection_id},
+            UpdateExpression="SET subscriptions = :topics",
+            ExpressionAttributeValues={":topics": topics},
+        )
+    else:
+        connections_table.update_item(
+            Key={"connectionId": connection_id},
+            UpdateExpression="REMOVE subscriptions",
+        )
+    return connections_table.update_item(**update)["Attributes"]
+
+
 def handle_subscribe(event, connection_id, apigateway):
     """Processar subscrição"""
     body = json.loads(event.get("body", "{}"))
@@ -85,22 +230,53 @@ def handle_subscribe(event, connection_id, apigateway):
         )
         return {"statusCode": 400}
 
-    # Buscar conexão
-    response = connections_table.get_item(Key={"connectionId": connection_id})
-    if "Item" not in response:
+    # Tópicos iniciados por # são reservados (ex.: época do registro)
+    if topic.startswith("#") or not valid_topic(topic):
+        send_message(
+            apigateway,
+            connection_id,
+            {"type": "error", "message": "Topic inválido ou reservado"},
+        )
+        return {"statusCode": 400}
+
+    # Padrões só recebem eventos do próprio usuário (o handler de eventos
+    # filtra pelo userId do evento): conexões sem usuário não podem usá-los
+    if "*" in topic:
+        connection = connections_table.get_item(
+            Key={"connectionId": connection_id}
+        ).get("Item")
+        if connection is None:
+            return {"statusCode": 404}
+        if not connection.get("userId"):
+            send_message(
+                apigateway,
+                connection_id,
+                {"type": "error", "message": "Padrões exigem usuário autenticado"},
+            )
+            return {"statusCode": 403}
+
+    # Uma única escrita atômica: subscrições simultâneas não se sobrescrevem
+    item = update_subscriptions(connection_id, "ADD", topic)
+    if item is None:
         return {"statusCode": 404}
 
-    # Atualizar subscrições
-    item = response["Item"]
-    subscriptions = item.get("subscriptions", [])
+    # Registrar no índice do tópico (idempotente)
+    previous = subscriptions_table.put_item(
+        Item={
+            "topic": topic,
+            "connectionId": connection_id,
+            "userId": item.get("userId"),
+            "subscribedAt": datetime.now(timezone.utc).isoformat(),
+            "ttl": item.get("ttl"),
+        },
+        ReturnValues="ALL_OLD",
+    )
 
-    if topic not in subscriptions:
-        subscriptions.append(topic)
-        connections_table.update_item(
-            Key={"connectionId": connection_id},
-            UpdateExpression="SET subscriptions = :subs",
-            ExpressionAttributeValues={":subs": subscriptions},
-        )
+    # Padrões com * ficam registrados para o handler de eventos montar a
+    # trie de tópicos; cada conexão conta uma vez, mesmo se repetir a
+    # subscrição
+    if "*" in topic and "Attributes" not in previous:
+        add_pattern_subscriber(topic, item.get("ttl"))
 
     # Confirmar subscrição
     send_message(
@@ -109,7 +285,7 @@ def handle_subscribe(event, connection_id, apigateway):
         {
             "type": "subscription_confirmed",
             "topic": topic,
-            "subscriptions": subscriptions,
+            "subscriptions": sorted(item.get("subscriptions", [])),
         },
     )
 
@@ -125,19 +301,15 @@ def handle_unsubscribe(event, connection_id, apigateway):
     if not topic:
         return {"statusCode": 400}
 
-    # Buscar e atualizar subscrições
-    response = connections_table.get_item(Key={"connectionId": connection_id})
-    if "Item" not in response:
+    item = update_subscriptions(connection_id, "DELETE", topic)
+    if item is None:
         return {"statusCode": 404}
 
-    subscriptions = response["Item"].get("subscriptions", [])
-    if topic in subscriptions:
-        subscriptions.remove(topic)
-        connections_table.update_item(
-            Key={"connectionId": connection_id},
-            UpdateExpression="SET subscriptions = :subs",
-            ExpressionAttributeValues={":subs": subscriptions},
-        )
+    previous = subscriptions_table.delete_item(
+        Key={"topic": topic, "connectionId": connection_id}, ReturnValues="ALL_OLD"
+    )
+    if "*" in topic and "Attributes" in previous:
+        remove_pattern_subscriber(topic)
 
     send_message(
         apigateway,
@@ -145,13 +317,96 @@ def handle_unsubscribe(event, connection_id, apigateway):
         {
             "type": "unsubscription_confirmed",
             "topic": topic,
-            "subscriptions": subscriptions,
+            "subscriptions": sorted(item.get("subscriptions", [])),
         },
     )
 
     return {"statusCode": 200}
 
 
+def add_pattern_subscriber(pattern, ttl):
+    """Contar mais uma conexão no padrão.
+
+    O ttl do item só avança: ele expira com a última conexão subscrita, se
+    nenhuma remoção chegar a zerar a contagem.
+    """
+    key = {"topic": TOPIC_PATTERNS, "connectionId": pattern}
+    if ttl is not None:
+        try:
+            subscriptions_table.update_item(
+                Key=key,
+                UpdateExpression="ADD subscribers :one SET #ttl = :ttl",
+                ConditionExpression="attribute_not_exists(#ttl) OR #ttl < :ttl",
+                ExpressionAttributeNames={"#ttl": "ttl"},
+                ExpressionAttributeValues={":one": 1, ":ttl": ttl},
+            )
+            return
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+
+    # O item já dura mais que esta conexão: só contar
+    subscriptions_table.update_item(
+        Key=key,
+        UpdateExpression="ADD subscribers :one",
+        ExpressionAttributeValues={":one": 1},
+    )
+
+
+def remove_pattern_subscriber(pattern):
+    """Descontar uma conexão do padrão, apagando o item quando não sobra
+    nenhuma. Chamar depois de apagar a entrada da conexão no índice."""
+    key = {"topic": TOPIC_PATTERNS, "connectionId": pattern}
+    try:
+        response = subscriptions_table.update_item(
+            Key=key,
+            UpdateExpression="ADD subscribers :minus",
+            ConditionExpression="attribute_exists(connectionId)",
+            ExpressionAttributeValues={":minus": -1},
+            ReturnValues="UPDATED_NEW",
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return
+    if response["Attributes"]["subscribers"] > 0:
+        return
+
+    # Contagem zerada: conferir no índice do padrão, que também cobre itens
+    # gravados antes da contagem e subscrições concorrentes
+    remaining = pattern_subscribers(pattern)
+    try:
+        if remaining:
+            subscriptions_table.update_item(
+                Key=key,
+                UpdateExpression="SET subscribers = :count",
+                ConditionExpression="subscribers <= :zero",
+                ExpressionAttributeValues={":count": remaining, ":zero": 0},
+            )
+        else:
+            subscriptions_table.delete_item(
+                Key=key,
+                ConditionExpression="subscribers <= :zero",
+                ExpressionAttributeValues={":zero": 0},
+            )
+    except ClientError as e:
+        # Outra conexão subscreveu no meio tempo
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+
+
+def pattern_subscribers(pattern):
+    """Número de conexões no índice do padrão, seguindo todas as páginas"""
+    count = 0
+    query = {"KeyConditionExpression": Key("topic").eq(pattern), "Select": "COUNT"}
+    while True:
+        response = subscriptions_table.query(**query)
+        count += response["Count"]
+        if "LastEvaluatedKey" not in response:
+            return count
+        query["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
 def send_message(apigateway, connection_id, message):
     """Enviar mensagem para conexão"""
     try:
@@ -159,8 +414,7 @@ def send_message(apigateway, connection_id, message):
             ConnectionId=connection_id, Data=json.dumps(message)
         )
     except apigateway.exceptions.GoneException:
-        # Conexão morta, remover do banco
-        connections_table.delete_item(Key={"connectionId": connection_id})
-        print(f"Conexão morta removida: {connection_id}")
+        # Conexão morta, removida depois da resposta
+        stale_connections.append(connection_id)
     except Exception as e:
         print(f"Erro ao enviar mensagem: {str(e)}")
@@ -36,12 +36,15 @@ resource "aws_iam_role_policy" "lambda_websocket_policy" {
           "dynamodb:PutItem",
           "dynamodb:DeleteItem",
           "dynamodb:UpdateItem",
+          "dynamodb:BatchGetItem",
+          "dynamodb:BatchWriteItem",
           "dynamodb:Scan",
           "dynamodb:Query"
         ]
         Resource = [
           data.terraform_remote_state.infrastructure.outputs.websocket_connections_table_arn,
-          "${data.terraform_remote_state.infrastructure.outputs.websocket_connections_table_arn}/index/*"
+          "${data.terraform_remote_state.infrastructure.outputs.websocket_connections_table_arn}/index/*",
+          data.terraform_remote_state.infrastructure.outputs.websocket_subscriptions_table_arn
         ]
       },
       {
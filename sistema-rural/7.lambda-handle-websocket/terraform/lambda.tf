@@ -14,6 +14,7 @@ module "lambda_websocket_handler" {
 
   environment_variables = {
     WEBSOCKET_TABLE      = data.terraform_remote_state.infrastructure.outputs.websocket_connections_table_name
+    SUBSCRIPTIONS_TABLE  = data.terraform_remote_state.infrastructure.outputs.websocket_subscriptions_table_name
     API_GATEWAY_ENDPOINT = "${var.project_name}-websocket-api.execute-api.${var.aws_region}.amazonaws.com/${var.environment}"
     ENVIRONMENT          = var.environment
   }
@@ -0,0 +1,206 @@
+import json
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+import boto3
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastEngine:
+    """Broadcast to every connection with a parallel segmented scan.
+
+    One scanner thread per segment pages through its part of the
+    connections table and hands the pages to a bounded queue; the calling
+    thread drains the queue and posts each page through ``send``, so the
+    scanners block (backpressure) whenever posting falls behind. The scan
+    position of a segment is checkpointed only after its page was posted,
+    so a broadcast stopped by ``should_stop`` resumes from the checkpoint
+    without skipping anyone (a page in flight may be sent twice).
+    """
+
+    NAMESPACE = "SistemaRural/Notifications"
+
+    def __init__(
+        self,
+        table_name: str,
+        segments: int = 4,
+        page_size: int = 500,
+        queued_pages: int = 8,
+    ):
+        self.table_name = table_name
+        self.segments = segments
+        self.page_size = page_size
+        self.queued_pages = queued_pages
+
+    def run(
+        self,
+        send: Callable[[List[str]], List[str]],
+        checkpoint: Optional[Dict[str, Any]] = None,
+        exclude_user_id: Optional[str] = None,
+        should_stop: Callable[[], bool] = lambda: False,
+    ) -> Dict[str, Any]:
+        """Post pages until the table is exhausted or should_stop() is true.
+
+        send receives the connection IDs of a page and returns their
+        outcomes. Returns the updated checkpoint: per-segment cursors, the
+        outcome totals and whether the broadcast is complete.
+        """
+
+        checkpoint = checkpoint or self.new_checkpoint()
+        pending = [
+            segment
+            for segment in range(checkpoint["totalSegments"])
+            if not checkpoint["done"][segment]
+        ]
+
+        pages = queue.Queue(maxsize=self.queued_pages)
+        stop = threading.Event()
+        scanners = [
+            threading.Thread(
+                target=self.scan_segment,
+                args=(segment, checkpoint, pages, stop, exclude_user_id),
+                name=f"broadcast-scan-{segment}",
+                daemon=True,
+            )
+            for segment in pending
+        ]
+        for scanner in scanners:
+            scanner.start()
+
+        totals = Counter(checkpoint["outcomes"])
+        started = time.monotonic()
+        posted = 0
+
+        while not all(checkpoint["done"]):
+            if should_stop():
+                logger.warning(
+                    f"Broadcast stopping early at {sum(totals.values())} messages"
+                )
+                break
+            try:
+                segment, connection_ids, cursor = pages.get(timeout=0.1)
+            except queue.Empty:
+                # A scanner may queue its last page right before exiting
+                if pages.empty() and not any(s.is_alive() for s in scanners):
+                    break
+                continue
+
+            if isinstance(cursor, Exception):
+                logger.error(f"Broadcast scan of segment {segment} failed: {cursor}")
+                checkpoint["errors"] += 1
+                break
+
+            totals.update(send(connection_ids) if connection_ids else [])
+            posted += len(connection_ids)
+
+            checkpoint["cursors"][segment] = cursor
+            checkpoint["done"][segment] = cursor is None
+            logger.info(
+                f"Broadcast progress: segment {segment}, {sum(totals.values())} messages"
+            )
+
+        stop.set()
+        for scanner in scanners:
+            scanner.join()
+
+        elapsed = time.monotonic() - started
+        checkpoint["outcomes"] = dict(totals)
+        checkpoint["seconds"] = round(checkpoint["seconds"] + elapsed, 3)
+        checkpoint["complete"] = all(checkpoint["done"])
+        checkpoint["lastRun"] = {
+            "messages": posted,
+            "seconds": round(elapsed, 3),
+            "messagesPerSecond": round(posted / elapsed, 1) if elapsed else 0.0,
+        }
+        return checkpoint
+
+    def new_checkpoint(self) -> Dict[str, Any]:
+        return {
+            "totalSegments": self.segments,
+            "cursors": [None] * self.segments,
+            "done": [False] * self.segments,
+            "outcomes": {},
+            "seconds": 0.0,
+            "errors": 0,
+            "complete": False,
+        }
+
+    def scan_segment(
+        self,
+        segment: int,
+        checkpoint: Dict[str, Any],
+        pages: queue.Queue,
+        stop: threading.Event,
+        exclude_user_id: Optional[str] = None,
+    ) -> None:
+        """Page through one segment, handing (segment, IDs, cursor) to pages"""
+
+        # boto3 resources are not thread-safe: one session per scanner
+        table = boto3.session.Session().resource("dynamodb").Table(self.table_name)
+        scan = {
+            "Segment": segment,
+            "TotalSegments": checkpoint["totalSegments"],
+            "ProjectionExpression": "connectionId, userId",
+            "Limit": self.page_size,
+        }
+        if checkpoint["cursors"][segment]:
+            scan["ExclusiveStartKey"] = checkpoint["cursors"][segment]
+
+        while not stop.is_set():
+            try:
+                response = table.scan(**scan)
+            except Exception as e:
+                self.put(pages, (segment, [], e), stop)
+                return
+
+            connection_ids = [
+                item["connectionId"]
+                for item in response["Items"]
+                if not (exclude_user_id and item.get("userId") == exclude_user_id)
+            ]
+            cursor = response.get("LastEvaluatedKey")
+            if not self.put(pages, (segment, connection_ids, cursor), stop):
+                return
+            if cursor is None:
+                return
+            scan["ExclusiveStartKey"] = cursor
+
+    @staticmethod
+    def put(pages: queue.Queue, page: tuple, stop: threading.Event) -> bool:
+        """Block until the page is queued; False if the broadcast stopped"""
+        while not stop.is_set():
+            try:
+                pages.put(page, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def log_metrics(self, checkpoint: Dict[str, Any]) -> Dict[str, Any]:
+        """Log the throughput of the last run as a CloudWatch embedded metric"""
+        run = checkpoint["lastRun"]
+        document = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": self.NAMESPACE,
+                        "Dimensions": [[]],
+                        "Metrics": [
+                            {"Name": "BroadcastMessages", "Unit": "Count"},
+                            {"Name": "BroadcastThroughput", "Unit": "Count/Second"},
+                        ],
+                    }
+                ],
+            },
+            "BroadcastMessages": run["messages"],
+            "BroadcastThroughput": run["messagesPerSecond"],
+        }
+        # EMF documents must be printed as-is, without a log prefix
+        print(json.dumps(document))
+        return document
@@ -2,49 +2,189 @@ import json
 import boto3
 import os
 import logging
+import time
+import uuid
 from datetime import datetime, timezone
-from typing import Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, NamedTuple, Optional, Set, Tuple
+from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+from broadcast import BroadcastEngine
+from registry_cache import RegistryCache
+from topic_trie import TopicTrie
+
 # Configure logging for CloudWatch
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 # AWS clients
 dynamodb = boto3.resource("dynamodb")
+sqs = boto3.client("sqs")
 
 # Environment variables
 CONNECTIONS_TABLE = os.environ["WEBSOCKET_TABLE"]
+SUBSCRIPTIONS_TABLE = os.environ["SUBSCRIPTIONS_TABLE"]
 WEBSOCKET_ENDPOINT = os.environ["WEBSOCKET_API_ENDPOINT"]
+NOTIFICATIONS_QUEUE_URL = os.environ.get("NOTIFICATIONS_QUEUE_URL")
 
-# DynamoDB table
+# DynamoDB tables
 connections_table = dynamodb.Table(CONNECTIONS_TABLE)
 
+# Topic -> connection index maintained by the WebSocket handler
+subscriptions_table = dynamodb.Table(SUBSCRIPTIONS_TABLE)
+
+# Concurrent posts per fan-out, also the HTTP pool size of each client
+FANOUT_WORKERS = int(os.environ.get("FANOUT_WORKERS", "32"))
+
+# Size bound of a digest frame; API Gateway rejects messages over 128 KB
+MAX_FRAME_BYTES = int(os.environ.get("MAX_FRAME_BYTES", "65536"))
+
+# Frames a single connection may receive per batch, overflow included
+MAX_FRAMES_PER_CONNECTION = int(os.environ.get("MAX_FRAMES_PER_CONNECTION", "5"))
+
+# Message types merged per connection into digest frames, and the digest type
+DIGEST_TYPES = {
+    "property_notification": "property_batch",
+    "analysis_notification": "analysis_batch",
+}
+
+# How much of the event detail notifications embed: "id" (none), "summary"
+# (SUMMARY_FIELDS) or "full" (the whole detail, coordinates included)
+PAYLOAD_PROFILE = os.environ.get("PAYLOAD_PROFILE", "summary")
+SUMMARY_FIELDS = ("name", "type", "area", "status", "analysisLane")
+
+# Messages encoding larger than this drop their data and keep only dataRef,
+# the CRUD API path the client fetches it from
+MAX_INLINE_BYTES = int(os.environ.get("MAX_INLINE_BYTES", "32768"))
+
+# Time left (ms) at which the connection sweeper stops; the next run restarts
+SWEEP_MARGIN_MS = int(os.environ.get("SWEEP_MARGIN_MS", "10000"))
+
+# Parallel scan segments of a broadcast; a broadcast stops this long (ms)
+# before the invocation times out and resumes from its checkpoint in the
+# next one, unless its scans failed BROADCAST_MAX_ERRORS times
+BROADCAST_SEGMENTS = int(os.environ.get("BROADCAST_SEGMENTS", "4"))
+BROADCAST_MARGIN_MS = int(os.environ.get("BROADCAST_MARGIN_MS", "15000"))
+BROADCAST_MAX_ERRORS = 3
+
+# Seconds a cached user or topic connection set is served (0 disables)
+REGISTRY_TTL_SECONDS = float(os.environ.get("REGISTRY_TTL_SECONDS", "30"))
+
+# Item of the subscriptions table counting connection registry changes; the
+# "#" prefix is reserved, so no real topic can collide with it
+REGISTRY_EPOCH_KEY = {"topic": "#registry", "connectionId": "#epoch"}
+
+# Change log of the registry: every epoch bump logs the keys it changed in
+# the same partition (connectionId "#log#<epoch>") for REGISTRY_LOG_TTL
+# seconds. A container more than REGISTRY_LOG_WINDOW epochs behind, or a
+# bump with more than REGISTRY_LOG_MAX_KEYS keys, drops the whole cache
+REGISTRY_LOG_TTL = 3600
+REGISTRY_LOG_WINDOW = 200
+REGISTRY_LOG_MAX_KEYS = 2000
+
+# Index topic listing the wildcard patterns in use (connectionId = pattern),
+# written by the WebSocket handler on subscribe; "subscribers" counts the
+# connections subscribed to each pattern
+TOPIC_PATTERNS = "#patterns"
+
+# Delivery outcomes
+SENT = "sent"
+GONE = "gone"
+FAILED = "failed"
+
+# Fan-out count incremented by each outcome
+OUTCOME_COUNTS = {SENT: "delivered", GONE: "gone", FAILED: "failed"}
+
+# Management API clients by endpoint and the fan-out pool, both reused by
+# warm invocations so TLS connections stay open between events
+management_clients: Dict[str, Any] = {}
+fanout_pool = ThreadPoolExecutor(
+    max_workers=FANOUT_WORKERS, thread_name_prefix="fanout"
+)
+
+broadcast_engine = BroadcastEngine(CONNECTIONS_TABLE, BROADCAST_SEGMENTS)
+
+# userId -> connections and topic -> connections, across warm invocations
+registry = RegistryCache(REGISTRY_TTL_SECONDS)
+
+# Wildcard patterns compiled into a trie, rebuilt when the patterns change
+compiled_topics = TopicTrie()
+
+# Encoded message sizes by message type, flushed as embedded metrics
+message_sizes: Dict[str, Dict[str, Any]] = {}
+
+
+class Notification(NamedTuple):
+    """A message and the recipient sources it is delivered to"""
+
+    message: Dict[str, Any]
+    user_id: Optional[str]
+    topics: List[str]
+
+
+class DeliveryPlan(NamedTuple):
+    """Deduplicated recipients of a notification and its encoded frame"""
+
+    resolved: int
+    recipients: List[str]
+    data: bytes
+    kind: str
+
 
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    """Handle EventBridge events and send WebSocket notifications"""
+    """Handle EventBridge events and send WebSocket notifications.
+
+    Events arrive buffered through the notifications SQS queue, one
+    EventBridge event per record. Recipients of every record are resolved
+    first, then the posts of the whole batch run concurrently on the
+    fan-out pool; what one connection receives from several records is
+    coalesced into digest frames, so the SQS batching window doubles as the
+    coalescing window. Records that could not be processed, or whose delivery
+    failed for a reason other than a gone connection, are reported as
+    batch item failures so SQS redelivers only those. A direct EventBridge
+    invocation (no Records) is processed once, the scheduled rule (source
+    aws.events) runs the connection sweeper, {"action": "broadcast"}
+    starts a broadcast to every connection and records of the connections
+    table stream invalidate the registry cache.
+    """
 
     logger.info(f"Lambda started - Event: {json.dumps(event, default=str)}")
 
+    # Scheduled rule: probe and purge dead connections
+    if event.get("source") == "aws.events":
+        counts = sweep_connections(context)
+        return {"statusCode": 200, "body": json.dumps(counts)}
+
+    # Operator broadcast: {"action": "broadcast", "message": {...}}
+    if event.get("action") == "broadcast":
+        sent = broadcast_notification(
+            event["message"], event.get("excludeUserId"), context
+        )
+        flush_message_metrics()
+        return {"statusCode": 200, "body": json.dumps({"sent": sent})}
+
+    records = event.get("Records")
+    if records and records[0].get("eventSource") == "aws:dynamodb":
+        return process_stream_records(records)
+
+    sync_registry()
+
+    if records is not None:
+        response = process_records(records, context)
+        flush_message_metrics()
+        registry.flush_metrics()
+        return response
+
     try:
-        processed_events = 0
-
-        # Process each EventBridge record
-        for record in event.get("Records", []):
-            # EventBridge events come directly, not in Records
-            if "source" in event:
-                process_eventbridge_event(event)
-                processed_events += 1
-            elif "detail" in record:
-                process_eventbridge_event(record)
-                processed_events += 1
-
-        # If direct EventBridge event (not SQS wrapped)
-        if "source" in event:
-            process_eventbridge_event(event)
-            processed_events += 1
-
-        logger.info(f"Successfully processed {processed_events} events")
+        notification = notification_for_event(event)
+        if notification:
+            counts = deliver_event(*notification)
+            logger.info(f"Notification fan-out: {json.dumps(counts)}")
+        flush_message_metrics()
+        registry.flush_metrics()
         return {"statusCode": 200, "body": "Notifications processed"}
 
     except Exception as e:
@@ -52,158 +192,200 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {"statusCode": 500, "body": str(e)}
 
 
-def process_eventbridge_event(event: Dict[str, Any]) -> None:
-    """Process individual EventBridge event"""
+def process_records(records: List[Dict[str, Any]], context: Any) -> Dict[str, Any]:
+    """Deliver the EventBridge events of an SQS batch.
 
-    try:
-        source = event.get("source")
-        detail_type = event.get("detail-type")
-        detail = event.get("detail", {})
+    Records carrying a broadcast job (queued by run_broadcast to resume a
+    broadcast) are run after the batch's notifications were delivered.
+    """
 
-        logger.info(
-            f"Processing EventBridge event - Source: {source}, Type: {detail_type}, Detail: {json.dumps(detail, default=str)}"
-        )
+    failures = set()
+    plans = {}
+    broadcasts = {}
+    seen = set()
 
-        # Route based on event type
-        if source == "property.service":
-            handle_property_event(detail_type, detail)
-        elif source == "geospatial.analysis":
-            handle_analysis_event(detail_type, detail)
-        else:
-            logger.warning(f"Unknown event source: {source}")
+    for record in records:
+        message_id = record["messageId"]
+        try:
+            event = json.loads(record["body"])
 
-    except Exception as e:
-        logger.error(f"Error processing EventBridge event: {str(e)}", exc_info=True)
+            # SQS delivers at least once; the same event can repeat in a batch
+            event_id = event.get("id")
+            if event_id and event_id in seen:
+                logger.info(f"Duplicate event in batch, skipping: {event_id}")
+                continue
+            seen.add(event_id)
 
+            if "broadcast" in event:
+                broadcasts[message_id] = event["broadcast"]
+                continue
 
-def handle_property_event(detail_type: str, detail: Dict[str, Any]) -> None:
-    """Handle property-related events"""
+            notification = notification_for_event(event)
+            if notification:
+                plans[message_id] = plan_delivery(*notification)
 
-    try:
-        property_id = detail.get("propertyId")
-        user_id = detail.get("userId")
-
-        logger.info(
-            f"Handling property event - Type: {detail_type}, PropertyID: {property_id}, UserID: {user_id}"
-        )
-
-        if not property_id or not user_id:
+        except Exception as e:
             logger.error(
-                f"Missing required fields - PropertyID: {property_id}, UserID: {user_id}"
+                f"Error processing message {message_id}: {str(e)}", exc_info=True
             )
-            return
-
-        if detail_type == "Property Created":
-            message = {
-                "type": "property_notification",
-                "event": "created",
-                "propertyId": property_id,
-                "message": f"Nova propriedade criada: {property_id}",
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-                "data": detail,
-            }
+            failures.add(message_id)
 
-        elif detail_type == "Property Updated":
-            message = {
-                "type": "property_notification",
-                "event": "updated",
-                "propertyId": property_id,
-                "message": f"Propriedade atualizada: {property_id}",
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-                "data": detail,
-            }
+    for message_id, counts in zip(plans, deliver(list(plans.values()))):
+        logger.info(f"Fan-out for message {message_id}: {json.dumps(counts)}")
+        if counts["failed"]:
+            failures.add(message_id)
 
-        else:
-            logger.warning(f"Unknown property event type: {detail_type}")
-            return
+    for message_id, job in broadcasts.items():
+        try:
+            run_broadcast(job, context)
+        except Exception as e:
+            logger.error(f"Error running broadcast {message_id}: {e}", exc_info=True)
+            failures.add(message_id)
 
-        # Send to user
-        user_sent = send_notification_to_user(user_id, message)
-        logger.info(f"Sent property notification to {user_sent} user connections")
+    logger.info(f"Processed {len(records)} records, {len(failures)} to be retried")
+    return {
+        "batchItemFailures": [
+            {"itemIdentifier": message_id} for message_id in sorted(failures)
+        ]
+    }
 
-        # Send to property subscribers
-        topic_sent = send_notification_to_topic(f"property.{property_id}", message)
-        logger.info(f"Sent property notification to {topic_sent} topic subscribers")
 
-    except Exception as e:
-        logger.error(f"Error handling property event: {str(e)}", exc_info=True)
+def notification_for_event(event: Dict[str, Any]) -> Optional[Notification]:
+    """Build the notification of an EventBridge event (None if there is none)"""
 
+    source = event.get("source")
+    detail_type = event.get("detail-type")
+    detail = event.get("detail", {})
 
-def handle_analysis_event(detail_type: str, detail: Dict[str, Any]) -> None:
-    """Handle analysis-related events"""
+    logger.info(
+        f"Processing EventBridge event - Source: {source}, Type: {detail_type}, Detail: {json.dumps(detail, default=str)}"
+    )
 
-    try:
-        property_id = detail.get("propertyId")
+    # Route based on event type
+    if source == "property.service":
+        return property_notification(detail_type, detail)
+    if source == "geospatial.analysis":
+        return analysis_notification(detail_type, detail)
 
-        logger.info(
-            f"Handling analysis event - Type: {detail_type}, PropertyID: {property_id}"
+    logger.warning(f"Unknown event source: {source}")
+    return None
+
+
+def property_notification(
+    detail_type: str, detail: Dict[str, Any]
+) -> Optional[Notification]:
+    """Notification for a property-related event"""
+
+    property_id = detail.get("propertyId")
+    user_id = detail.get("userId")
+
+    logger.info(
+        f"Handling property event - Type: {detail_type}, PropertyID: {property_id}, UserID: {user_id}"
+    )
+
+    if not property_id or not user_id:
+        logger.error(
+            f"Missing required fields - PropertyID: {property_id}, UserID: {user_id}"
         )
+        return None
 
-        if not property_id:
-            logger.error(f"Missing propertyId in analysis event: {detail}")
-            return
-
-        if detail_type == "Analysis Completed":
-            message = {
-                "type": "analysis_notification",
-                "event": "completed",
-                "propertyId": property_id,
-                "message": f"Análise geoespacial concluída para propriedade {property_id}",
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-                "data": detail,
-            }
+    if detail_type == "Property Created":
+        message = {
+            "type": "property_notification",
+            "event": "created",
+            "propertyId": property_id,
+            "message": f"Nova propriedade criada: {property_id}",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "dataRef": f"/properties/{property_id}",
+            **payload_data(detail),
+        }
 
-            # Get property owner from detail or query database
-            user_id = detail.get("userId")
-            if user_id:
-                user_sent = send_notification_to_user(user_id, message)
-                logger.info(
-                    f"Sent analysis notification to {user_sent} user connections"
-                )
+    elif detail_type == "Property Updated":
+        message = {
+            "type": "property_notification",
+            "event": "updated",
+            "propertyId": property_id,
+            "message": f"Propriedade atualizada: {property_id}",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "dataRef": f"/properties/{property_id}",
+            **payload_data(detail),
+        }
 
-            # Send to analysis subscribers
-            topic1_sent = send_notification_to_topic("analysis.completed", message)
-            topic2_sent = send_notification_to_topic(
-                f"property.{property_id}.analysis", message
-            )
-            logger.info(
-                f"Sent analysis notification to {topic1_sent + topic2_sent} topic subscribers"
-            )
+    else:
+        logger.warning(f"Unknown property event type: {detail_type}")
+        return None
 
-        else:
-            logger.warning(f"Unknown analysis event type: {detail_type}")
+    # Owner connections and property subscribers, each reached once
+    return Notification(message, user_id, [f"property.{property_id}"])
 
-    except Exception as e:
-        logger.error(f"Error handling analysis event: {str(e)}", exc_info=True)
 
+def analysis_notification(
+    detail_type: str, detail: Dict[str, Any]
+) -> Optional[Notification]:
+    """Notification for an analysis-related event"""
 
-def send_notification_to_user(user_id: str, message: Dict[str, Any]) -> int:
-    """Send notification to all connections of a specific user"""
+    property_id = detail.get("propertyId")
 
-    try:
-        logger.info(f"Sending notification to user: {user_id}")
+    logger.info(
+        f"Handling analysis event - Type: {detail_type}, PropertyID: {property_id}"
+    )
+
+    if not property_id:
+        logger.error(f"Missing propertyId in analysis event: {detail}")
+        return None
+
+    if detail_type == "Analysis Completed":
+        event = "completed"
+        text = f"Análise geoespacial concluída para propriedade {property_id}"
+
+    elif detail_type == "Analysis Failed":
+        event = "failed"
+        text = f"Falha na análise geoespacial da propriedade {property_id}"
+
+    else:
+        logger.warning(f"Unknown analysis event type: {detail_type}")
+        return None
+
+    message = {
+        "type": "analysis_notification",
+        "event": event,
+        "propertyId": property_id,
+        "message": text,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "dataRef": f"/properties/{property_id}/analysis",
+        **payload_data(detail),
+    }
+
+    # Property owner plus analysis subscribers; a connection that is in
+    # several of these sources still gets a single frame
+    return Notification(
+        message,
+        detail.get("userId"),
+        [f"analysis.{event}", f"property.{property_id}.analysis"],
+    )
 
-        # Query connections by user ID
-        response = connections_table.query(
-            IndexName="UserIdIndex",
-            KeyConditionExpression="userId = :user_id",
-            ExpressionAttributeValues={":user_id": user_id},
-        )
 
-        connections = response.get("Items", [])
-        logger.info(f"Found {len(connections)} connections for user {user_id}")
+def payload_data(detail: Dict[str, Any]) -> Dict[str, Any]:
+    """Event detail embedded in a notification under PAYLOAD_PROFILE"""
 
-        successful_sends = 0
+    if PAYLOAD_PROFILE == "id":
+        return {}
+    if PAYLOAD_PROFILE == "full":
+        return {"data": detail}
+    return {"data": {key: detail[key] for key in SUMMARY_FIELDS if key in detail}}
 
-        for connection in connections:
-            connection_id = connection["connectionId"]
-            if send_message_to_connection(connection_id, message):
-                successful_sends += 1
 
+def send_notification_to_user(user_id: str, message: Dict[str, Any]) -> int:
+    """Send notification to all connections of a specific user"""
+
+    try:
+        logger.info(f"Sending notification to user: {user_id}")
+
+        counts = deliver_event(message, user_id=user_id)
         logger.info(
-            f"Successfully sent notification to {successful_sends}/{len(connections)} connections for user {user_id}"
+            f"Successfully sent notification to {counts['delivered']}/{counts['deduped']} connections for user {user_id}"
         )
-        return successful_sends
+        return counts["delivered"]
 
     except Exception as e:
         logger.error(
@@ -218,107 +400,779 @@ def send_notification_to_topic(topic: str, message: Dict[str, Any]) -> int:
     try:
         logger.info(f"Sending notification to topic: {topic}")
 
-        # Scan for connections subscribed to topic
-        scan_response = connections_table.scan(
-            FilterExpression="contains(subscriptions, :topic)",
-            ExpressionAttributeValues={":topic": topic},
+        counts = deliver_event(message, topics=[topic])
+        logger.info(
+            f"Successfully sent notification to {counts['delivered']}/{counts['deduped']} subscribers of topic {topic}"
         )
+        return counts["delivered"]
 
-        connections = scan_response.get("Items", [])
-        logger.info(f"Found {len(connections)} subscribers for topic {topic}")
+    except Exception as e:
+        logger.error(f"Error sending notification to topic {topic}: {e}", exc_info=True)
+        return 0
+
+
+def deliver_event(
+    message: Dict[str, Any],
+    user_id: Optional[str] = None,
+    topics: Optional[List[str]] = None,
+) -> Dict[str, int]:
+    """Deliver one event to every recipient source with a single frame each"""
+
+    return deliver([plan_delivery(message, user_id, topics)])[0]
+
+
+def plan_delivery(
+    message: Dict[str, Any],
+    user_id: Optional[str] = None,
+    topics: Optional[List[str]] = None,
+) -> DeliveryPlan:
+    """Resolve the recipients of a message and encode it once.
+
+    The user's connections, the subscribers of each topic and those of the
+    wildcard patterns matching it (e.g. property.*.analysis) are merged
+    into one ordered, deduplicated connection set. Patterns span every
+    tenant's topics, so their subscribers only receive the message when
+    they are connections of user_id.
+    """
+
+    owned = user_connections(user_id) if user_id else []
+    resolved = list(owned)
+    trie = topic_trie() if topics and owned else None
+    for topic in topics or []:
+        resolved.extend(topic_subscribers(topic))
+        if trie is None:
+            continue
+        for pattern in trie.match(topic):
+            resolved.extend(
+                connection_id
+                for connection_id in topic_subscribers(pattern)
+                if connection_id in owned
+            )
+
+    recipients = list(dict.fromkeys(resolved))
+    return DeliveryPlan(
+        len(resolved), recipients, encode_payload(message), message.get("type")
+    )
+
+
+def deliver(plans: List[DeliveryPlan]) -> List[Dict[str, int]]:
+    """Post the frames of several plans in one concurrent fan-out.
+
+    What a connection receives from several plans is coalesced (see
+    connection_frames). Returns the fan-out counts of each plan: resolved
+    (connection IDs across all sources), deduped (distinct recipients),
+    delivered, gone and failed, where a recipient counts as delivered when
+    the frame carrying the plan's message was sent.
+    """
+
+    connection_plans = {}
+    for index, plan in enumerate(plans):
+        for connection_id in plan.recipients:
+            connection_plans.setdefault(connection_id, []).append(index)
+
+    frames = [
+        (connection_id, data, carried)
+        for connection_id, indices in connection_plans.items()
+        for data, carried in connection_frames(plans, indices)
+    ]
+    outcomes = send_frames([(connection_id, data) for connection_id, data, _ in frames])
+
+    results = [
+        {
+            "resolved": plan.resolved,
+            "deduped": len(plan.recipients),
+            "delivered": 0,
+            "gone": 0,
+            "failed": 0,
+        }
+        for plan in plans
+    ]
+    for (_, _, carried), outcome in zip(frames, outcomes):
+        for index in carried:
+            results[index][OUTCOME_COUNTS[outcome]] += 1
+
+    deliveries = sum(len(plan.recipients) for plan in plans)
+    if len(frames) < deliveries:
+        logger.info(f"Coalesced {deliveries} deliveries into {len(frames)} frames")
+    return results
+
+
+def connection_frames(
+    plans: List[DeliveryPlan], indices: List[int]
+) -> List[Tuple[bytes, List[int]]]:
+    """Frames one connection receives for the given plans, in order.
+
+    Messages of a digest type are merged into size-bounded digest frames
+    (e.g. {"type": "property_batch", "events": [...]}); others are sent as
+    they are. Past MAX_FRAMES_PER_CONNECTION, the remaining frames are
+    replaced by a single overflow notice telling the client to refetch.
+    Each frame comes with the indices of the plans it carries.
+    """
+
+    groups = {}
+    for index in indices:
+        kind = plans[index].kind
+        groups.setdefault(kind if kind in DIGEST_TYPES else index, []).append(index)
+
+    frames = []
+    for key, members in groups.items():
+        if len(members) == 1:
+            frames.append((plans[members[0]].data, members))
+        else:
+            frames.extend(
+                digest_frames(
+                    DIGEST_TYPES[key], [(index, plans[index].data) for index in members]
+                )
+            )
+
+    if len(frames) > MAX_FRAMES_PER_CONNECTION:
+        kept = frames[: max(MAX_FRAMES_PER_CONNECTION - 1, 0)]
+        overflow = [index for _, carried in frames[len(kept) :] for index in carried]
+        notice = {
+            "type": "notifications_overflow",
+            "count": len(overflow),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+        frames = kept + [(encode_message(notice), overflow)]
 
-        successful_sends = 0
+    return frames
 
-        for connection in connections:
-            connection_id = connection["connectionId"]
-            if send_message_to_connection(connection_id, message):
-                successful_sends += 1
 
+def digest_frames(
+    digest_type: str, parts: List[Tuple[int, bytes]]
+) -> List[Tuple[bytes, List[int]]]:
+    """Join encoded messages into digest frames of at most MAX_FRAME_BYTES.
+
+    The messages are already encoded, so a digest is assembled from bytes
+    without serializing them again. A message that fills a frame on its own
+    is sent as it is.
+    """
+
+    header = b'{"type": "%s", "events": [' % digest_type.encode("utf-8")
+    frames = []
+    chunk = []
+
+    def close_chunk():
+        if len(chunk) == 1:
+            frames.append((chunk[0][1], [chunk[0][0]]))
+        else:
+            body = header + b", ".join(data for _, data in chunk) + b"]}"
+            frames.append((body, [index for index, _ in chunk]))
+
+    size = len(header) + 2
+    for index, data in parts:
+        if chunk and size + len(data) + 2 > MAX_FRAME_BYTES:
+            close_chunk()
+            chunk = []
+            size = len(header) + 2
+        chunk.append((index, data))
+        size += len(data) + 2
+
+    close_chunk()
+    return frames
+
+
+def encode_payload(message: Dict[str, Any]) -> bytes:
+    """Encode a notification, replacing an oversized body by its reference.
+
+    When the message encodes larger than MAX_INLINE_BYTES and has a
+    dataRef, its data is left out and the client fetches it from the CRUD
+    API instead. The final size is recorded for the message-size metrics.
+    """
+
+    data = encode_message(message)
+    referenced = (
+        len(data) > MAX_INLINE_BYTES and "data" in message and "dataRef" in message
+    )
+    if referenced:
         logger.info(
-            f"Successfully sent notification to {successful_sends}/{len(connections)} subscribers of topic {topic}"
+            f"Message of {len(data)} bytes sent by reference: {message['dataRef']}"
         )
-        return successful_sends
+        data = encode_message(
+            {key: value for key, value in message.items() if key != "data"}
+        )
+
+    sizes = message_sizes.setdefault(
+        message.get("type", "unknown"), {"MessageBytes": [], "ReferencedBodies": 0}
+    )
+    sizes["MessageBytes"].append(len(data))
+    sizes["ReferencedBodies"] += referenced
+    return data
+
+
+def flush_message_metrics() -> None:
+    """Log the buffered message sizes as CloudWatch embedded metrics.
+
+    One EMF line per message type is printed, so no PutMetricData calls are
+    made.
+    """
+
+    global message_sizes
+    sizes, message_sizes = message_sizes, {}
+
+    for message_type, values in sizes.items():
+        # EMF accepts at most 100 values per metric
+        for start in range(0, len(values["MessageBytes"]), 100):
+            document = {
+                "_aws": {
+                    "Timestamp": int(time.time() * 1000),
+                    "CloudWatchMetrics": [
+                        {
+                            "Namespace": "SistemaRural/Notifications",
+                            "Dimensions": [["MessageType"]],
+                            "Metrics": [
+                                {"Name": "MessageBytes", "Unit": "Bytes"},
+                                {"Name": "ReferencedBodies", "Unit": "Count"},
+                            ],
+                        }
+                    ],
+                },
+                "MessageType": message_type,
+                "MessageBytes": values["MessageBytes"][start : start + 100],
+                "ReferencedBodies": values["ReferencedBodies"] if start == 0 else 0,
+            }
+            # EMF documents must be printed as-is, without a log prefix
+            print(json.dumps(document))
+
+
+def encode_message(message: Dict[str, Any]) -> bytes:
+    """Serialize a message into the frame posted to every recipient"""
+
+    return json.dumps(message, default=str).encode("utf-8")
+
+
+def user_connections(user_id: str) -> List[str]:
+    """Connection IDs of a user, through the registry cache"""
+
+    return registry.get(("user", user_id), lambda: load_user_connections(user_id))
+
 
+def topic_subscribers(topic: str) -> List[str]:
+    """Connection IDs subscribed to a topic, through the registry cache"""
+
+    return registry.get(("topic", topic), lambda: load_topic_subscribers(topic))
+
+
+def topic_trie() -> TopicTrie:
+    """Trie of the wildcard patterns in use, through the registry cache"""
+
+    global compiled_topics
+    patterns = topic_subscribers(TOPIC_PATTERNS)
+    if compiled_topics.patterns != set(patterns):
+        compiled_topics = TopicTrie(patterns)
+    return compiled_topics
+
+
+def load_user_connections(user_id: str) -> List[str]:
+    """Connection IDs of a user from the UserIdIndex, following every page"""
+
+    connection_ids = []
+    query = {
+        "IndexName": "UserIdIndex",
+        "KeyConditionExpression": Key("userId").eq(user_id),
+        "ProjectionExpression": "connectionId",
+    }
+
+    while True:
+        response = connections_table.query(**query)
+        connection_ids.extend(item["connectionId"] for item in response["Items"])
+
+        if "LastEvaluatedKey" not in response:
+            return connection_ids
+        query["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def load_topic_subscribers(topic: str) -> List[str]:
+    """Connection IDs subscribed to a topic, following every Query page"""
+
+    connection_ids = []
+    query = {
+        "KeyConditionExpression": Key("topic").eq(topic),
+        "ProjectionExpression": "connectionId",
+    }
+
+    while True:
+        response = subscriptions_table.query(**query)
+        connection_ids.extend(item["connectionId"] for item in response["Items"])
+
+        if "LastEvaluatedKey" not in response:
+            return connection_ids
+        query["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def registry_keys(connection: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """Registry cache keys a connection item appears under"""
+
+    topics = connection.get("subscriptions", [])
+    keys = [("topic", topic) for topic in topics]
+    if any("*" in topic for topic in topics):
+        # A new pattern subscription may add a pattern to the trie
+        keys.append(("topic", TOPIC_PATTERNS))
+    if connection.get("userId"):
+        keys.append(("user", connection["userId"]))
+    return keys
+
+
+def sync_registry() -> None:
+    """Drop the cached connection sets changed elsewhere since the last sync"""
+
+    if REGISTRY_TTL_SECONDS <= 0:
+        return
+    try:
+        response = subscriptions_table.get_item(Key=REGISTRY_EPOCH_KEY)
+        epoch = int(response.get("Item", {}).get("epoch", 0))
+        changed_keys = None
+        if registry.epoch is not None and epoch != registry.epoch:
+            changed_keys = registry_changes(registry.epoch, epoch)
+        registry.sync(epoch, changed_keys)
     except Exception as e:
-        logger.error(f"Error sending notification to topic {topic}: {e}", exc_info=True)
-        return 0
+        logger.error(f"Error reading registry epoch, dropping cache: {e}")
+        registry.clear()
 
 
-def send_message_to_connection(connection_id: str, message: Dict[str, Any]) -> bool:
-    """Send message to specific WebSocket connection"""
+def registry_log_key(epoch: int) -> Dict[str, str]:
+    """Key of the change log item written with a registry epoch"""
+
+    return {"topic": REGISTRY_EPOCH_KEY["topic"], "connectionId": f"#log#{epoch:012d}"}
+
+
+def registry_changes(after: int, upto: int) -> Optional[Set[Tuple[str, str]]]:
+    """Registry keys logged for the epochs after..upto.
+
+    Returns None when the log cannot account for every epoch in between:
+    the gap is too wide, an entry expired or is not written yet, or a
+    bump changed too many keys to log them.
+    """
 
+    if not 0 < upto - after <= REGISTRY_LOG_WINDOW:
+        return None
+
+    keys = set()
+    entries = 0
+    query = {
+        "KeyConditionExpression": Key("topic").eq(REGISTRY_EPOCH_KEY["topic"])
+        & Key("connectionId").between(
+            registry_log_key(after + 1)["connectionId"],
+            registry_log_key(upto)["connectionId"],
+        ),
+        "ConsistentRead": True,
+    }
+
+    while True:
+        response = subscriptions_table.query(**query)
+        for item in response["Items"]:
+            if "keys" not in item:
+                return None
+            entries += 1
+            keys.update((kind, value) for kind, value in item["keys"])
+
+        if "LastEvaluatedKey" not in response:
+            break
+        query["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    return keys if entries == upto - after else None
+
+
+def process_stream_records(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Invalidate the connection sets changed in the connections table.
+
+    The user and topic keys of the old and new images are dropped from this
+    container's cache, and the registry epoch is bumped once with the keys
+    logged under the new epoch, so the other warm containers drop just
+    those keys on their next sync. Records that change neither userId nor
+    subscriptions are ignored.
+    """
+
+    deserializer = TypeDeserializer()
+    keys = set()
+
+    for record in records:
+        images = [
+            {
+                name: deserializer.deserialize(value)
+                for name, value in record["dynamodb"].get(image, {}).items()
+                if name in ("userId", "subscriptions")
+            }
+            for image in ("OldImage", "NewImage")
+        ]
+        if images[0] != images[1]:
+            for image in images:
+                keys.update(registry_keys(image))
+
+    if not keys:
+        return {"batchItemFailures": []}
+
+    dropped = registry.invalidate(keys)
+    response = subscriptions_table.update_item(
+        Key=REGISTRY_EPOCH_KEY,
+        UpdateExpression="ADD epoch :one",
+        ExpressionAttributeValues={":one": 1},
+        ReturnValues="UPDATED_NEW",
+    )
+    entry = {
+        **registry_log_key(int(response["Attributes"]["epoch"])),
+        "ttl": int(time.time()) + REGISTRY_LOG_TTL,
+    }
+    if len(keys) <= REGISTRY_LOG_MAX_KEYS:
+        # Without "keys" the readers drop their whole cache
+        entry["keys"] = [list(key) for key in sorted(keys)]
+    subscriptions_table.put_item(Item=entry)
+
+    logger.info(
+        f"Registry invalidated: {len(keys)} keys from {len(records)} stream records, {dropped} cached"
+    )
+    return {"batchItemFailures": []}
+
+
+def remove_connections(connection_ids: List[str]) -> None:
+    """Delete connections and their entries in the topic index.
+
+    The subscriptions of the connections are read with BatchGetItem, then
+    connections and index entries are deleted with BatchWriteItem
+    (batch_writer sends 25 deletes per request and resends unprocessed ones).
+    """
+
+    subscriptions = connection_subscriptions(connection_ids)
+    registry.invalidate(
+        key for item in subscriptions.values() for key in registry_keys(item)
+    )
+
+    with connections_table.batch_writer() as batch:
+        for connection_id in connection_ids:
+            batch.delete_item(Key={"connectionId": connection_id})
+
+    with subscriptions_table.batch_writer() as batch:
+        for connection_id, item in subscriptions.items():
+            for topic in item.get("subscriptions", []):
+                batch.delete_item(Key={"topic": topic, "connectionId": connection_id})
+
+    for item in subscriptions.values():
+        for topic in item.get("subscriptions", []):
+            if "*" in topic:
+                remove_pattern_subscriber(topic)
+
+
+def remove_pattern_subscriber(pattern: str) -> None:
+    """Uncount a connection from a wildcard pattern, deleting the pattern
+    item when none is left. Call after deleting the connection's index entry.
+    """
+
+    key = {"topic": TOPIC_PATTERNS, "connectionId": pattern}
     try:
-        # Initialize API Gateway Management API client with endpoint
-        endpoint_url = WEBSOCKET_ENDPOINT.replace("wss://", "https://")
-        apigateway_client = boto3.client(
-            "apigatewaymanagementapi", endpoint_url=endpoint_url
+        response = subscriptions_table.update_item(
+            Key=key,
+            UpdateExpression="ADD subscribers :minus",
+            ConditionExpression="attribute_exists(connectionId)",
+            ExpressionAttributeValues={":minus": -1},
+            ReturnValues="UPDATED_NEW",
         )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return
+    if response["Attributes"]["subscribers"] > 0:
+        return
+
+    # Count reached zero: check the pattern's own index entries, which also
+    # covers items written before the count and concurrent subscribes
+    remaining = pattern_subscribers(pattern)
+    try:
+        if remaining:
+            subscriptions_table.update_item(
+                Key=key,
+                UpdateExpression="SET subscribers = :count",
+                ConditionExpression="subscribers <= :zero",
+                ExpressionAttributeValues={":count": remaining, ":zero": 0},
+            )
+        else:
+            subscriptions_table.delete_item(
+                Key=key,
+                ConditionExpression="subscribers <= :zero",
+                ExpressionAttributeValues={":zero": 0},
+            )
+    except ClientError as e:
+        # Another connection subscribed in the meantime
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+
+
+def pattern_subscribers(pattern: str) -> int:
+    """Connections in a pattern's index entries, following every Query page"""
+
+    count = 0
+    query = {"KeyConditionExpression": Key("topic").eq(pattern), "Select": "COUNT"}
+    while True:
+        response = subscriptions_table.query(**query)
+        count += response["Count"]
+        if "LastEvaluatedKey" not in response:
+            return count
+        query["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def connection_subscriptions(
+    connection_ids: List[str],
+) -> Dict[str, Dict[str, Any]]:
+    """userId and subscriptions of each connection, 100 keys per BatchGetItem"""
+
+    subscriptions = {}
+    for start in range(0, len(connection_ids), 100):
+        request = {
+            CONNECTIONS_TABLE: {
+                "Keys": [
+                    {"connectionId": connection_id}
+                    for connection_id in connection_ids[start : start + 100]
+                ],
+                "ProjectionExpression": "connectionId, userId, subscriptions",
+            }
+        }
+
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response["Responses"].get(CONNECTIONS_TABLE, []):
+                subscriptions[item["connectionId"]] = item
+            request = response.get("UnprocessedKeys")
+
+    return subscriptions
+
 
-        # Send message
-        apigateway_client.post_to_connection(
-            ConnectionId=connection_id, Data=json.dumps(message)
+def management_client(endpoint_url: str) -> Any:
+    """Cached apigatewaymanagementapi client for an endpoint"""
+
+    client = management_clients.get(endpoint_url)
+    if client is None:
+        client = boto3.client(
+            "apigatewaymanagementapi",
+            endpoint_url=endpoint_url,
+            config=Config(
+                max_pool_connections=FANOUT_WORKERS,
+                retries={"max_attempts": 2, "mode": "standard"},
+            ),
         )
+        management_clients[endpoint_url] = client
+    return client
+
 
+def post_to_connection(client: Any, connection_id: str, data: bytes) -> str:
+    """Post one frame to a connection and return its outcome (never raises)"""
+
+    try:
+        client.post_to_connection(ConnectionId=connection_id, Data=data)
         logger.debug(f"Message sent successfully to connection {connection_id}")
-        return True
+        return SENT
 
     except ClientError as e:
-        error_code = e.response["Error"]["Code"]
-
-        if error_code == "GoneException":
-            # Connection is stale, remove from DynamoDB
-            logger.warning(f"Stale connection detected and removing: {connection_id}")
-            try:
-                connections_table.delete_item(Key={"connectionId": connection_id})
-                logger.info(f"Successfully removed stale connection: {connection_id}")
-            except Exception as cleanup_error:
-                logger.error(
-                    f"Error removing stale connection {connection_id}: {cleanup_error}"
-                )
-        else:
-            logger.error(f"ClientError sending to connection {connection_id}: {e}")
-
-        return False
+        if e.response["Error"]["Code"] == "GoneException":
+            return GONE
+        logger.error(f"ClientError sending to connection {connection_id}: {e}")
+        return FAILED
 
     except Exception as e:
         logger.error(
             f"Unexpected error sending to connection {connection_id}: {e}",
             exc_info=True,
         )
-        return False
+        return FAILED
+
+
+def fan_out(connection_ids: List[str], data: bytes) -> Dict[str, str]:
+    """Send an encoded frame to many connections concurrently.
+
+    Returns the outcome (SENT, GONE or FAILED) of each connection.
+    """
+
+    frames = [(connection_id, data) for connection_id in connection_ids]
+    return dict(zip(connection_ids, send_frames(frames)))
+
+
+def send_frames(frames: List[Tuple[str, bytes]]) -> List[str]:
+    """Post (connection ID, frame) pairs concurrently.
+
+    Posts run on the bounded fan-out pool and share one pooled client;
+    stale (Gone) connections are collected and removed together afterwards
+    on the calling thread, since boto3 resources are not thread-safe.
+    Returns the outcome of each frame, in order.
+    """
+
+    if not frames:
+        return []
+
+    client = management_client(WEBSOCKET_ENDPOINT.replace("wss://", "https://"))
+
+    if len(frames) == 1:
+        outcomes = [post_to_connection(client, *frames[0])]
+    else:
+        outcomes = list(
+            fanout_pool.map(lambda frame: post_to_connection(client, *frame), frames)
+        )
+
+    # A connection can receive several frames in one batch; clean it up once
+    gone = dict.fromkeys(
+        connection_id
+        for (connection_id, _), outcome in zip(frames, outcomes)
+        if outcome == GONE
+    )
+    remove_stale_connections(list(gone))
+
+    return outcomes
+
 
+def remove_stale_connections(connection_ids: List[str]) -> None:
+    """Remove connections API Gateway reported as gone"""
 
-def broadcast_notification(message: Dict[str, Any], exclude_user_id: str = None) -> int:
-    """Broadcast notification to all connected users"""
+    if not connection_ids:
+        return
 
+    logger.warning(
+        f"Stale connections detected and removing: {', '.join(connection_ids)}"
+    )
     try:
-        logger.info(f"Broadcasting notification (excluding user: {exclude_user_id})")
+        remove_connections(connection_ids)
+        logger.info(f"Successfully removed {len(connection_ids)} stale connections")
+    except Exception as cleanup_error:
+        logger.error(f"Error removing stale connections: {cleanup_error}")
 
-        # Get all connections
-        scan_response = connections_table.scan()
-        connections = scan_response.get("Items", [])
 
-        logger.info(f"Found {len(connections)} total connections for broadcast")
+def probe_connection(client: Any, connection_id: str) -> bool:
+    """Whether API Gateway still knows a connection (errors count as alive)"""
 
-        successful_sends = 0
+    try:
+        client.get_connection(ConnectionId=connection_id)
+        return True
 
-        for connection in connections:
-            # Skip excluded user if specified
-            if exclude_user_id and connection.get("userId") == exclude_user_id:
-                continue
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "GoneException":
+            return False
+        logger.error(f"ClientError probing connection {connection_id}: {e}")
+        return True
+
+
+def sweep_connections(context: Any) -> Dict[str, int]:
+    """Probe every connection and purge the dead ones ahead of their TTL.
+
+    Connections are scanned page by page and probed concurrently on the
+    fan-out pool with GetConnection; the gone ones of each page are removed
+    in batches. The sweep stops when fewer than SWEEP_MARGIN_MS remain in
+    the invocation and the next scheduled run starts over.
+    """
+
+    client = management_client(WEBSOCKET_ENDPOINT.replace("wss://", "https://"))
+    counts = {"probed": 0, "removed": 0}
+    scan = {"ProjectionExpression": "connectionId"}
+
+    while True:
+        response = connections_table.scan(**scan)
+        connection_ids = [item["connectionId"] for item in response["Items"]]
+
+        alive = fanout_pool.map(
+            lambda connection_id: probe_connection(client, connection_id),
+            connection_ids,
+        )
+        gone = [
+            connection_id
+            for connection_id, is_alive in zip(connection_ids, alive)
+            if not is_alive
+        ]
+        remove_stale_connections(gone)
+
+        counts["probed"] += len(connection_ids)
+        counts["removed"] += len(gone)
 
-            connection_id = connection["connectionId"]
-            if send_message_to_connection(connection_id, message):
-                successful_sends += 1
+        if "LastEvaluatedKey" not in response:
+            break
+        if context and context.get_remaining_time_in_millis() < SWEEP_MARGIN_MS:
+            logger.warning(f"Connection sweep stopped early: {json.dumps(counts)}")
+            break
+        scan["ExclusiveStartKey"] = response["LastEvaluatedKey"]
 
-        logger.info(f"Broadcast completed - sent to {successful_sends} connections")
-        return successful_sends
+    logger.info(f"Connection sweep: {json.dumps(counts)}")
+    return counts
+
+
+def send_message_to_connection(connection_id: str, message: Dict[str, Any]) -> bool:
+    """Send message to specific WebSocket connection"""
+
+    outcomes = fan_out([connection_id], encode_message(message))
+    return outcomes[connection_id] == SENT
+
+
+def broadcast_notification(
+    message: Dict[str, Any], exclude_user_id: str = None, context: Any = None
+) -> int:
+    """Broadcast notification to all connected users.
+
+    Returns the connections reached in this invocation; the rest of a
+    broadcast that runs out of time is delivered by the next one.
+    """
+
+    try:
+        logger.info(f"Broadcasting notification (excluding user: {exclude_user_id})")
+
+        job = {
+            "broadcastId": str(uuid.uuid4()),
+            "message": message,
+            "excludeUserId": exclude_user_id,
+        }
+        checkpoint = run_broadcast(job, context)
+        return checkpoint["outcomes"].get(SENT, 0)
 
     except Exception as e:
         logger.error(f"Error broadcasting notification: {e}", exc_info=True)
         return 0
 
 
+def run_broadcast(job: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Run a broadcast job, or resume it from its checkpoint.
+
+    The engine scans the connections table in parallel segments and posts
+    each page on the fan-out pool. When the invocation runs short of time,
+    the job and its checkpoint are queued on the notifications queue so the
+    next invocation carries on where this one stopped.
+    """
+
+    data = encode_payload(job["message"])
+
+    def should_stop() -> bool:
+        return (
+            context is not None
+            and context.get_remaining_time_in_millis() < BROADCAST_MARGIN_MS
+        )
+
+    checkpoint = broadcast_engine.run(
+        lambda connection_ids: send_frames(
+            [(connection_id, data) for connection_id in connection_ids]
+        ),
+        job.get("checkpoint"),
+        exclude_user_id=job.get("excludeUserId"),
+        should_stop=should_stop,
+    )
+    broadcast_engine.log_metrics(checkpoint)
+    logger.info(
+        f"Broadcast {job['broadcastId']}: {json.dumps(checkpoint['outcomes'])}, "
+        f"last run {json.dumps(checkpoint['lastRun'])}"
+    )
+
+    if checkpoint["complete"]:
+        logger.info(
+            f"Broadcast {job['broadcastId']} completed in {checkpoint['seconds']}s"
+        )
+    elif checkpoint["errors"] >= BROADCAST_MAX_ERRORS:
+        logger.error(
+            f"Broadcast {job['broadcastId']} abandoned after {checkpoint['errors']} failed scans"
+        )
+    elif not NOTIFICATIONS_QUEUE_URL:
+        logger.error(
+            f"Broadcast {job['broadcastId']} incomplete and no queue to resume it"
+        )
+    else:
+        sqs.send_message(
+            QueueUrl=NOTIFICATIONS_QUEUE_URL,
+            MessageBody=json.dumps({"broadcast": {**job, "checkpoint": checkpoint}}),
+        )
+        logger.info(f"Broadcast {job['broadcastId']} queued to resume")
+
+    return checkpoint
+
+
 def send_admin_notification(admin_message: str, priority: str = "normal") -> int:
     """Send administrative notifications"""
 
@@ -0,0 +1,142 @@
+import json
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+class RegistryCache:
+    """In-process cache of connection sets, kept across warm invocations.
+
+    Entries map a registry key (("user", userId) or ("topic", topic)) to
+    the connection IDs found there and expire after ``ttl`` seconds. Keys
+    are invalidated precisely by the stream consumer of the connections
+    table in the container that receives the stream records; every other
+    container learns of them through the registry epoch and the keys logged
+    with it (see sync), and drops all its entries only when those keys are
+    unknown, so the TTL only bounds staleness when both are missed.
+    """
+
+    NAMESPACE = "SistemaRural/Notifications"
+
+    def __init__(
+        self,
+        ttl: float,
+        max_entries: int = 10000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.entries: Dict[Hashable, Tuple[float, List[str]]] = {}
+        self.epoch: Optional[Any] = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "invalidated": 0,
+            "epochResets": 0,
+        }
+        self.ages: List[float] = []
+
+    def get(self, key: Hashable, loader: Callable[[], List[str]]) -> List[str]:
+        """Cached connection IDs of key, loading them on a miss"""
+        now = self.clock()
+        entry = self.entries.get(key)
+
+        if entry and now - entry[0] < self.ttl:
+            self.stats["hits"] += 1
+            self.ages.append(now - entry[0])
+            return list(entry[1])
+
+        self.stats["misses"] += 1
+        if entry:
+            self.stats["expired"] += 1
+            del self.entries[key]
+
+        value = loader()
+        if self.ttl > 0:
+            self.entries[key] = (now, list(value))
+            while len(self.entries) > self.max_entries:
+                # Insertion order: the oldest load goes first
+                del self.entries[next(iter(self.entries))]
+        return value
+
+    def invalidate(self, keys: Iterable[Hashable]) -> int:
+        """Drop the given keys; returns how many were cached"""
+        dropped = 0
+        for key in keys:
+            if self.entries.pop(key, None) is not None:
+                dropped += 1
+        self.stats["invalidated"] += dropped
+        return dropped
+
+    def clear(self):
+        self.stats["invalidated"] += len(self.entries)
+        self.entries.clear()
+
+    def sync(
+        self, epoch: Any, changed_keys: Optional[Iterable[Hashable]] = None
+    ) -> bool:
+        """Catch up with the registry epoch; returns whether it moved.
+
+        changed_keys are the keys changed since the last synced epoch; when
+        the epoch moved and they are unknown (None), every entry is dropped.
+        """
+        changed = self.epoch is not None and epoch != self.epoch
+        if changed and changed_keys is not None:
+            self.invalidate(changed_keys)
+        elif changed:
+            self.stats["epochResets"] += 1
+            self.clear()
+        self.epoch = epoch
+        return changed
+
+    def flush_metrics(self) -> Optional[Dict[str, Any]]:
+        """Log hit rate and served entry ages as CloudWatch embedded metrics.
+
+        EntryAge (seconds since the served entry was loaded) is how stale a
+        hit could be at most. Returns None when the cache was not used.
+        """
+        lookups = self.stats["hits"] + self.stats["misses"]
+        if not lookups:
+            self.reset_stats()
+            return None
+
+        document = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": self.NAMESPACE,
+                        "Dimensions": [[]],
+                        "Metrics": [
+                            {"Name": "RegistryHits", "Unit": "Count"},
+                            {"Name": "RegistryMisses", "Unit": "Count"},
+                            {"Name": "RegistryHitRate", "Unit": "Percent"},
+                            {"Name": "RegistryInvalidations", "Unit": "Count"},
+                            {"Name": "RegistryEntryAge", "Unit": "Seconds"},
+                        ],
+                    }
+                ],
+            },
+            "RegistryHits": self.stats["hits"],
+            "RegistryMisses": self.stats["misses"],
+            "RegistryHitRate": round(100.0 * self.stats["hits"] / lookups, 1),
+            "RegistryInvalidations": self.stats["invalidated"],
+            # EMF accepts at most 100 values per metric
+            "RegistryEntryAge": [round(age, 3) for age in self.ages[-100:]],
+            "RegistryEntries": len(self.entries),
+            "RegistryEpochResets": self.stats["epochResets"],
+        }
+        if not self.ages:
+            # Only misses: there is no served age to report
+            metrics = document["_aws"]["CloudWatchMetrics"][0]["Metrics"]
+            metrics.remove({"Name": "RegistryEntryAge", "Unit": "Seconds"})
+            del document["RegistryEntryAge"]
+
+        # EMF documents must be printed as-is, without a log prefix
+        print(json.dumps(document))
+        self.reset_stats()
+        return document
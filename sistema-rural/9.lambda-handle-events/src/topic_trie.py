@@ -0,0 +1,42 @@
+from typing import Dict, Iterable, List
+
+
+class TopicTrie:
+    """Wildcard topic patterns compiled into a trie of dot-separated segments.
+
+    A ``*`` segment matches exactly one segment of a topic, so
+    ``property.*.analysis`` matches ``property.p1.analysis`` but neither
+    ``property.p1`` nor ``property.p1.analysis.ndvi``. Matching a topic
+    walks at most two branches per segment (the literal one and ``*``),
+    independently of how many patterns are registered.
+    """
+
+    WILDCARD = "*"
+
+    def __init__(self, patterns: Iterable[str] = ()):
+        self.root: Dict[str, dict] = {}
+        self.patterns = set()
+        for pattern in patterns:
+            self.insert(pattern)
+
+    def insert(self, pattern: str) -> None:
+        node = self.root
+        for segment in pattern.split("."):
+            node = node.setdefault(segment, {})
+        # Segments never contain "", so it marks the end of a pattern
+        node[""] = pattern
+        self.patterns.add(pattern)
+
+    def match(self, topic: str) -> List[str]:
+        """Patterns matching a concrete topic"""
+        nodes = [self.root]
+        for segment in topic.split("."):
+            nodes = [
+                child
+                for node in nodes
+                for child in (node.get(segment), node.get(self.WILDCARD))
+                if child is not None
+            ]
+            if not nodes:
+                return []
+        return [node[""] for node in nodes if "" in node]
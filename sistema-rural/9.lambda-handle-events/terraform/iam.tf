@@ -34,14 +34,17 @@ resource "aws_iam_role_policy" "lambda_events_policy" {
         Action = [
           "dynamodb:Scan",
           "dynamodb:Query",
+          "dynamodb:BatchGetItem",
           "dynamodb:DeleteItem",
           "dynamodb:GetItem",
           "dynamodb:PutItem",
-          "dynamodb:UpdateItem"
+          "dynamodb:UpdateItem",
+          "dynamodb:BatchWriteItem"
         ]
         Resource = [
           data.terraform_remote_state.infrastructure.outputs.websocket_connections_table_arn,
-          "${data.terraform_remote_state.infrastructure.outputs.websocket_connections_table_arn}/index/*"
+          "${data.terraform_remote_state.infrastructure.outputs.websocket_connections_table_arn}/index/*",
+          data.terraform_remote_state.infrastructure.outputs.websocket_subscriptions_table_arn
         ]
       },
       {
@@ -54,6 +57,30 @@ resource "aws_iam_role_policy" "lambda_events_policy" {
           "${data.terraform_remote_state.websocket_infra.outputs.websocket_execution_arn}/*/*"
         ]
       },
+      {
+        Effect = "Allow"
+        Action = [
+          "dynamodb:DescribeStream",
+          "dynamodb:GetRecords",
+          "dynamodb:GetShardIterator",
+          "dynamodb:ListStreams"
+        ]
+        Resource = [
+          data.terraform_remote_state.infrastructure.outputs.websocket_connections_stream_arn
+        ]
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "sqs:ReceiveMessage",
+          "sqs:DeleteMessage",
+          "sqs:SendMessage",
+          "sqs:GetQueueAttributes"
+        ]
+        Resource = [
+          aws_sqs_queue.notifications.arn
+        ]
+      },
       {
         Effect = "Allow"
         Action = [
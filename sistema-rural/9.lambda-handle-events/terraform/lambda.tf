@@ -13,9 +13,18 @@ module "lambda_events_handler" {
   lambda_role = aws_iam_role.lambda_events_role.arn
 
   environment_variables = {
-    WEBSOCKET_TABLE        = data.terraform_remote_state.infrastructure.outputs.websocket_connections_table_name
-    WEBSOCKET_API_ENDPOINT = data.terraform_remote_state.websocket_infra.outputs.websocket_stage_url
-    ENVIRONMENT            = var.environment
+    WEBSOCKET_TABLE           = data.terraform_remote_state.infrastructure.outputs.websocket_connections_table_name
+    SUBSCRIPTIONS_TABLE       = data.terraform_remote_state.infrastructure.outputs.websocket_subscriptions_table_name
+    WEBSOCKET_API_ENDPOINT    = data.terraform_remote_state.websocket_infra.outputs.websocket_stage_url
+    FANOUT_WORKERS            = var.fanout_workers
+    MAX_FRAME_BYTES           = var.max_frame_bytes
+    MAX_FRAMES_PER_CONNECTION = var.max_frames_per_connection
+    PAYLOAD_PROFILE           = var.payload_profile
+    MAX_INLINE_BYTES          = var.max_inline_bytes
+    BROADCAST_SEGMENTS        = var.broadcast_segments
+    NOTIFICATIONS_QUEUE_URL   = aws_sqs_queue.notifications.id
+    REGISTRY_TTL_SECONDS      = var.registry_ttl_seconds
+    ENVIRONMENT               = var.environment
   }
 
   tags = var.default_tags
@@ -57,40 +66,84 @@ resource "aws_cloudwatch_event_rule" "analysis_events_to_lambda" {
 # TARGETS PARA AS RULES
 # ===================================
 
-# Target para eventos de propriedades
+# Os eventos passam pela fila de notificações em vez de invocar a Lambda
 resource "aws_cloudwatch_event_target" "property_events_lambda_target" {
   rule           = aws_cloudwatch_event_rule.property_events_to_lambda.name
   event_bus_name = data.terraform_remote_state.analysis_infra.outputs.property_analysis_bus_name
-  target_id      = "PropertyEventsLambdaTarget"
-  arn            = module.lambda_events_handler.lambda_function_arn
+  target_id      = "PropertyEventsSQSTarget"
+  arn            = aws_sqs_queue.notifications.arn
 }
 
-# Target para eventos de análise
 resource "aws_cloudwatch_event_target" "analysis_events_lambda_target" {
   rule           = aws_cloudwatch_event_rule.analysis_events_to_lambda.name
   event_bus_name = data.terraform_remote_state.analysis_infra.outputs.property_analysis_bus_name
-  target_id      = "AnalysisEventsLambdaTarget"
-  arn            = module.lambda_events_handler.lambda_function_arn
+  target_id      = "AnalysisEventsSQSTarget"
+  arn            = aws_sqs_queue.notifications.arn
 }
 
 # ===================================
-# LAMBDA PERMISSIONS
+# SQS EVENT SOURCE MAPPING
 # ===================================
 
-# Permission para EventBridge invocar a Lambda - Property Events
-resource "aws_lambda_permission" "allow_eventbridge_property" {
-  statement_id  = "AllowExecutionFromEventBridgeProperty"
-  action        = "lambda:InvokeFunction"
-  function_name = module.lambda_events_handler.lambda_function_name
-  principal     = "events.amazonaws.com"
-  source_arn    = aws_cloudwatch_event_rule.property_events_to_lambda.arn
+# A janela de agrupamento é também a janela de coalescência: eventos do mesmo
+# tipo que chegam nela viram um único frame por conexão. A concorrência
+# máxima limita quantas invocações a fila pode ocupar
+resource "aws_lambda_event_source_mapping" "notifications_trigger" {
+  event_source_arn = aws_sqs_queue.notifications.arn
+  function_name    = module.lambda_events_handler.lambda_function_arn
+  batch_size       = var.notification_batch_size
+
+  maximum_batching_window_in_seconds = var.coalescing_window_seconds
+  function_response_types            = ["ReportBatchItemFailures"]
+
+  scaling_config {
+    maximum_concurrency = var.notification_concurrency
+  }
+
+  depends_on = [module.lambda_events_handler]
+}
+
+# ===================================
+# VARREDURA DE CONEXÕES MORTAS
+# ===================================
+
+# Testa as conexões com GetConnection e remove as mortas antes do TTL de 24 h
+resource "aws_cloudwatch_event_rule" "connection_sweeper" {
+  name                = "${var.project_name}-connection-sweeper"
+  description         = "Probe WebSocket connections and purge the dead ones"
+  schedule_expression = var.connection_sweep_schedule
+
+  tags = var.default_tags
+}
+
+resource "aws_cloudwatch_event_target" "connection_sweeper_lambda_target" {
+  rule      = aws_cloudwatch_event_rule.connection_sweeper.name
+  target_id = "ConnectionSweeperLambdaTarget"
+  arn       = module.lambda_events_handler.lambda_function_arn
 }
 
-# Permission para EventBridge invocar a Lambda - Analysis Events
-resource "aws_lambda_permission" "allow_eventbridge_analysis" {
-  statement_id  = "AllowExecutionFromEventBridgeAnalysis"
+resource "aws_lambda_permission" "allow_eventbridge_sweeper" {
+  statement_id  = "AllowExecutionFromEventBridgeSweeper"
   action        = "lambda:InvokeFunction"
   function_name = module.lambda_events_handler.lambda_function_name
   principal     = "events.amazonaws.com"
-  source_arn    = aws_cloudwatch_event_rule.analysis_events_to_lambda.arn
-}
\ No newline at end of file
+  source_arn    = aws_cloudwatch_event_rule.connection_sweeper.arn
+}
+
+# ===================================
+# STREAM DA TABELA DE CONEXÕES
+# ===================================
+
+# Invalida o cache de conexões (userId/tópico -> conexões) mantido pelas
+# invocações quentes
+resource "aws_lambda_event_source_mapping" "connections_stream_trigger" {
+  event_source_arn  = data.terraform_remote_state.infrastructure.outputs.websocket_connections_stream_arn
+  function_name     = module.lambda_events_handler.lambda_function_arn
+  starting_position = "LATEST"
+  batch_size        = 100
+
+  maximum_batching_window_in_seconds = 1
+  maximum_retry_attempts             = 3
+
+  depends_on = [module.lambda_events_handler]
+}
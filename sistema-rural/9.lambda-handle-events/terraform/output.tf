@@ -12,3 +12,18 @@ output "lambda_invoke_arn" {
   description = "Invoke ARN da função Lambda"
   value       = module.lambda_events_handler.lambda_function_invoke_arn
 }
+
+output "notifications_queue_url" {
+  description = "URL da fila SQS de notificações"
+  value       = aws_sqs_queue.notifications.id
+}
+
+output "notifications_queue_arn" {
+  description = "ARN da fila SQS de notificações"
+  value       = aws_sqs_queue.notifications.arn
+}
+
+output "notifications_dlq_arn" {
+  description = "ARN da DLQ de notificações"
+  value       = aws_sqs_queue.notifications_dlq.arn
+}
@@ -0,0 +1,92 @@
+# ===================================
+# SQS DEAD LETTER QUEUE
+# ===================================
+
+resource "aws_sqs_queue" "notifications_dlq" {
+  name = "${var.project_name}-notifications-dlq"
+
+  message_retention_seconds = 1209600 # 14 days
+
+  tags = {
+    Name = "${var.project_name}-notifications-dlq"
+    Type = "dead-letter-queue"
+  }
+}
+
+# ===================================
+# SQS NOTIFICATIONS BUFFER
+# ===================================
+
+# Property and analysis events are buffered here so import bursts queue up
+# instead of throttling the function
+resource "aws_sqs_queue" "notifications" {
+  name                       = "${var.project_name}-notifications"
+  message_retention_seconds  = 86400 # 1 day, older notifications are moot
+  receive_wait_time_seconds  = 10    # Long polling
+  visibility_timeout_seconds = 360   # 6x the lambda timeout
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.notifications_dlq.arn
+    maxReceiveCount     = 3
+  })
+
+  tags = {
+    Name = "${var.project_name}-notifications"
+    Type = "buffer-queue"
+  }
+}
+
+# ===================================
+# SQS QUEUE POLICIES
+# ===================================
+
+resource "aws_sqs_queue_policy" "notifications" {
+  queue_url = aws_sqs_queue.notifications.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Sid    = "AllowEventBridgeToSendMessage"
+        Effect = "Allow"
+        Principal = {
+          Service = "events.amazonaws.com"
+        }
+        Action   = "sqs:SendMessage"
+        Resource = aws_sqs_queue.notifications.arn
+        Condition = {
+          ArnEquals = {
+            "aws:SourceArn" = [
+              aws_cloudwatch_event_rule.property_events_to_lambda.arn,
+              aws_cloudwatch_event_rule.analysis_events_to_lambda.arn
+            ]
+          }
+        }
+      }
+    ]
+  })
+}
+
+resource "aws_sqs_queue_policy" "notifications_dlq" {
+  queue_url = aws_sqs_queue.notifications_dlq.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Sid    = "AllowSQSToSendToDLQ"
+        Effect = "Allow"
+        Principal = {
+          Service = "sqs.amazonaws.com"
+        }
+        Action   = "sqs:SendMessage"
+        Resource = aws_sqs_queue.notifications_dlq.arn
+        Condition = {
+          ArnEquals = {
+            "aws:SourceArn" = aws_sqs_queue.notifications.arn
+          }
+        }
+      }
+    ]
+  })
+}
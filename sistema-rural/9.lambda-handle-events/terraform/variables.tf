@@ -16,6 +16,72 @@ variable "aws_region" {
   default     = "us-east-1"
 }
 
+variable "fanout_workers" {
+  description = "Envios simultâneos por notificação (e tamanho do pool HTTP)"
+  type        = number
+  default     = 32
+}
+
+variable "notification_batch_size" {
+  description = "Eventos da fila de notificações por invocação"
+  type        = number
+  default     = 100
+}
+
+variable "coalescing_window_seconds" {
+  description = "Janela de agrupamento da fila, em que eventos viram frames de resumo"
+  type        = number
+  default     = 2
+}
+
+variable "max_frame_bytes" {
+  description = "Tamanho máximo de um frame de resumo (limite do API Gateway: 128 KB)"
+  type        = number
+  default     = 65536
+}
+
+variable "max_frames_per_connection" {
+  description = "Frames por conexão em cada lote, incluindo o aviso de excesso"
+  type        = number
+  default     = 5
+}
+
+variable "notification_concurrency" {
+  description = "Invocações simultâneas máximas consumindo a fila de notificações"
+  type        = number
+  default     = 5
+}
+
+variable "payload_profile" {
+  description = "Detalhe do evento incluído nas notificações: id, summary ou full"
+  type        = string
+  default     = "summary"
+}
+
+variable "max_inline_bytes" {
+  description = "Acima deste tamanho a notificação leva só a referência (dataRef) aos dados"
+  type        = number
+  default     = 32768
+}
+
+variable "connection_sweep_schedule" {
+  description = "Agenda da varredura de conexões WebSocket mortas"
+  type        = string
+  default     = "rate(1 hour)"
+}
+
+variable "broadcast_segments" {
+  description = "Segmentos de scan paralelo usados em cada broadcast"
+  type        = number
+  default     = 4
+}
+
+variable "registry_ttl_seconds" {
+  description = "Segundos em que o cache de conexões por usuário/tópico é servido (0 desativa)"
+  type        = number
+  default     = 30
+}
+
 variable "default_tags" {
   description = "Tags padrão"
   type        = map(string)
@@ -203,6 +203,7 @@ class Dashboard {
             'pending': '<span class="analysis-badge pending">⏳ Análise pendente</span>',
             'processing': '<span class="analysis-badge processing">🔄 Processando</span>',
             'completed': '<span class="analysis-badge completed">✅ Análise concluída</span>',
+            'failed': '<span class="analysis-badge error">❌ Erro na análise</span>',
             'error': '<span class="analysis-badge error">❌ Erro na análise</span>'
         };
         return badges[status] || '';
@@ -251,6 +252,7 @@ class Dashboard {
                                     <span>Máxima: ${analysis.analysisResults.elevation.max_elevation}m</span>
                                     <span>Mínima: ${analysis.analysisResults.elevation.min_elevation}m</span>
                                 </div>
+                                ${this.renderDistribution(analysis.analysisResults.elevation, 'm')}
                             </div>
                         ` : ''}
                         
@@ -262,6 +264,10 @@ class Dashboard {
                                     <span>Cobertura: ${analysis.analysisResults.ndvi.vegetation_coverage}%</span>
                                     <span>Classificação: ${analysis.analysisResults.ndvi.classification}</span>
                                 </div>
+                                ${this.renderDistribution(analysis.analysisResults.ndvi, '', {
+                                    label: 'Abaixo de NDVI 0,3',
+                                    below: 0.3
+                                })}
                             </div>
                         ` : ''}
                         
@@ -273,6 +279,10 @@ class Dashboard {
                                     <span>Máxima: ${analysis.analysisResults.slope.max_slope}°</span>
                                     <span>Classificação: ${analysis.analysisResults.slope.slope_classification}</span>
                                 </div>
+                                ${this.renderDistribution(analysis.analysisResults.slope, '°', {
+                                    label: 'Acima de 10°',
+                                    above: 10
+                                })}
                             </div>
                         ` : ''}
                         
@@ -308,6 +318,70 @@ class Dashboard {
         }
     }
 
+    // Histogram packed by the analysis lambda: counts are base64 little-endian uint32
+    decodeHistogram(packed) {
+        if (!packed || !packed.counts) return null;
+
+        const bytes = Uint8Array.from(atob(packed.counts), c => c.charCodeAt(0));
+        const view = new DataView(bytes.buffer);
+        const counts = [];
+        for (let i = 0; i + 4 <= bytes.length; i += 4) {
+            counts.push(view.getUint32(i, true));
+        }
+
+        return {
+            start: Number(packed.start),
+            width: Number(packed.width),
+            counts,
+            total: counts.reduce((sum, count) => sum + count, 0)
+        };
+    }
+
+    // Share (%) of the area whose bins lie entirely above/below a threshold
+    histogramShare(histogram, { above, below }) {
+        if (!histogram || histogram.total === 0) return null;
+
+        let selected = 0;
+        histogram.counts.forEach((count, i) => {
+            const left = histogram.start + i * histogram.width;
+            const right = left + histogram.width;
+            if (above !== undefined && left >= above - 1e-9) selected += count;
+            if (below !== undefined && right <= below + 1e-9) selected += count;
+        });
+        return (100 * selected / histogram.total).toFixed(1);
+    }
+
+    renderDistribution(result, unit, share = null) {
+        const percentiles = result.percentiles;
+        const histogram = this.decodeHistogram(result.histogram);
+        if (!percentiles && !histogram) return '';
+
+        const shareValue = share ? this.histogramShare(histogram, share) : null;
+        const peak = histogram ? Math.max(...histogram.counts, 1) : 1;
+
+        return `
+            <div class="analysis-distribution">
+                ${percentiles ? `
+                    <div class="analysis-metrics">
+                        <span>P10: ${percentiles.p10}${unit}</span>
+                        <span>P50: ${percentiles.p50}${unit}</span>
+                        <span>P90: ${percentiles.p90}${unit}</span>
+                        ${shareValue !== null ? `<span>${share.label}: ${shareValue}%</span>` : ''}
+                    </div>
+                ` : ''}
+                ${histogram ? `
+                    <div class="analysis-histogram" title="Distribuição na área da propriedade">
+                        ${histogram.counts.map((count, i) => `
+                            <div class="analysis-histogram-bar"
+                                 style="height: ${(100 * count / peak).toFixed(1)}%"
+                                 title="${(histogram.start + i * histogram.width).toFixed(2)}${unit}: ${(100 * count / histogram.total).toFixed(1)}%"></div>
+                        `).join('')}
+                    </div>
+                ` : ''}
+            </div>
+        `;
+    }
+
     togglePropertySelection(propertyId, selected) {
         if (selected) {
             this.selectedProperties.add(propertyId);
@@ -866,7 +940,19 @@ class Dashboard {
 
     handleWebSocketMessage(message) {
         console.log('WebSocket message received:', message);
-        
+
+        // Digest frames carry several notifications of the same type
+        if (message.type === 'property_batch' || message.type === 'analysis_batch') {
+            this.handleNotificationBatch(message.events || []);
+            return;
+        }
+
+        // Too many notifications at once: reload instead of replaying them
+        if (message.type === 'notifications_overflow') {
+            this.loadProperties();
+            return;
+        }
+
         if (message.type === 'analysis_notification' && message.event === 'completed') {
             const propertyIndex = this.properties.findIndex(p => p.id === message.propertyId);
             if (propertyIndex !== -1) {
@@ -878,6 +964,45 @@ class Dashboard {
                 window.toast.show(message.message || 'Análise concluída!', 'success');
             }
         }
+
+        if (message.type === 'analysis_notification' && message.event === 'failed') {
+            const propertyIndex = this.properties.findIndex(p => p.id === message.propertyId);
+            if (propertyIndex !== -1) {
+                this.properties[propertyIndex].analysisStatus = 'failed';
+                this.renderPropertiesList();
+            }
+
+            if (window.toast) {
+                window.toast.show(message.message || 'Falha na análise', 'error');
+            }
+        }
+    }
+
+    handleNotificationBatch(events) {
+        const analysisEvents = events.filter(e => e.type === 'analysis_notification');
+        const completed = analysisEvents.filter(e => e.event === 'completed');
+        const failed = analysisEvents.filter(e => e.event === 'failed');
+        if (completed.length === 0 && failed.length === 0) {
+            return;
+        }
+
+        const statusById = new Map(analysisEvents.map(e => [e.propertyId, e.event]));
+        this.properties.forEach(property => {
+            const status = statusById.get(property.id);
+            if (status === 'completed' || status === 'failed') {
+                property.analysisStatus = status;
+            }
+        });
+        this.renderPropertiesList();
+
+        if (window.toast) {
+            if (completed.length > 0) {
+                window.toast.show(`Análise concluída para ${completed.length} propriedades`, 'success');
+            }
+            if (failed.length > 0) {
+                window.toast.show(`Falha na análise de ${failed.length} propriedades`, 'error');
+            }
+        }
     }
 
     scheduleReconnect() {
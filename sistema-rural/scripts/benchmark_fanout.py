@@ -0,0 +1,158 @@
+"""Benchmark WebSocket fan-out of 9.lambda-handle-events against a local stand-in.
+
+A threaded HTTP server plays the API Gateway management endpoint
+(POST /{stage}/@connections/{id}, keep-alive, fixed latency per post), and
+the same message is sent to N connections in three ways:
+
+    per-message client   a new boto3 client per post, serially (the old path)
+    pooled, serial       one cached client, posts one after another
+    pooled, fan-out      fan_out(): cached client + bounded thread pool
+
+Usage:
+    python benchmark_fanout.py --recipients 10,100,1000 --latency-ms 10
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List
+
+import boto3
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """POST /{stage}/@connections/{id}: wait the configured latency, then 200"""
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.latency)
+        status = 200 if "/@connections/" in self.path else 404
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    # The default backlog (5) drops SYNs when the pool opens its connections
+    request_queue_size = 256
+    daemon_threads = True
+
+
+def start_stand_in(latency: float) -> ThreadingHTTPServer:
+    StandInHandler.latency = latency
+    server = StandInServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def load_events_lambda(endpoint: str, workers: int):
+    """Import the events lambda pointed at the stand-in endpoint"""
+    os.environ.update(
+        {
+            "WEBSOCKET_TABLE": "benchmark-connections",
+            "SUBSCRIPTIONS_TABLE": "benchmark-subscriptions",
+            "WEBSOCKET_API_ENDPOINT": endpoint,
+            "FANOUT_WORKERS": str(workers),
+        }
+    )
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+
+    sys.path.insert(
+        0,
+        os.path.join(os.path.dirname(__file__), "..", "9.lambda-handle-events", "src"),
+    )
+    import lambda_function
+
+    return lambda_function
+
+
+def run(send: Callable[[List[str]], int], connection_ids: List[str]) -> Dict:
+    start = time.perf_counter()
+    sent = send(connection_ids)
+    elapsed = time.perf_counter() - start
+    return {
+        "sent": sent,
+        "seconds": round(elapsed, 3),
+        "messagesPerSecond": round(sent / elapsed, 1) if elapsed else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recipients", default="10,100,1000", help="Sizes, CSV")
+    parser.add_argument("--latency-ms", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=32, help="FANOUT_WORKERS")
+    parser.add_argument(
+        "--skip-per-message",
+        action="store_true",
+        help="Skip the per-message client mode (slow at 1,000 recipients)",
+    )
+    args = parser.parse_args()
+
+    server = start_stand_in(args.latency_ms / 1000)
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}/benchmark"
+    events = load_events_lambda(endpoint, args.workers)
+
+    message = {
+        "type": "analysis_notification",
+        "event": "completed",
+        "propertyId": "benchmark",
+        "message": "Análise geoespacial concluída",
+    }
+    data = events.encode_message(message)
+
+    def per_message_client(connection_ids):
+        sent = 0
+        for connection_id in connection_ids:
+            client = boto3.client("apigatewaymanagementapi", endpoint_url=endpoint)
+            client.post_to_connection(ConnectionId=connection_id, Data=data)
+            sent += 1
+        return sent
+
+    def pooled_serial(connection_ids):
+        client = events.management_client(endpoint)
+        return sum(
+            events.post_to_connection(client, connection_id, data) == events.SENT
+            for connection_id in connection_ids
+        )
+
+    def pooled_fan_out(connection_ids):
+        outcomes = events.fan_out(connection_ids, data)
+        return sum(outcome == events.SENT for outcome in outcomes.values())
+
+    modes = [("pooled, serial", pooled_serial), ("pooled, fan-out", pooled_fan_out)]
+    if not args.skip_per_message:
+        modes.insert(0, ("per-message client", per_message_client))
+
+    # Warm-up: client creation and the first TLS/TCP connections
+    pooled_fan_out([f"warmup-{i}" for i in range(args.workers)])
+
+    results = []
+    print(f"{'recipients':>10}  {'mode':<20} {'seconds':>8} {'msg/s':>9}")
+    for size in [int(value) for value in args.recipients.split(",")]:
+        connection_ids = [f"conn-{i:06d}" for i in range(size)]
+        for name, send in modes:
+            result = {"recipients": size, "mode": name, **run(send, connection_ids)}
+            results.append(result)
+            print(
+                f"{size:>10}  {name:<20} {result['seconds']:>8.3f} "
+                f"{result['messagesPerSecond']:>9.1f}"
+            )
+
+    server.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    main()
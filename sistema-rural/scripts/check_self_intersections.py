@@ -0,0 +1,135 @@
+"""Check the self-intersection tests of 3.lambda-crud against brute force.
+
+Rings on a coarse integer grid are full of degenerate contacts (vertices
+on edges, collinear overlaps, vertical and horizontal edges). For each one
+the O(n^2) pair test is compared with the sweep (self_intersections), on
+small rings and on medium rings dense enough to recurse into the next sweep
+level. Dense synthetic boundaries, simple by construction, must come out
+clean, and every pair reported on a broken one must really touch. Exits
+with status 1 on disagreements.
+
+Usage:
+    python check_self_intersections.py --rings 20000 --seed 0
+"""
+
+import argparse
+import os
+import sys
+from typing import List, Set, Tuple
+
+import numpy as np
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "3.lambda-crud", "src")
+)
+sys.path.insert(0, os.path.dirname(__file__))
+
+from geometry_validation import (  # noqa: E402
+    SELF_INTERSECTION,
+    segments_intersect,
+    self_intersections,
+)
+from synthetic_workload import WorkloadGenerator  # noqa: E402
+
+
+def brute_force(points: np.ndarray) -> Set[Tuple[int, int]]:
+    """Every pair of non-adjacent edges that touch, testing all pairs"""
+    n = len(points)
+    end = np.roll(points, -1, axis=0)
+    i, j = np.triu_indices(n, 2)
+    keep = ~((i == 0) & (j == n - 1))
+    i, j = i[keep], j[keep]
+    hits = segments_intersect(points[i], end[i], points[j], end[j])
+    return set(zip(i[hits].tolist(), j[hits].tolist()))
+
+
+def valid_pair(points: np.ndarray, pair) -> bool:
+    """The reported pair is made of non-adjacent edges that really touch"""
+    n = len(points)
+    i, j = pair
+    if abs(i - j) in (0, 1, n - 1):
+        return False
+    end = np.roll(points, -1, axis=0)
+    return bool(segments_intersect(points[[i]], end[[i]], points[[j]], end[[j]])[0])
+
+
+def crossings(points: np.ndarray) -> List[Tuple[int, int]]:
+    return [
+        (a, b)
+        for code, a, b in self_intersections(points, limit=len(points) ** 2)
+        if code == SELF_INTERSECTION
+    ]
+
+
+def check_grid_rings(
+    rng: np.random.Generator, rings: int, sizes: Tuple[int, int], label: str
+) -> int:
+    failures = 0
+    checked = 0
+    while checked < rings:
+        n = int(rng.integers(*sizes))
+        side = int(rng.integers(2, max(10, n // 3)))
+        points = rng.integers(0, side, (n, 2)).astype(np.float64)
+        if rng.random() < 0.3:
+            # Decimal-degree coordinates: the same shapes, inexact in binary
+            points = points * 0.1 - 47.3
+        # validate_ring only runs these tests on rings of distinct vertices
+        _, first = np.unique(points, axis=0, return_index=True)
+        points = points[np.sort(first)]
+        if len(points) < 4:
+            continue
+        checked += 1
+
+        expected = brute_force(points)
+        found = crossings(points)
+        if bool(found) != bool(expected) or not all(pair in expected for pair in found):
+            failures += 1
+            print(f"self_intersections: {points.tolist()} -> {found}")
+
+    print(f"{checked} {label} rings, {failures} disagreements")
+    return failures
+
+
+def check_dense_rings(rng: np.random.Generator, rings: int) -> int:
+    """Generator rings are simple; pairs found on broken ones must touch"""
+    generator = WorkloadGenerator(seed=int(rng.integers(2**31)))
+    failures = 0
+    for index in range(rings):
+        n = int(rng.integers(2000, 20000))
+        points = np.asarray(generator.polygon(n, float(rng.uniform(1, 2000))))[:-1]
+        broken = index % 2 == 1
+        if broken:
+            # Pull a vertex towards the opposite side of the ring
+            vertex = int(rng.integers(n))
+            points[vertex] = (points[vertex] + points[(vertex + n // 2) % n]) / 2
+        if rng.random() < 0.5:
+            points = points[::-1]
+
+        found = crossings(points)
+        if (found and not broken) or not all(
+            valid_pair(points, pair) for pair in found
+        ):
+            failures += 1
+            print(f"self_intersections: ring {index} ({n} vertices) -> {found[:5]}")
+
+    print(f"{rings} dense rings, {failures} disagreements")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rings", type=int, default=20000, help="Small rings")
+    parser.add_argument("--medium-rings", type=int, default=2000, help="Medium rings")
+    parser.add_argument("--dense-rings", type=int, default=40, help="Dense rings")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    failures = check_grid_rings(rng, args.rings, (4, 12), "small")
+    failures += check_grid_rings(rng, args.medium_rings, (12, 200), "medium")
+    failures += check_dense_rings(rng, args.dense_rings)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
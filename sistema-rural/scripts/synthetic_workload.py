@@ -0,0 +1,587 @@
+"""Generate a deterministic synthetic workload for load-testing the lambdas.
+
+The same seed always produces the same fixtures:
+
+    import/NNNN.json          bodies for POST /properties/import
+                              (import_properties_bulk)
+    analysis-sqs/NNNN.json    SQS events for 5.lambda-analysis
+    events/eventbridge.jsonl  EventBridge events for 9.lambda-handle-events
+    connections.jsonl         items of the WebSocket connections table
+    summary.json              sizes, vertex/area spread and topic fan-out
+
+Polygons are star-shaped around their centre (strictly increasing vertex
+angles, positive radii), so they are simple, i.e. non-self-intersecting,
+for any vertex count. Their area is scaled to the requested distribution
+(within 0.1% even for 50,000 ha estates).
+
+Usage:
+    python synthetic_workload.py --seed 42 --properties 2000 --users 100 \\
+        --vertices loguniform:4:5000 --area lognormal:40:1.2 \\
+        --connections-per-user uniform:1:3 --out workload/
+
+Distribution specs:
+    vertices  fixed:N | uniform:LO:HI | loguniform:LO:HI   (4 to 100,000)
+    area (ha) fixed:HA | uniform:LO:HI | lognormal:MEDIAN:SIGMA | pareto:MIN:ALPHA
+"""
+
+import argparse
+import base64
+import json
+import math
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "5.lambda-analysis", "src")
+)
+
+from geometry import geometry_hash  # noqa: E402
+from lanes import analysis_cost, classify_lane  # noqa: E402
+
+MIN_VERTICES = 4
+MAX_VERTICES = 100000
+
+EARTH_RADIUS = 6371008.8  # meters
+
+# Rural Brazil (lon/lat): west, south, east, north
+DEFAULT_REGION = (-58.0, -25.0, -44.0, -5.0)
+
+PROPERTY_TYPES = ("fazenda", "sitio", "chacara", "terreno", "outros")
+
+START_TIME = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+# ===================================
+# DISTRIBUTIONS
+# ===================================
+
+
+def parse_sampler(spec: str) -> Callable[[np.random.Generator, int], np.ndarray]:
+    """Sampler for a "kind:arg:arg" spec (see module docstring)"""
+    kind, *args = spec.split(":")
+    values = [float(arg) for arg in args]
+
+    if kind == "fixed":
+        return lambda rng, size: np.full(size, values[0])
+    if kind == "uniform":
+        return lambda rng, size: rng.uniform(values[0], values[1], size)
+    if kind == "loguniform":
+        low, high = np.log(values[0]), np.log(values[1])
+        return lambda rng, size: np.exp(rng.uniform(low, high, size))
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda rng, size: median * np.exp(sigma * rng.standard_normal(size))
+    if kind == "pareto":
+        minimum, alpha = values
+        return lambda rng, size: minimum * (1.0 + rng.pareto(alpha, size))
+    raise ValueError(f"Unknown distribution: {spec}")
+
+
+# ===================================
+# POLYGONS
+# ===================================
+
+
+def ring_area_perimeter(coordinates: Sequence[Sequence[float]]) -> Tuple[float, float]:
+    """Area (m²) and perimeter (m) of a closed lon/lat ring.
+
+    Area uses a local equirectangular projection, accurate to well under 1%
+    at property scale; perimeter sums haversine distances.
+    """
+    ring = np.asarray(coordinates, dtype=np.float64)
+    lon, lat = np.radians(ring[:, 0]), np.radians(ring[:, 1])
+
+    x = lon * EARTH_RADIUS * np.cos(lat.mean())
+    y = lat * EARTH_RADIUS
+    area = 0.5 * abs(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1]))
+
+    dlat, dlon = np.diff(lat), np.diff(lon)
+    h = (
+        np.sin(dlat / 2) ** 2
+        + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(dlon / 2) ** 2
+    )
+    perimeter = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(h)).sum()
+    return float(area), float(perimeter)
+
+
+class WorkloadGenerator:
+    """Seedable source of properties, envelopes and connection tables"""
+
+    def __init__(
+        self,
+        seed: int = 0,
+        region: Tuple[float, float, float, float] = DEFAULT_REGION,
+        start: datetime = START_TIME,
+    ):
+        self.rng = np.random.default_rng(seed)
+        self.region = region
+        self.start = start
+
+    def uuid(self) -> str:
+        return str(uuid.UUID(bytes=self.rng.bytes(16), version=4))
+
+    def timestamp(self, seconds: float) -> str:
+        return (self.start + timedelta(seconds=float(seconds))).isoformat()
+
+    def polygon(
+        self,
+        vertices: int,
+        area_ha: float,
+        center: Optional[Tuple[float, float]] = None,
+        roughness: float = 0.35,
+    ) -> List[List[float]]:
+        """Closed [lon, lat] ring with the given vertex count and area.
+
+        Radii follow low-frequency noise (roughness scales its amplitude) so
+        boundaries look like parcels rather than stars; every vertex keeps
+        a distinct, increasing angle around the centre.
+        """
+        n = int(min(max(vertices, MIN_VERTICES), MAX_VERTICES))
+        rng = self.rng
+
+        if center is None:
+            west, south, east, north = self.region
+            center = (rng.uniform(west, east), rng.uniform(south, north))
+
+        # Angles: evenly spaced, jittered within their slot, random rotation
+        slot = 2 * np.pi / n
+        angles = (np.arange(n) + rng.uniform(-0.4, 0.4, n)) * slot
+        angles += rng.uniform(0, 2 * np.pi)
+
+        # Log-radius: a few harmonics with 1/k amplitudes plus fine jitter
+        harmonics = np.arange(1, 9)
+        amplitudes = roughness * rng.uniform(0.2, 1.0, harmonics.size) / harmonics
+        phases = rng.uniform(0, 2 * np.pi, harmonics.size)
+        log_radius = (
+            amplitudes[:, None] * np.sin(harmonics[:, None] * angles + phases[:, None])
+        ).sum(axis=0)
+        log_radius += roughness * 0.05 * rng.standard_normal(n)
+        radius = np.exp(log_radius)
+
+        # Scale to the target area (meters), then convert to degrees
+        x, y = radius * np.cos(angles), radius * np.sin(angles)
+        unit_area = 0.5 * abs(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+        scale = math.sqrt(area_ha * 10000.0 / unit_area)
+
+        lon0, lat0 = center
+        meters_per_degree = EARTH_RADIUS * np.pi / 180
+        lon = lon0 + x * scale / (meters_per_degree * math.cos(math.radians(lat0)))
+        lat = lat0 + y * scale / meters_per_degree
+
+        ring = np.column_stack([lon, lat]).tolist()
+        ring.append(list(ring[0]))
+        return ring
+
+    def properties(
+        self,
+        count: int,
+        users: int,
+        vertices: str = "loguniform:4:2000",
+        area: str = "lognormal:40:1.2",
+        roughness: float = 0.35,
+    ) -> List[Dict[str, Any]]:
+        """Properties with ids, owner and the fields the CRUD API accepts"""
+        user_ids = [self.uuid() for _ in range(users)]
+        vertex_counts = np.clip(
+            np.round(parse_sampler(vertices)(self.rng, count)),
+            MIN_VERTICES,
+            MAX_VERTICES,
+        ).astype(int)
+        areas = np.maximum(parse_sampler(area)(self.rng, count), 0.01)
+
+        properties = []
+        for index in range(count):
+            coordinates = self.polygon(
+                vertex_counts[index], areas[index], roughness=roughness
+            )
+            area_m2, perimeter = ring_area_perimeter(coordinates)
+            properties.append(
+                {
+                    "propertyId": self.uuid(),
+                    "userId": user_ids[int(self.rng.integers(users))],
+                    "name": f"Propriedade {index + 1:05d}",
+                    "type": PROPERTY_TYPES[int(self.rng.integers(len(PROPERTY_TYPES)))],
+                    "description": "Gerada pelo gerador de carga sintética",
+                    "area": round(area_m2 / 10000.0, 2),
+                    "perimeter": int(round(perimeter)),
+                    "coordinates": coordinates,
+                }
+            )
+        return properties
+
+    # ===================================
+    # CRUD IMPORT PAYLOADS
+    # ===================================
+
+    @staticmethod
+    def import_payloads(
+        properties: List[Dict[str, Any]], chunk_size: int = 100
+    ) -> List[Dict[str, Any]]:
+        """Request bodies for POST /properties/import, per user and chunk"""
+        fields = ("name", "type", "description", "area", "perimeter", "coordinates")
+        by_user: Dict[str, List[Dict[str, Any]]] = {}
+        for prop in properties:
+            by_user.setdefault(prop["userId"], []).append(
+                {field: prop[field] for field in fields}
+            )
+
+        payloads = []
+        for user_id, items in by_user.items():
+            for start in range(0, len(items), chunk_size):
+                payloads.append(
+                    {
+                        "userId": user_id,
+                        "body": {"properties": items[start : start + chunk_size]},
+                    }
+                )
+        return payloads
+
+    @staticmethod
+    def import_request(payload: Dict[str, Any]) -> Dict[str, Any]:
+        """API Gateway proxy event routed to import_properties_bulk"""
+        return {
+            "httpMethod": "POST",
+            "path": "/properties/import",
+            "resource": "/properties/import",
+            "requestContext": {"authorizer": {"userId": payload["userId"]}},
+            "body": json.dumps(payload["body"]),
+        }
+
+    # ===================================
+    # EVENTBRIDGE / SQS ENVELOPES
+    # ===================================
+
+    def eventbridge_event(
+        self, source: str, detail_type: str, detail: Dict[str, Any], seconds: float
+    ) -> Dict[str, Any]:
+        """Event as delivered by the bus (to a Lambda or an SQS target)"""
+        return {
+            "version": "0",
+            "id": self.uuid(),
+            "detail-type": detail_type,
+            "source": source,
+            "account": "000000000000",
+            "time": (self.start + timedelta(seconds=float(seconds))).strftime(
+                "%Y-%m-%dT%H:%M:%SZ"
+            ),
+            "region": "us-east-1",
+            "resources": [],
+            "detail": detail,
+        }
+
+    def property_event(
+        self,
+        prop: Dict[str, Any],
+        seconds: float = 0.0,
+        previous: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Property Created (or Updated, given the previous version) event"""
+        cost = analysis_cost(prop["coordinates"])
+        fingerprint = geometry_hash(prop["coordinates"])
+        detail = {
+            "propertyId": prop["propertyId"],
+            "userId": prop["userId"],
+            "name": prop["name"],
+            "type": prop["type"],
+            "area": float(prop["area"]),
+            "coordinates": prop["coordinates"],
+            "status": "updated" if previous else "created",
+            "timestamp": self.timestamp(seconds),
+            "analysisCost": cost,
+            "analysisLane": classify_lane(cost),
+            "geometryFingerprint": {
+                "old": geometry_hash(previous["coordinates"]) if previous else None,
+                "new": fingerprint,
+            },
+        }
+        if previous:
+            detail["geometryChanged"] = (
+                detail["geometryFingerprint"]["old"] != fingerprint
+            )
+
+        detail_type = "Property Updated" if previous else "Property Created"
+        return self.eventbridge_event("property.service", detail_type, detail, seconds)
+
+    def analysis_event(
+        self, prop: Dict[str, Any], seconds: float = 0.0, status: str = "completed"
+    ) -> Dict[str, Any]:
+        """Analysis Completed/Failed event, as published by 5.lambda-analysis"""
+        return self.eventbridge_event(
+            "geospatial.analysis",
+            "Analysis Completed" if status == "completed" else "Analysis Failed",
+            {
+                "propertyId": prop["propertyId"],
+                "userId": prop["userId"],
+                "status": status,
+            },
+            seconds,
+        )
+
+    def sqs_event(
+        self,
+        envelopes: List[Dict[str, Any]],
+        queue_arn: str = "arn:aws:sqs:us-east-1:000000000000:sistema-rural-property-analysis-delay",
+    ) -> Dict[str, Any]:
+        """Lambda SQS event whose record bodies are the given envelopes"""
+        records = []
+        for envelope in envelopes:
+            message_id = self.uuid()
+            body = json.dumps(envelope)
+            sent = datetime.fromisoformat(envelope["time"].replace("Z", "+00:00"))
+            records.append(
+                {
+                    "messageId": message_id,
+                    "receiptHandle": message_id,
+                    "body": body,
+                    "attributes": {
+                        "ApproximateReceiveCount": "1",
+                        "SentTimestamp": str(int(sent.timestamp() * 1000)),
+                    },
+                    "messageAttributes": {},
+                    "eventSource": "aws:sqs",
+                    "eventSourceARN": queue_arn,
+                    "awsRegion": "us-east-1",
+                }
+            )
+        return {"Records": records}
+
+    # ===================================
+    # WEBSOCKET CONNECTIONS
+    # ===================================
+
+    def connection_id(self) -> str:
+        """API Gateway-style connection id (12 random bytes, base64)"""
+        return base64.b64encode(self.rng.bytes(12)).decode()[:14] + "="
+
+    def connections(
+        self,
+        properties: List[Dict[str, Any]],
+        connections_per_user: str = "uniform:1:3",
+        watched_per_connection: str = "loguniform:1:20",
+        zipf: float = 1.2,
+        global_share: float = 0.1,
+        analysis_share: float = 0.5,
+    ) -> List[Dict[str, Any]]:
+        """Items of the connections table with topic subscriptions.
+
+        Each connection watches some properties: mostly its owner's, plus
+        others drawn with Zipf popularity so a few properties get a large
+        audience. It subscribes to property.{id}, to
+        property.{id}.analysis with probability analysis_share, and to
+        analysis.completed with probability global_share.
+        """
+        rng = self.rng
+        by_user: Dict[str, List[str]] = {}
+        for prop in properties:
+            by_user.setdefault(prop["userId"], []).append(prop["propertyId"])
+        all_ids = [prop["propertyId"] for prop in properties]
+
+        # Zipf popularity over a fixed random ranking of the properties
+        ranking = rng.permutation(len(all_ids))
+        weights = 1.0 / np.arange(1, len(all_ids) + 1) ** zipf
+        weights /= weights.sum()
+
+        count_sampler = parse_sampler(connections_per_user)
+        watched_sampler = parse_sampler(watched_per_connection)
+        items = []
+        for user_id, owned in sorted(by_user.items()):
+            for _ in range(max(int(round(count_sampler(rng, 1)[0])), 0)):
+                watched = max(int(round(watched_sampler(rng, 1)[0])), 1)
+                own_count = min(len(owned), watched)
+                popular = rng.choice(
+                    ranking, size=watched - own_count, replace=True, p=weights
+                )
+                property_ids = list(
+                    dict.fromkeys(
+                        list(rng.choice(owned, size=own_count, replace=False))
+                        + [all_ids[i] for i in popular]
+                    )
+                )
+
+                subscriptions = []
+                for property_id in property_ids:
+                    subscriptions.append(f"property.{property_id}")
+                    if rng.random() < analysis_share:
+                        subscriptions.append(f"property.{property_id}.analysis")
+                if rng.random() < global_share:
+                    subscriptions.append("analysis.completed")
+
+                connected = rng.uniform(0, 3600)
+                items.append(
+                    {
+                        "connectionId": self.connection_id(),
+                        "userId": user_id,
+                        "connectedAt": self.timestamp(connected),
+                        "ttl": int(self.start.timestamp() + connected + 24 * 3600),
+                        "subscriptions": subscriptions,
+                    }
+                )
+        return items
+
+
+def fanout_summary(connections: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Subscriber count per topic: how many sends one event costs"""
+    audience: Dict[str, int] = {}
+    for item in connections:
+        for topic in item["subscriptions"]:
+            audience[topic] = audience.get(topic, 0) + 1
+    if not audience:
+        return {"topics": 0}
+
+    sizes = np.array(sorted(audience.values()))
+    top = sorted(audience.items(), key=lambda entry: -entry[1])[:5]
+    return {
+        "topics": int(sizes.size),
+        "subscriptions": int(sizes.sum()),
+        "mean": round(float(sizes.mean()), 2),
+        "p50": int(np.percentile(sizes, 50)),
+        "p99": int(np.percentile(sizes, 99)),
+        "max": int(sizes.max()),
+        "top": dict(top),
+    }
+
+
+# ===================================
+# CLI
+# ===================================
+
+
+def write_json(path: str, data: Any):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def write_jsonl(path: str, rows: List[Any]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--properties", type=int, default=1000, help="Property count")
+    parser.add_argument("--users", type=int, default=50, help="Distinct owners")
+    parser.add_argument("--vertices", default="loguniform:4:2000", help="Vertex spec")
+    parser.add_argument("--area", default="lognormal:40:1.2", help="Area spec (ha)")
+    parser.add_argument("--roughness", type=float, default=0.35, help="Boundary noise")
+    parser.add_argument("--import-chunk", type=int, default=100, help="Rows per import")
+    parser.add_argument(
+        "--sqs-batch", type=int, default=5, help="Records per SQS event"
+    )
+    parser.add_argument("--connections-per-user", default="uniform:1:3")
+    parser.add_argument("--watched-per-connection", default="loguniform:1:20")
+    parser.add_argument("--zipf", type=float, default=1.2, help="Topic popularity skew")
+    parser.add_argument("--global-share", type=float, default=0.1)
+    parser.add_argument(
+        "--connections-table", help="Also write the connections to this table"
+    )
+    parser.add_argument(
+        "--subscriptions-table",
+        help="Also write the topic -> connection index to this table",
+    )
+    parser.add_argument("--out", required=True, help="Output directory")
+    args = parser.parse_args()
+
+    generator = WorkloadGenerator(args.seed)
+    properties = generator.properties(
+        args.properties, args.users, args.vertices, args.area, args.roughness
+    )
+
+    payloads = generator.import_payloads(properties, args.import_chunk)
+    for index, payload in enumerate(payloads):
+        write_json(os.path.join(args.out, "import", f"{index:04d}.json"), payload)
+
+    # Creation events arrive one second apart; each analysis completes a
+    # minute after its property was created
+    created = [
+        generator.property_event(prop, seconds=index)
+        for index, prop in enumerate(properties)
+    ]
+    for index, start in enumerate(range(0, len(created), args.sqs_batch)):
+        write_json(
+            os.path.join(args.out, "analysis-sqs", f"{index:04d}.json"),
+            generator.sqs_event(created[start : start + args.sqs_batch]),
+        )
+
+    completed = [
+        generator.analysis_event(prop, seconds=index + 60)
+        for index, prop in enumerate(properties)
+    ]
+    events = sorted(created + completed, key=lambda event: event["time"])
+    write_jsonl(os.path.join(args.out, "events", "eventbridge.jsonl"), events)
+
+    connections = generator.connections(
+        properties,
+        args.connections_per_user,
+        args.watched_per_connection,
+        args.zipf,
+        args.global_share,
+    )
+    write_jsonl(os.path.join(args.out, "connections.jsonl"), connections)
+
+    if args.connections_table:
+        import boto3
+
+        table = boto3.resource("dynamodb").Table(args.connections_table)
+        with table.batch_writer(overwrite_by_pkeys=["connectionId"]) as batch:
+            for item in connections:
+                # Stored as a string set; DynamoDB rejects empty sets
+                item = {key: value for key, value in item.items() if value != []}
+                if "subscriptions" in item:
+                    item["subscriptions"] = set(item["subscriptions"])
+                batch.put_item(Item=item)
+
+    if args.subscriptions_table:
+        import boto3
+
+        table = boto3.resource("dynamodb").Table(args.subscriptions_table)
+        with table.batch_writer(overwrite_by_pkeys=["topic", "connectionId"]) as batch:
+            for item in connections:
+                for topic in item["subscriptions"]:
+                    batch.put_item(
+                        Item={
+                            "topic": topic,
+                            "connectionId": item["connectionId"],
+                            "userId": item["userId"],
+                            "subscribedAt": item["connectedAt"],
+                            "ttl": item["ttl"],
+                        }
+                    )
+
+    vertices = np.array([len(prop["coordinates"]) - 1 for prop in properties])
+    areas = np.array([prop["area"] for prop in properties])
+    lanes = [event["detail"]["analysisLane"] for event in created]
+    summary = {
+        "seed": args.seed,
+        "properties": len(properties),
+        "users": args.users,
+        "importPayloads": len(payloads),
+        "vertices": {
+            "min": int(vertices.min()),
+            "p50": int(np.percentile(vertices, 50)),
+            "max": int(vertices.max()),
+        },
+        "areaHa": {
+            "min": float(areas.min()),
+            "p50": float(np.percentile(areas, 50)),
+            "max": float(areas.max()),
+            "total": round(float(areas.sum()), 2),
+        },
+        "lanes": {lane: lanes.count(lane) for lane in sorted(set(lanes))},
+        "connections": len(connections),
+        "fanout": fanout_summary(connections),
+    }
+    write_json(os.path.join(args.out, "summary.json"), summary)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()